@@ -1,24 +1,109 @@
+import json
+import os
 import pickle
+import shutil
+import threading
+import time
+from array import array
+from collections import Counter, OrderedDict
+from typing import List, Optional
 
-from rank_bm25 import BM25Okapi
-from typing import List
+import numpy as np
+from scipy import sparse
+
+# Maximum number of BM25 models kept in memory by BM25.load_cached_model (one per refactoring type).
+MODEL_CACHE_SIZE = 8
+_model_cache = OrderedDict()
+_model_cache_lock = threading.Lock()
+
+# On-disk layout written by BM25.save_model; bump the version when the layout changes.
+# Version 1 kept the files next to the manifest, version 2 keeps them in the data directory the manifest names.
+INDEX_FORMAT_VERSION = 2
+INDEX_MANIFEST = 'manifest.json'
+
+
+def _write_file(directory: str, name: str, content: bytes):
+    """Writes a file of an index directory through a temporary file and an atomic rename."""
+    tmp_path = os.path.join(directory, f'.{name}.{os.getpid()}.tmp')
+    with open(tmp_path, 'wb') as file:
+        file.write(content)
+    os.replace(tmp_path, os.path.join(directory, name))
+
+
+def _read_manifest(directory: str) -> dict:
+    with open(os.path.join(directory, INDEX_MANIFEST), 'r') as file:
+        return json.load(file)
+
+
+def _remove_stale_data(directory: str, keep: set):
+    """Removes the data directories of an index that are older than the ones in keep."""
+    oldest_kept = min(keep)
+    for name in os.listdir(directory):
+        if name.startswith('data-') and name not in keep and name < oldest_kept:
+            shutil.rmtree(os.path.join(directory, name), ignore_errors=True)
+
+
+class _MappedCorpus:
+    """Read-only view of the documents of a saved index, decoded from the mapped UTF-8 blob on access."""
+
+    def __init__(self, blob_path: str, offsets: np.ndarray):
+        self.offsets = offsets
+        if os.path.getsize(blob_path) > 0:
+            self.blob = np.memmap(blob_path, dtype=np.uint8, mode='r')
+        else:
+            self.blob = np.zeros(0, dtype=np.uint8)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('document index out of range')
+        return self.blob[self.offsets[index]:self.offsets[index + 1]].tobytes().decode('utf-8')
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
 
 
 class BM25:
-    def __init__(self, corpus: List[str], preprocess_func=None):
+    def __init__(self, corpus: List[str], preprocess_func=None, k1: float = 1.5, b: float = 0.75,
+                 epsilon: float = 0.25, doc_ids: Optional[List[str]] = None):
         """
         Initializes the BM25 model with the given corpus and an optional preprocessing function.
+        The scoring follows BM25Okapi from rank_bm25, but the corpus is kept as a sparse
+        term-document matrix so a query is scored with one sparse matrix-vector product.
 
         Parameters:
             corpus (List[str]): A list of documents, where each document is a string.
             preprocess_func (callable, optional): A function to preprocess documents and queries.
+            k1 (float): Term frequency saturation parameter (default is 1.5).
+            b (float): Document length normalization parameter (default is 0.75).
+            epsilon (float): Floor for negative idf values, as a fraction of the average idf (default is 0.25).
+            doc_ids (List[str], optional): An id per document (e.g. the refactoring uniqueId), returned by search_ids.
         """
-        # Use the provided preprocess function if it exists; otherwise, just split the strings.
-        self.tokenized_corpus = [self.preprocess(doc) if preprocess_func is None else preprocess_func(doc) for doc in
-                                 corpus]
-        self.bm25 = BM25Okapi(self.tokenized_corpus)
-
-        self.corpus = corpus
+        self.k1 = k1
+        self.b = b
+        self.epsilon = epsilon
+        self.preprocess_func = preprocess_func
+        self.corpus = []
+        self.doc_ids = None if doc_ids is None else []
+        self.vocabulary = {}
+        # corpus statistics, updated in place by add_documents
+        self.doc_freq = array('q')
+        self.doc_lengths = array('d')
+        self.total_length = 0.0
+        self.term_frequencies = sparse.csr_matrix((0, 0), dtype=np.float32)
+        self.weights = None
+        # version of the saved index this model was loaded from, None once it differs from any saved index
+        self.index_version = None
+        # rows added since the term-document matrix was last rebuilt
+        self._pending_indptr = [0]
+        self._pending_indices = []
+        self._pending_counts = []
+        self.add_documents(corpus, doc_ids)
 
     @staticmethod
     def preprocess(document: str) -> List[str]:
@@ -33,6 +118,162 @@ class BM25:
         """
         return document.split(" ")
 
+    def tokenize(self, document: str) -> List[str]:
+        """Tokenizes a document or query with the custom preprocess function if one was given."""
+        # Use the provided preprocess function if it exists; otherwise, just split the strings.
+        if self.preprocess_func is None:
+            return self.preprocess(document)
+        return self.preprocess_func(document)
+
+    @property
+    def avgdl(self) -> float:
+        """The average document length of the corpus."""
+        return self.total_length / len(self.corpus) if self.corpus else 0.0
+
+    def add_document(self, document: str, doc_id: Optional[str] = None):
+        """
+        Adds a new document to the corpus and updates the BM25 model.
+
+        Parameters:
+            document (str): The new document as a string.
+            doc_id (str, optional): The id of the document, required if the model has document ids.
+        """
+        self.add_documents([document], None if doc_id is None else [doc_id])
+
+    def add_documents(self, documents: List[str], doc_ids: Optional[List[str]] = None):
+        """
+        Adds documents to the corpus, updating the document frequencies, document lengths and
+        average document length in place. Only the new documents are tokenized; the weight
+        matrix is rebuilt lazily on the next search.
+
+        Parameters:
+            documents (List[str]): The new documents.
+            doc_ids (List[str], optional): Their ids, required if the model has document ids.
+        """
+        if (self.doc_ids is None) != (doc_ids is None) and (documents or self.corpus):
+            raise ValueError("document ids must be given for all documents of a BM25 model or for none")
+        if doc_ids is not None:
+            if len(doc_ids) != len(documents):
+                raise ValueError("expected one document id per document")
+            if self.doc_ids is None:
+                self.doc_ids = []
+        if documents and not isinstance(self.corpus, list):
+            self._load_into_memory()
+        for document in documents:
+            tokens = self.tokenize(document)
+            for term, count in Counter(tokens).items():
+                term_id = self.vocabulary.get(term)
+                if term_id is None:
+                    term_id = len(self.vocabulary)
+                    self.vocabulary[term] = term_id
+                    self.doc_freq.append(0)
+                self.doc_freq[term_id] += 1
+                self._pending_indices.append(term_id)
+                self._pending_counts.append(count)
+            self._pending_indptr.append(len(self._pending_indices))
+            self.doc_lengths.append(len(tokens))
+            self.total_length += len(tokens)
+            self.corpus.append(document)
+        if doc_ids is not None:
+            self.doc_ids.extend(doc_ids)
+        if documents:
+            self.weights = None
+            self.index_version = None
+
+    def _refresh(self):
+        """Merges the pending rows into the term-document matrix and recomputes the weights if needed."""
+        if len(self._pending_indptr) > 1:
+            new_rows = sparse.csr_matrix((np.array(self._pending_counts, dtype=np.float32),
+                                          np.array(self._pending_indices, dtype=np.int32),
+                                          self._pending_indptr),
+                                         shape=(len(self._pending_indptr) - 1, len(self.vocabulary)))
+            term_frequencies = self.term_frequencies.tocsr()
+            term_frequencies.resize((term_frequencies.shape[0], len(self.vocabulary)))
+            self.term_frequencies = sparse.vstack([term_frequencies, new_rows], format="csr")
+            self._pending_indptr = [0]
+            self._pending_indices = []
+            self._pending_counts = []
+        if self.weights is None:
+            self._compute_weights()
+
+    def _compute_weights(self):
+        """
+        Precomputes the BM25 weight of every (document, term) pair, so that the score of a
+        document is the sum of the weights of the query terms it contains. The weights are
+        kept column-wise (one postings list per term) and share their layout with the term
+        frequencies, which is also the layout written by save_model.
+        """
+        tf = self.term_frequencies.tocsc()
+        corpus_size = tf.shape[0]
+        if corpus_size == 0:
+            self.term_frequencies = tf
+            self.weights = sparse.csc_matrix(tf.shape, dtype=np.float32)
+            return
+        doc_freq = np.asarray(self.doc_freq, dtype=np.int64)
+        idf = np.log(corpus_size - doc_freq + 0.5) - np.log(doc_freq + 0.5)
+        # same negative idf handling as BM25Okapi
+        idf[idf < 0] = self.epsilon * idf.mean()
+        doc_lengths = np.asarray(self.doc_lengths, dtype=np.float64)
+        length_norm = self.k1 * (1 - self.b + self.b * doc_lengths / self.avgdl)
+        terms = np.repeat(np.arange(tf.shape[1]), np.diff(tf.indptr))
+        weights = idf[terms] * tf.data * (self.k1 + 1) / (tf.data + length_norm[tf.indices])
+        self.term_frequencies = tf
+        self.weights = sparse.csc_matrix((weights.astype(np.float32), tf.indices, tf.indptr), shape=tf.shape)
+
+    def _query_matrix(self, queries: List[str]) -> sparse.csr_matrix:
+        """
+        Builds a sparse (terms x queries) matrix of query term counts. Terms outside the
+        vocabulary are dropped since they score zero.
+        """
+        indptr = [0]
+        indices = []
+        counts = []
+        for query in queries:
+            tokenized_query = self.tokenize(query)  # Tokenize the query
+            for term, count in Counter(tokenized_query).items():
+                term_id = self.vocabulary.get(term)
+                if term_id is not None:
+                    indices.append(term_id)
+                    counts.append(count)
+            indptr.append(len(indices))
+        query_matrix = sparse.csr_matrix((np.array(counts, dtype=np.float32), np.array(indices, dtype=np.int32),
+                                          indptr), shape=(len(queries), len(self.vocabulary)))
+        return query_matrix.T.tocsr()
+
+    @staticmethod
+    def _top_n_indices(scores: np.ndarray, top_n: int) -> np.ndarray:
+        """Returns the indices of the top N scores in descending order, using argpartition."""
+        top_n = min(top_n, scores.shape[0])
+        if top_n <= 0:
+            return np.array([], dtype=np.int64)
+        candidates = np.argpartition(-scores, top_n - 1)[:top_n]
+        return candidates[np.argsort(-scores[candidates], kind="stable")]
+
+    def get_scores(self, query: str) -> np.ndarray:
+        """
+        Scores every document of the corpus against the query.
+
+        Parameters:
+            query (str): The search query as a string.
+
+        Returns:
+            np.ndarray: The BM25 score of each document, in corpus order.
+        """
+        return self.get_batch_scores([query])[:, 0]
+
+    def get_batch_scores(self, queries: List[str]) -> np.ndarray:
+        """
+        Scores every document against several queries with a single sparse matrix product.
+
+        Parameters:
+            queries (List[str]): The search queries.
+
+        Returns:
+            np.ndarray: A (documents x queries) array of BM25 scores.
+        """
+        self._refresh()
+        return np.asarray((self.weights @ self._query_matrix(queries)).todense())
+
     def search(self, query: str, top_n: int = 5) -> List[str]:
         """
         Searches the corpus for the most relevant documents to the query.
@@ -44,46 +285,257 @@ class BM25:
         Returns:
             List[str]: A list of top N relevant documents.
         """
-        tokenized_query = self.preprocess(query)  # Tokenize the query
-        return self.bm25.get_top_n(tokenized_query, self.corpus, n=top_n)
+        return self.search_batch([query], top_n=top_n)[0]
 
-    def add_document(self, document: str):
+    def search_batch(self, queries: List[str], top_n: int = 5) -> List[List[str]]:
         """
-        Adds a new document to the corpus and updates the BM25 model.
+        Searches the corpus for several queries at once.
 
         Parameters:
-            document (str): The new document as a string.
+            queries (List[str]): The search queries.
+            top_n (int): Number of top relevant documents to return per query (default is 5).
+
+        Returns:
+            List[List[str]]: The top N relevant documents of each query, in query order.
+        """
+        scores = self.get_batch_scores(queries)
+        return [[self.corpus[i] for i in self._top_n_indices(scores[:, column], top_n)]
+                for column in range(scores.shape[1])]
+
+    def search_ids(self, query: str, top_n: int = 5) -> List[str]:
+        """
+        Searches the corpus like search, but returns the ids of the top documents instead of their text.
+
+        Parameters:
+            query (str): The search query as a string.
+            top_n (int): Number of top relevant documents to return (default is 5).
+
+        Returns:
+            List[str]: The ids of the top N relevant documents.
         """
-        self.tokenized_corpus.append(self.preprocess(document))  # Preprocess and append the document
-        self.bm25 = BM25Okapi(self.tokenized_corpus)  # Rebuild the model with the updated corpus
+        return self.search_ids_batch([query], top_n=top_n)[0]
 
-    def save_model(self, filepath: str):
+    def search_ids_batch(self, queries: List[str], top_n: int = 5) -> List[List[str]]:
         """
-        Saves the BM25 model to a file using pickle.
+        Searches the corpus for several queries at once and returns the ids of the top documents.
 
         Parameters:
-            filepath (str): Path to save the model.
+            queries (List[str]): The search queries.
+            top_n (int): Number of top relevant documents to return per query (default is 5).
+
+        Returns:
+            List[List[str]]: The ids of the top N relevant documents of each query, in query order.
         """
-        with open(filepath, 'wb') as file:
-            pickle.dump(self, file)
-        print(f"Model saved to {filepath}")
+        if self.doc_ids is None:
+            raise ValueError("this BM25 model was built without document ids")
+        scores = self.get_batch_scores(queries)
+        return [[self.doc_ids[i] for i in self._top_n_indices(scores[:, column], top_n)]
+                for column in range(scores.shape[1])]
+
+    def _load_into_memory(self):
+        """Copies a memory-mapped index into regular in-memory structures so documents can be appended."""
+        self.corpus = list(self.corpus)
+        self.doc_freq = array('q', np.asarray(self.doc_freq, dtype=np.int64).tobytes())
+        self.doc_lengths = array('d', np.asarray(self.doc_lengths, dtype=np.float64).tobytes())
+        self.term_frequencies = self.term_frequencies.tocsr()
+
+    def save_model(self, directory: str):
+        """
+        Saves the BM25 model as an index directory (see INDEX_FORMAT_VERSION): the postings and document
+        lengths as .npy arrays, the vocabulary as JSON and the raw documents as a UTF-8 blob with offsets,
+        all in a new data directory. The JSON manifest naming that directory is replaced last in one
+        atomic rename, so a reader sees either the previous index or the new one and an interrupted save
+        leaves the previous index intact. The data of the previous save is kept for processes that are
+        still loading it; older data directories are removed.
+
+        Parameters:
+            directory (str): Directory to save the index to.
+        """
+        self._refresh()
+        os.makedirs(directory, exist_ok=True)
+        previous_data = None
+        if os.path.exists(os.path.join(directory, INDEX_MANIFEST)):
+            previous_data = _read_manifest(directory).get('data')
+        data_name = f'data-{time.time_ns()}-{os.getpid()}'
+        data_dir = os.path.join(directory, data_name)
+        os.makedirs(data_dir)
+        documents = [document.encode('utf-8') for document in self.corpus]
+        offsets = np.zeros(len(documents) + 1, dtype=np.int64)
+        np.cumsum([len(document) for document in documents], out=offsets[1:])
+        vocabulary = sorted(self.vocabulary, key=self.vocabulary.get)
+        tf = self.term_frequencies
+        np.save(os.path.join(data_dir, 'postings_indptr.npy'), tf.indptr.astype(np.int64))
+        np.save(os.path.join(data_dir, 'postings_docs.npy'), tf.indices.astype(np.int32))
+        np.save(os.path.join(data_dir, 'postings_counts.npy'), tf.data.astype(np.float32))
+        np.save(os.path.join(data_dir, 'postings_weights.npy'), self.weights.data.astype(np.float32))
+        np.save(os.path.join(data_dir, 'doc_lengths.npy'), np.asarray(self.doc_lengths, dtype=np.float64))
+        np.save(os.path.join(data_dir, 'corpus_offsets.npy'), offsets)
+        with open(os.path.join(data_dir, 'corpus.bin'), 'wb') as file:
+            file.write(b''.join(documents))
+        with open(os.path.join(data_dir, 'vocabulary.json'), 'w', encoding='utf-8') as file:
+            json.dump(vocabulary, file)
+        if self.doc_ids is not None:
+            with open(os.path.join(data_dir, 'doc_ids.json'), 'w', encoding='utf-8') as file:
+                json.dump(self.doc_ids, file)
+        manifest = {
+            'format': 'bm25',
+            'version': INDEX_FORMAT_VERSION,
+            'data': data_name,
+            'k1': self.k1,
+            'b': self.b,
+            'epsilon': self.epsilon,
+            'num_documents': len(self.corpus),
+            'num_terms': len(vocabulary),
+            'total_length': self.total_length,
+            'has_doc_ids': self.doc_ids is not None,
+        }
+        _write_file(directory, INDEX_MANIFEST, json.dumps(manifest, indent=2).encode('utf-8'))
+        _remove_stale_data(directory, {data_name, previous_data} - {None})
+        print(f"Model saved to {directory}")
 
     @staticmethod
-    def load_model(filepath: str) -> 'BM25':
+    def load_model(filepath: str, preprocess_func=None, mmap: bool = True) -> 'BM25':
         """
-        Loads a BM25 model from a file.
+        Loads a BM25 model from an index directory written by save_model. The arrays are opened with
+        mmap_mode so loading is near-instant and worker processes share the same pages. Legacy pickle
+        files are still accepted and rebuilt from their raw corpus.
 
         Parameters:
-            filepath (str): Path to load the model from.
+            filepath (str): Index directory (or legacy pickle file) to load the model from.
+            preprocess_func (callable, optional): The preprocess function the index was built with.
+            mmap (bool): Map the arrays instead of reading them into memory (default is True).
 
         Returns:
             BM25: The loaded BM25 model object.
         """
-        with open(filepath, 'rb') as file:
-            model = pickle.load(file)
+        if not os.path.isdir(filepath):
+            with open(filepath, 'rb') as file:
+                model = pickle.load(file)
+            if not hasattr(model, 'doc_ids'):
+                # pickles written before the sparse engine hold a rank_bm25 model, rebuild from the raw corpus
+                model = BM25(model.corpus, preprocess_func)
+            model.index_version = BM25.get_index_version(filepath)
+            print(f"Model loaded from {filepath}")
+            return model
+
+        manifest = _read_manifest(filepath)
+        if manifest.get('format') != 'bm25' or manifest.get('version') not in (1, INDEX_FORMAT_VERSION):
+            raise ValueError(f"Unsupported BM25 index format in {filepath}: "
+                             f"{manifest.get('format')} version {manifest.get('version')}")
+        # every file is read from the data directory of this manifest, even if a new save replaces it meanwhile
+        data_dir = os.path.join(filepath, manifest['data']) if manifest['version'] > 1 else filepath
+        mmap_mode = 'r' if mmap else None
+        with open(os.path.join(data_dir, 'vocabulary.json'), 'r', encoding='utf-8') as file:
+            vocabulary = json.load(file)
+        indptr = np.load(os.path.join(data_dir, 'postings_indptr.npy'), mmap_mode=mmap_mode)
+        docs = np.load(os.path.join(data_dir, 'postings_docs.npy'), mmap_mode=mmap_mode)
+        counts = np.load(os.path.join(data_dir, 'postings_counts.npy'), mmap_mode=mmap_mode)
+        weights = np.load(os.path.join(data_dir, 'postings_weights.npy'), mmap_mode=mmap_mode)
+        shape = (manifest['num_documents'], manifest['num_terms'])
+
+        model = BM25.__new__(BM25)
+        model.k1 = manifest['k1']
+        model.b = manifest['b']
+        model.epsilon = manifest['epsilon']
+        model.preprocess_func = preprocess_func
+        model.corpus = _MappedCorpus(os.path.join(data_dir, 'corpus.bin'),
+                                     np.load(os.path.join(data_dir, 'corpus_offsets.npy'), mmap_mode=mmap_mode))
+        model.vocabulary = {term: term_id for term_id, term in enumerate(vocabulary)}
+        model.doc_ids = None
+        if manifest.get('has_doc_ids'):
+            with open(os.path.join(data_dir, 'doc_ids.json'), 'r', encoding='utf-8') as file:
+                model.doc_ids = json.load(file)
+        model.doc_freq = np.diff(indptr)
+        model.doc_lengths = np.load(os.path.join(data_dir, 'doc_lengths.npy'), mmap_mode=mmap_mode)
+        model.total_length = manifest['total_length']
+        model.term_frequencies = sparse.csc_matrix((counts, docs, indptr), shape=shape, copy=False)
+        model.weights = sparse.csc_matrix((weights, docs, indptr), shape=shape, copy=False)
+        model._pending_indptr = [0]
+        model._pending_indices = []
+        model._pending_counts = []
+        model.index_version = manifest.get('data') or BM25.get_index_version(filepath)
         print(f"Model loaded from {filepath}")
         return model
 
+    @staticmethod
+    def convert_legacy_model(pickle_path: str, directory: str, doc_id_by_text: dict,
+                             preprocess_func=None) -> 'BM25':
+        """
+        Converts a legacy pickle file (e.g. '<collection>_<type>_bm25result.pkl') into an index directory
+        with document ids, so the converted index can be searched with search_ids like a new one.
+
+        Parameters:
+            pickle_path (str): The legacy pickle file.
+            directory (str): Directory to save the converted index to.
+            doc_id_by_text (dict): Document text -> document id; every document of the pickle must be in it.
+            preprocess_func (callable, optional): The preprocess function the index was built with.
+
+        Returns:
+            BM25: The converted model, loaded from directory.
+
+        Raises:
+            ValueError: A document of the pickle has no id in doc_id_by_text.
+        """
+        corpus = list(BM25.load_model(pickle_path, preprocess_func).corpus)
+        missing = sum(1 for document in corpus if document not in doc_id_by_text)
+        if missing:
+            raise ValueError(f"{missing} of {len(corpus)} documents of {pickle_path} have no document id, "
+                             f"rebuild the index with add_documents_to_chroma instead")
+        model = BM25(corpus, preprocess_func, doc_ids=[doc_id_by_text[document] for document in corpus])
+        model.save_model(directory)
+        print(f"Converted legacy model {pickle_path} to {directory}")
+        return BM25.load_cached_model(directory)
+
+    @staticmethod
+    def get_index_version(filepath: str) -> str:
+        """
+        Returns a version string of a saved index that changes whenever the index is saved again:
+        the data directory named by the manifest, or the modification time and size of an index
+        in format version 1 or a legacy pickle file.
+        """
+        if os.path.isdir(filepath):
+            data_name = _read_manifest(filepath).get('data')
+            if data_name is not None:
+                return data_name
+            filepath = os.path.join(filepath, INDEX_MANIFEST)
+        stat = os.stat(filepath)
+        return f"{stat.st_mtime_ns}-{stat.st_size}"
+
+    @staticmethod
+    def load_cached_model(filepath: str, max_size: int = MODEL_CACHE_SIZE) -> 'BM25':
+        """
+        Loads a BM25 model through a process-wide LRU cache. The index is only read again when its
+        version (see get_index_version) changed since it was cached.
+
+        Parameters:
+            filepath (str): Index directory (or legacy pickle file) to load the model from.
+            max_size (int): Maximum number of models kept in the cache (default is MODEL_CACHE_SIZE).
+
+        Returns:
+            BM25: The cached (or freshly loaded) BM25 model object.
+        """
+        key = os.path.abspath(filepath)
+        version = BM25.get_index_version(key)
+        with _model_cache_lock:
+            entry = _model_cache.get(key)
+            if entry is not None and entry[0] == version:
+                _model_cache.move_to_end(key)
+                return entry[1]
+        model = BM25.load_model(filepath)
+        with _model_cache_lock:
+            # keyed by the version that was actually loaded, the index may have been saved again meanwhile
+            _model_cache[key] = (model.index_version, model)
+            _model_cache.move_to_end(key)
+            while len(_model_cache) > max_size:
+                _model_cache.popitem(last=False)
+        return model
+
+    @staticmethod
+    def clear_model_cache():
+        """Drops every model held by load_cached_model."""
+        with _model_cache_lock:
+            _model_cache.clear()
+
 if __name__ == "__main__":
 
     # Define the query and documents
@@ -102,10 +554,10 @@ if __name__ == "__main__":
     # print(f"Search result: {result}")
 
     # Save the model to a file
-    bm25_model.save_model('data/model/bm25result.pkl')
+    bm25_model.save_model('data/model/bm25result')
 
     # Load the model from the file
-    loaded_model = BM25.load_model('../data/model/bm25result.pkl')
+    loaded_model = BM25.load_model('../data/model/bm25result')
 
     # Verify the loaded model by searching again
     loaded_result = loaded_model.search(query, top_n=1)
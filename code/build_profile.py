@@ -0,0 +1,136 @@
+import fcntl
+import json
+import os
+import subprocess
+import threading
+
+BUILD_PROFILE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'cache', 'build_profiles.json')
+
+# Build command variants in the order they are tried for a project without a profile.
+GRADLE_BUILD_COMMANDS = [
+    "{gradle} clean build -x test ",
+    "{gradle} clean build -x test -x checkstyleMain",
+    "{gradle} clean build -x test  -x spotlessJavaCheck",
+    "{gradle} clean build -x test  -x enforceRules",
+    "{gradle} clean build -x test  -x spotlessJava",
+]
+MAVEN_BUILD_COMMANDS = [
+    "mvn clean package -DskipTests",
+    "mvn clean package -DskipTests -Dcheckstyle.skip",
+    "mvn clean package -DskipTests -Dspotless.check.skip=true",
+    "mvn clean package -DskipTests -Denforcer.skip=true",
+    "mvn clean package -DskipTests -Drat.skip=true -Dmaven.javadoc.skip=true",
+]
+
+_build_profile = None
+_build_profile_lock = threading.Lock()
+
+
+def get_build_tool(project_dir):
+    """Returns 'gradle' or 'maven' depending on the build files of the project (default is gradle)."""
+    if any(os.path.exists(os.path.join(project_dir, name)) for name in ("gradlew", "build.gradle", "build.gradle.kts")):
+        return "gradle"
+    if os.path.exists(os.path.join(project_dir, "pom.xml")):
+        return "maven"
+    return "gradle"
+
+
+def default_build_commands(project_dir):
+    """The build command variants of the project's build tool, in their default order."""
+    if get_build_tool(project_dir) == "maven":
+        return list(MAVEN_BUILD_COMMANDS)
+    gradle = "./gradlew" if os.path.exists(os.path.join(project_dir, "gradlew")) else "gradle"
+    return [command.format(gradle=gradle) for command in GRADLE_BUILD_COMMANDS]
+
+
+def _git_output(project_dir, *args):
+    result = subprocess.run(["git", "-C", project_dir, *args], text=True, capture_output=True)
+    return result.stdout.strip() if result.returncode == 0 else None
+
+
+class BuildProfile:
+    def __init__(self, profile_path):
+        """
+        Per-project record of the build command variant that works. For every project it keeps the
+        commands that succeeded together with the range of commit times they succeeded for, so the
+        next build of a nearby commit tries the right command first instead of paying for the failing
+        variants again. The profile is a JSON file shared by all runs.
+
+        Parameters:
+            profile_path (str): Path of the JSON profile file.
+        """
+        self.profile_path = profile_path
+        self.lock = threading.Lock()
+
+    def _load(self):
+        if not os.path.exists(self.profile_path):
+            return {}
+        with open(self.profile_path, 'r', encoding='utf-8') as file:
+            return json.load(file)
+
+    @staticmethod
+    def project_key(project_dir):
+        """The name of the project's repository; worktrees of a repository share its key."""
+        common_dir = _git_output(project_dir, "rev-parse", "--git-common-dir")
+        if common_dir:
+            common_dir = os.path.abspath(os.path.join(project_dir, common_dir))
+            if os.path.basename(common_dir) == ".git":
+                return os.path.basename(os.path.dirname(common_dir))
+        return os.path.basename(os.path.abspath(project_dir))
+
+    @staticmethod
+    def commit_time(project_dir):
+        """Commit time of the checked out commit, None outside a git repository."""
+        commit_time = _git_output(project_dir, "show", "-s", "--format=%ct", "HEAD")
+        return int(commit_time) if commit_time else None
+
+    def candidate_commands(self, project_dir):
+        """
+        The build commands to try for the checked out commit: the profiled commands whose commit
+        range covers the commit, then the other profiled commands by distance of their range, then
+        the remaining default variants.
+        """
+        with self.lock:
+            entries = self._load().get(self.project_key(project_dir), {}).get(get_build_tool(project_dir), [])
+        commit_time = self.commit_time(project_dir)
+
+        def distance(entry):
+            if commit_time is None:
+                return 0
+            return max(entry["first"] - commit_time, commit_time - entry["last"], 0)
+
+        commands = [entry["command"] for entry in sorted(entries, key=distance)]
+        commands += [command for command in default_build_commands(project_dir) if command not in commands]
+        return commands
+
+    def record_success(self, project_dir, command):
+        """Records that command built the checked out commit of the project."""
+        project_key = self.project_key(project_dir)
+        build_tool = get_build_tool(project_dir)
+        commit_time = self.commit_time(project_dir) or 0
+        os.makedirs(os.path.dirname(os.path.abspath(self.profile_path)), exist_ok=True)
+        # the evaluation worker processes share the file, the lock file serializes their updates
+        with self.lock, open(f"{self.profile_path}.lock", 'w') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            # re-read the file so profiles written by other processes are kept
+            profiles = self._load()
+            entries = profiles.setdefault(project_key, {}).setdefault(build_tool, [])
+            entry = next((entry for entry in entries if entry["command"] == command), None)
+            if entry is None:
+                entries.append({"command": command, "first": commit_time, "last": commit_time})
+            else:
+                entry["first"] = min(entry["first"], commit_time)
+                entry["last"] = max(entry["last"], commit_time)
+            tmp_path = f"{self.profile_path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as file:
+                json.dump(profiles, file, indent=2)
+            os.replace(tmp_path, self.profile_path)
+
+
+def get_build_profile():
+    """Returns the process-wide build profile at BUILD_PROFILE_PATH."""
+    global _build_profile
+    with _build_profile_lock:
+        if _build_profile is None:
+            _build_profile = BuildProfile(BUILD_PROFILE_PATH)
+    return _build_profile
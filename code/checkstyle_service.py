@@ -0,0 +1,147 @@
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+import xml.etree.ElementTree as ElementTree
+
+from daemon_client import DaemonClient, DaemonStartError
+from java_home import java_env
+
+TOOLS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'tools')
+CHECKSTYLE_JAR = os.path.join(TOOLS_DIR, 'checkstyle-10.20.1-all.jar')
+DAEMON_SOURCE = os.path.join(TOOLS_DIR, 'checkstyle-daemon', 'CheckstyleDaemon.java')
+
+# The project's copy of the Sun checks if there is one, the configuration bundled with Checkstyle otherwise.
+SUN_CHECKS_CONFIG = os.path.join(os.path.dirname(TOOLS_DIR), 'config', 'sun_checks.xml')
+
+# Java version Checkstyle runs with.
+CHECKSTYLE_JAVA_VERSION = 17
+
+# Number of requests the daemon works on at the same time.
+MAX_IN_FLIGHT = 4
+
+_services = {}
+_failed_configs = set()
+_services_lock = threading.Lock()
+
+
+def default_config():
+    """The Checkstyle configuration of the style checks."""
+    return SUN_CHECKS_CONFIG if os.path.exists(SUN_CHECKS_CONFIG) else "/sun_checks.xml"
+
+
+def _check_name(source):
+    """The name Checkstyle shows in brackets for a check class, e.g. LineLength."""
+    name = source.rsplit(".", 1)[-1]
+    return name[:-len("Check")] if name.endswith("Check") else name
+
+
+class CheckstyleService(DaemonClient):
+    def __init__(self, config_file, jar=CHECKSTYLE_JAR, java_version=CHECKSTYLE_JAVA_VERSION,
+                 max_in_flight=MAX_IN_FLIGHT):
+        """
+        Client of a long-lived Checkstyle daemon (CheckstyleDaemon.java). The configuration is parsed
+        once when the daemon starts; a check sends the source text of the files and gets back their
+        violations, without a JVM start or temp files on this side.
+
+        Parameters:
+            config_file (str): The Checkstyle configuration, a file or a bundled one like /sun_checks.xml.
+            jar (str): The Checkstyle jar with all dependencies.
+            java_version (int): The Java version to run the daemon with.
+            max_in_flight (int): Number of requests the daemon runs at the same time.
+        """
+        command = ["java", "-cp", jar, DAEMON_SOURCE, config_file, str(max_in_flight)]
+        super().__init__("Checkstyle", command, env=java_env(java_version))
+
+    def check(self, sources, timeout=None):
+        """
+        Checks the style of one or more files.
+
+        Parameters:
+            sources (dict): File name (e.g. TempClass.java or a relative path) -> source code.
+            timeout (float, optional): Seconds to wait for the result.
+
+        Returns:
+            dict: File name -> list of violations, each a dict with line, column, severity, message and check.
+        """
+        response = self.request({"files": [{"name": name, "source": source} for name, source in sources.items()]},
+                                timeout)
+        if "error" in response:
+            raise RuntimeError(f"Checkstyle failed: {response['error']}")
+        violations = {name: [] for name in sources}
+        for violation in response["violations"]:
+            name = violation.pop("file").replace(os.sep, "/")
+            violations.setdefault(name, []).append(violation)
+        return violations
+
+
+def _check_with_command_line(sources, config_file):
+    """Runs the Checkstyle jar once for the files, returns the violations like CheckstyleService.check."""
+    work_dir = tempfile.mkdtemp(prefix="checkstyle-")
+    try:
+        for name, source in sources.items():
+            path = os.path.join(work_dir, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "w", encoding="utf-8") as file:
+                file.write(source)
+        result = subprocess.run(["java", "-jar", CHECKSTYLE_JAR, "-c", config_file, "-f", "xml",
+                                 *[os.path.join(work_dir, name) for name in sources]],
+                                capture_output=True, text=True, env=java_env(CHECKSTYLE_JAVA_VERSION))
+        xml_start = result.stdout.find("<?xml")
+        if xml_start < 0:
+            raise RuntimeError(f"Checkstyle failed: {result.stderr}")
+        violations = {name: [] for name in sources}
+        for file_element in ElementTree.fromstring(result.stdout[xml_start:]).iter("file"):
+            name = os.path.relpath(file_element.get("name"), work_dir).replace(os.sep, "/")
+            for error in file_element.iter("error"):
+                violations.setdefault(name, []).append({
+                    "line": int(error.get("line", 0)), "column": int(error.get("column", 0)),
+                    "severity": error.get("severity"), "message": error.get("message"),
+                    "check": _check_name(error.get("source", ""))})
+        return violations
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def run_checkstyle(sources, config_file=None):
+    """
+    Checks the style of Java sources with the process-wide Checkstyle daemon of the configuration.
+    If the daemon cannot be started, the Checkstyle jar is run once for all the files instead.
+
+    Parameters:
+        sources (dict): File name -> source code; all files are checked in one request.
+        config_file (str, optional): The Checkstyle configuration (default is default_config()).
+
+    Returns:
+        dict: File name -> list of violations, each a dict with line, column, severity, message and check.
+    """
+    config_file = config_file or default_config()
+    with _services_lock:
+        service = None
+        if config_file not in _failed_configs:
+            service = _services.get(config_file)
+            if service is None:
+                service = _services[config_file] = CheckstyleService(config_file)
+    if service is not None:
+        try:
+            return service.check(sources)
+        except DaemonStartError as e:
+            print(f"{e}, running the command line tool instead")
+            with _services_lock:
+                _failed_configs.add(config_file)
+        except RuntimeError as e:
+            print(f"{e}, running the command line tool instead")
+    return _check_with_command_line(sources, config_file)
+
+
+def format_violations(violations, line_offset=0):
+    """
+    Formats violations as the style check tools report them, one 'line:L column:C: message [Check]' per line.
+
+    Parameters:
+        violations (list): The violations of one file.
+        line_offset (int): Added to every line number.
+    """
+    return "\n".join(f"line:{violation['line'] + line_offset} column:{violation['column']}: "
+                     f"{violation['message']} [{violation['check']}]" for violation in violations)
@@ -0,0 +1,114 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+
+from java_home import java_major_version
+
+# Part of every key; bump it when the build commands change so old results are not reused.
+COMPILE_CACHE_VERSION = 1
+
+COMPILE_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'cache', 'compile_results.sqlite')
+
+# A javac error in a build log, as Maven ('[ERROR] /src/A.java:[12,5] ...') or javac/Gradle ('A.java:12: error: ...')
+# report it. Failed builds without one (network, dependency downloads, out of memory, a crashed daemon) may
+# pass when they are run again, so they are not cached.
+COMPILER_ERROR = re.compile(r"\.java:(\[\d+,\d+\]|\d+: error:)")
+
+_compile_cache = None
+_compile_cache_lock = threading.Lock()
+
+
+class CompileCache:
+    def __init__(self, cache_path):
+        """
+        Persistent cache of build results. An entry is keyed by the commit, the JDK and the hash of
+        every replaced file (path and content), and stores the build success flag and the normalized
+        error log, so compiling the same code again skips the checkout and the build. Only successful
+        builds and builds that failed with compiler errors are cached.
+
+        Parameters:
+            cache_path (str): Path of the SQLite cache file.
+        """
+        os.makedirs(os.path.dirname(os.path.abspath(cache_path)), exist_ok=True)
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.saved_seconds = 0.0
+        self.connection = sqlite3.connect(cache_path, check_same_thread=False, timeout=60)
+        self.connection.execute("CREATE TABLE IF NOT EXISTS compile_results "
+                                "(key TEXT PRIMARY KEY, success INTEGER NOT NULL, log TEXT NOT NULL, "
+                                "build_seconds REAL NOT NULL, hits INTEGER NOT NULL DEFAULT 0)")
+        self.connection.commit()
+
+    @staticmethod
+    def make_key(commit_id, java_version, replaced_files):
+        """
+        The cache key of a build.
+
+        Parameters:
+            commit_id (str): The commit whose parent is built.
+            java_version (int | float | str): The JDK of the build.
+            replaced_files (dict): Path relative to the project -> new content of every replaced file.
+        """
+        file_hashes = sorted((path.replace(os.sep, "/"), hashlib.sha256(code.encode('utf-8')).hexdigest())
+                             for path, code in replaced_files.items())
+        key = [COMPILE_CACHE_VERSION, commit_id, java_major_version(java_version), file_hashes]
+        return hashlib.sha256(json.dumps(key).encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def is_cacheable(success, log):
+        """Whether a build result is reproducible: a success, or a failure with compiler errors in its log."""
+        if success:
+            return True
+        lines = log if isinstance(log, list) else [log]
+        return any(COMPILER_ERROR.search(str(line)) for line in lines)
+
+    def get(self, key):
+        """Returns the cached (success, log) of a build, or None."""
+        with self.lock:
+            row = self.connection.execute("SELECT success, log, build_seconds FROM compile_results WHERE key = ?",
+                                          (key,)).fetchone()
+            # failures without compiler errors were cached by earlier versions, build them again
+            if row is None or not self.is_cacheable(row[0], json.loads(row[1])):
+                self.misses += 1
+                return None
+            self.connection.execute("UPDATE compile_results SET hits = hits + 1 WHERE key = ?", (key,))
+            self.connection.commit()
+            self.hits += 1
+            self.saved_seconds += row[2]
+        return bool(row[0]), json.loads(row[1])
+
+    def put(self, key, success, log, build_seconds):
+        """Stores the result of a build that took build_seconds, unless it failed without compiler errors."""
+        if not self.is_cacheable(success, log):
+            print("Build failed without compiler errors, not caching the result.")
+            return
+        with self.lock:
+            self.connection.execute("INSERT OR REPLACE INTO compile_results (key, success, log, build_seconds) "
+                                    "VALUES (?, ?, ?, ?)", (key, int(success), json.dumps(log), build_seconds))
+            self.connection.commit()
+
+    def stats(self) -> dict:
+        """
+        Hits, misses and build seconds saved in this process, plus the number of entries and the
+        hits and build seconds saved over the lifetime of the cache file.
+        """
+        with self.lock:
+            entries, total_hits, total_saved = self.connection.execute(
+                "SELECT COUNT(*), COALESCE(SUM(hits), 0), COALESCE(SUM(hits * build_seconds), 0) "
+                "FROM compile_results").fetchone()
+        return {"hits": self.hits, "misses": self.misses, "saved_seconds": round(self.saved_seconds, 1),
+                "entries": entries, "total_hits": total_hits, "total_saved_seconds": round(total_saved, 1)}
+
+
+def get_compile_cache():
+    """Returns the process-wide compile cache at COMPILE_CACHE_PATH, opening it on first use."""
+    global _compile_cache
+    with _compile_cache_lock:
+        if _compile_cache is None:
+            _compile_cache = CompileCache(COMPILE_CACHE_PATH)
+    return _compile_cache
+
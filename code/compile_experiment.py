@@ -2,8 +2,15 @@ import json
 import os
 import re
 import subprocess
+import time
 
+from build_profile import get_build_profile
+from compile_cache import CompileCache, get_compile_cache
+from incremental_compile import incremental_compile
+from java_home import java_env
+from scratch_space import ScratchSpace
 from util import save_json
+from worktree_pool import get_worktree_pool
 
 # file_path = '/Users/yisenxu/Downloads/Research/SOEN6491/Code/rag_refactoring/data/refactoring_info/gson_em_pure_refactoring_w_sc_v4_filter.json'
 # project_path = '/Users/yisenxu/Downloads/Research/SOEN6491/Projects/llm-refactoring-miner/tmp/gson'
@@ -11,9 +18,9 @@ from util import save_json
 # with open(file_path, 'r') as file:
 #     data = json.load(file)
 
-def run_command(command):
+def run_command(command, cwd=None, env=None):
     """运行系统命令并捕获输出"""
-    result = subprocess.run(command, shell=True, text=True, capture_output=True)
+    result = subprocess.run(command, shell=True, text=True, capture_output=True, cwd=cwd, env=env)
     success = result.returncode == 0
     if success:
         print(f"Command succeeded: {command}")
@@ -37,30 +44,35 @@ def replace_java_code(file_path, new_code):
         print(f"Failed to replace code in {file_path}: {e}")
         return False
 
-def compile_project():
-    """编译 Maven 项目"""
+def compile_project(project_dir=None, java_version=None):
+    """编译 Maven 项目 (in project_dir, default is the current directory, with the JDK of java_version)"""
+    env = java_env(java_version)
+    project_dir = project_dir or os.getcwd()
     # success, result_first = run_command("mvn clean package -DskipTests=true -Dmaven.test.skip=true")
     # success, result_first = run_command("mvn clean package -Drat.skip=true -Dmaven.javadoc.skip=true")
     # success, result = run_command("./gradlew clean build -x checkstyleMain")
     # success, result_first = run_command("./gradlew clean build -x test  -x spotlessJavaCheck")
-    # 
-    success, result_first = run_command("./gradlew clean build -x test ")
-    if not success:
-        success, result = run_command("./gradlew clean build -x test -x checkstyleMain")
-    if not success:
-        success, result = run_command("./gradlew clean build -x test  -x spotlessJavaCheck")
-    if not success:
-        success, result = run_command("./gradlew clean build -x test  -x enforceRules")
-    if not success:
-        success, result = run_command("./gradlew clean build -x test  -x spotlessJava")
-    
+    #
+    # try the command variant that worked for this project before first, the other variants only if it fails
+    build_profile = get_build_profile()
+    success, result_first = False, None
+    for command in build_profile.candidate_commands(project_dir):
+        success, result = run_command(command, cwd=project_dir, env=env)
+        if result_first is None:
+            result_first = result
+        if success:
+            build_profile.record_success(project_dir, command)
+            break
+
     str_result = ""
     if not success:
         # 打印构建失败的详细信息
         str_result = "\nBuild failed. Details:\n" + result_first.stdout +result_first.stderr
         ansi_escape = re.compile(r'\x1B\[[0-9;]*[a-zA-Z]')
         str_result = ansi_escape.sub('', str_result)
-        str_result = re.findall(r'\[ERROR\].*', str_result)
+        # Maven's [ERROR] lines and the javac errors Gradle prints ('A.java:12: error: ...'), so a Gradle
+        # compile failure keeps its compiler errors and can be cached like a Maven one
+        str_result = re.findall(r'\[ERROR\].*|^.*\.java:\d+: error: .*$', str_result, flags=re.MULTILINE)
         print("\nBuild failed. Details:\n")
         print(result_first.stdout)  # 打印标准输出
         print("---------------------------------------------------------------line")
@@ -162,9 +174,7 @@ def compile_current_commit(project_dir, commit_id, compile_jdk):
     # Step 4: 执行 Maven 构建命令
     print("Running Maven build for the previous commit...")
     # modify_build_file(project_dir)
-    switch_java_version(compile_jdk)
-    compile_re, log = compile_project()
-    switch_java_version(17)
+    compile_re, log = compile_project(java_version=compile_jdk)
     if not compile_re:
         print("Build failed for the previous commit.")
     else:
@@ -203,27 +213,62 @@ def checkout_previous_commit(commit_id, project_dir):
         print("Failed to checkout previous commit. Exiting.")
         return False, "Failed to checkout previous commit."
 
-def main(project_dir, commit_id, file_path, new_code):
+def get_cached_compile_result(cache_key):
+    """Returns the cached (compile_result, log) of a build, or None if it was never run."""
+    cached = get_compile_cache().get(cache_key)
+    if cached is None:
+        return None
+    success, log = cached
+    print(f"Compile cache hit, skipping checkout and build. {get_compile_cache().stats()}")
+    return [True, True, success], log
+
+
+def cache_compile_result(cache_key, compile_result, log, start_time):
+    """Caches the result of a build that ran, i.e. the code was replaced and the build finished."""
+    if compile_result[0] and compile_result[1]:
+        get_compile_cache().put(cache_key, compile_result[2], log, time.monotonic() - start_time)
+
+
+def normalize_build_log(log, worktree_dir, project_dir):
+    """Maps the worktree paths in a build log back to the project directory."""
+    if isinstance(log, list):
+        return [line.replace(worktree_dir, project_dir) for line in log]
+    return log.replace(worktree_dir, project_dir)
+
+
+def main(project_dir, commit_id, file_path, new_code, java_version=None, incremental=False):
     compile_result = [False, False, False]
-    # Step 1: 切换到指定目录
-    try:
-        os.chdir(project_dir)
-        print(f"Switched to project directory: {project_dir}")
-    except Exception as e:
-        print(f"Failed to switch to directory {project_dir}: {e}")
-        return compile_result, "Failed to switch to directory."
-    force_checkout_commit(commit_id)
-    # Step 2: 获取指定 commit 的上一个 commit
-    prev_commit = get_previous_commit(commit_id)
+    cache_key = CompileCache.make_key(commit_id, java_version, {os.path.relpath(file_path, project_dir): new_code})
+    cached = get_cached_compile_result(cache_key)
+    if cached is not None:
+        return cached
+    if incremental:
+        # javac only, against the baseline build of the previous commit; None means a full build is needed
+        javac_result = incremental_compile(project_dir, commit_id, {file_path: new_code}, java_version)
+        if javac_result is not None:
+            success, log = javac_result
+            print(f"Incremental compile {'succeeded' if success else 'failed'}.")
+            return [True, True, success], "Build succeeded after code replacement." if success else log
+        print("Incremental compile is not conclusive, running a full build...")
+    start_time = time.monotonic()
+    # Step 1: 获取指定 commit 的上一个 commit
+    prev_commit = get_previous_commit(commit_id, project_dir)
     if not prev_commit:
         print("Failed to retrieve previous commit. Exiting.")
         return compile_result, "Failed to retrieve previous commit."
 
-    # Step 3: 切换到上一个 commit
-    if not force_checkout_commit(prev_commit):
-        print("Failed to checkout previous commit. Exiting.")
+    # Step 2: 在 worktree 中切换到上一个 commit, the shared clone is left untouched
+    try:
+        with get_worktree_pool(project_dir).borrow(prev_commit) as worktree_dir:
+            compile_result, log = _build_with_new_code(compile_result, project_dir, worktree_dir, file_path, new_code, java_version)
+    except RuntimeError as e:
+        print(f"{e}. Exiting.")
         return compile_result, "Failed to checkout previous commit."
+    cache_compile_result(cache_key, compile_result, log, start_time)
+    return compile_result, log
+
 
+def _build_with_new_code(compile_result, project_dir, worktree_dir, file_path, new_code, java_version):
     # # Step 4: 执行 Maven 构建命令
     # print("Running Maven build for the previous commit...")
     # compile_re, log = compile_project()
@@ -238,6 +283,7 @@ def main(project_dir, commit_id, file_path, new_code):
     compile_result[0] = True
 
     # Step 5: 替换 Java 文件中的代码
+    file_path = os.path.join(worktree_dir, os.path.relpath(file_path, project_dir))
     print(f"Replacing code in {file_path}...")
     if not replace_java_code(file_path, new_code):
         print("Failed to replace code. Exiting.")
@@ -247,36 +293,43 @@ def main(project_dir, commit_id, file_path, new_code):
     # modify_build_file(project_dir)
     # Step 6: 再次执行 Maven 构建命令
     print("Running Maven build after code replacement...")
-    compile_result_after_replacement, log = compile_project()
+    compile_result_after_replacement, log = compile_project(worktree_dir, java_version)
     if compile_result_after_replacement:
         print("Build succeeded after code replacement.")
         compile_result[2] = True
         return compile_result, "Build succeeded after code replacement."
     else:
         print("Build failed after code replacement.")
-        return compile_result, log
+        return compile_result, normalize_build_log(log, worktree_dir, project_dir)
 
-def compile_for_move_operation(project_dir, commit_id, original_file_path, original_refactored_code, target_file_path, target_refactored_code):
+def compile_for_move_operation(project_dir, commit_id, original_file_path, original_refactored_code, target_file_path, target_refactored_code, java_version=None):
     compile_result = [False, False, False]
-    # Step 1: 切换到指定目录
-    try:
-        os.chdir(project_dir)
-        print(f"Switched to project directory: {project_dir}")
-    except Exception as e:
-        print(f"Failed to switch to directory {project_dir}: {e}")
-        return compile_result, "Failed to switch to directory."
-    force_checkout_commit(commit_id)
-    # Step 2: 获取指定 commit 的上一个 commit
-    prev_commit = get_previous_commit(commit_id)
+    cache_key = CompileCache.make_key(commit_id, java_version, {
+        os.path.relpath(original_file_path, project_dir): original_refactored_code,
+        os.path.relpath(target_file_path, project_dir): target_refactored_code,
+    })
+    cached = get_cached_compile_result(cache_key)
+    if cached is not None:
+        return cached
+    start_time = time.monotonic()
+    # Step 1: 获取指定 commit 的上一个 commit
+    prev_commit = get_previous_commit(commit_id, project_dir)
     if not prev_commit:
         print("Failed to retrieve previous commit. Exiting.")
         return compile_result, "Failed to retrieve previous commit."
 
-    # Step 3: 切换到上一个 commit
-    if not force_checkout_commit(prev_commit):
-        print("Failed to checkout previous commit. Exiting.")
+    # Step 2: 在 worktree 中切换到上一个 commit, the shared clone is left untouched
+    try:
+        with get_worktree_pool(project_dir).borrow(prev_commit) as worktree_dir:
+            compile_result, log = _build_with_moved_code(compile_result, project_dir, worktree_dir, original_file_path, original_refactored_code, target_file_path, target_refactored_code, java_version)
+    except RuntimeError as e:
+        print(f"{e}. Exiting.")
         return compile_result, "Failed to checkout previous commit."
+    cache_compile_result(cache_key, compile_result, log, start_time)
+    return compile_result, log
 
+
+def _build_with_moved_code(compile_result, project_dir, worktree_dir, original_file_path, original_refactored_code, target_file_path, target_refactored_code, java_version):
     # # Step 4: 执行 Maven 构建命令
     # print("Running Maven build for the previous commit...")
     # compile_re, log = compile_project()
@@ -288,6 +341,8 @@ def compile_for_move_operation(project_dir, commit_id, original_file_path, origi
     compile_result[0] = True
 
     # Step 5: 替换 Java 文件中的代码
+    original_file_path = os.path.join(worktree_dir, os.path.relpath(original_file_path, project_dir))
+    target_file_path = os.path.join(worktree_dir, os.path.relpath(target_file_path, project_dir))
     if not replace_java_code(original_file_path, original_refactored_code):
         print("Failed to replace code. Exiting.")
         return compile_result, "Failed to replace code."
@@ -299,73 +354,18 @@ def compile_for_move_operation(project_dir, commit_id, original_file_path, origi
     compile_result[1] = True
     # Step 6: 再次执行 Maven 构建命令
     print("Running Maven build after code replacement...")
-    compile_result_after_replacement, log = compile_project()
+    compile_result_after_replacement, log = compile_project(worktree_dir, java_version)
     if compile_result_after_replacement:
         print("Build succeeded after code replacement.")
         compile_result[2] = True
         return compile_result, "Build succeeded after code replacement."
     else:
         print("Build failed after code replacement.")
-        return compile_result, log
-
-def update_config_for_jenv():
-    # 定义要添加到 .bashrc 的内容
-    bashrc_content = """
-    export PATH="$HOME/.jenv/bin:$PATH"
-    eval "$(jenv init -)"
-    """
-
-    # 获取当前用户的主目录
-    home_dir = os.path.expanduser("~")
-
-    # 构建 .bashrc 路径
-    bashrc_path = os.path.join(home_dir, '.bashrc')
-
-    # 打开并追加内容到 .bashrc
-    with open(bashrc_path, 'a') as bashrc_file:
-        bashrc_file.write(bashrc_content)
-
-    # 执行 source ~/.bashrc 命令
-    subprocess.run(['source', bashrc_path], shell=True, executable='/bin/bash')
-
-    print("配置已更新并执行 source ~/.bashrc")
-
-def switch_java_version(version):
-    """
-    通过命令行切换 Java 版本。
-
-    :param version: 要切换的 Java 版本（如 '17' 或 '11'）。
-    :return: None
-    """
-    try:
-        # 构建 jenv 切换命令
-
-        command = ["jenv", "local", str(version)]
-
-        # 执行命令
-        subprocess.run(command, check=True)
-
-        # 检查是否切换成功
-        result = subprocess.run(["jenv", "version"], capture_output=True, text=True, check=True)
-        if str(version) in result.stdout:
-            print(f"成功切换到 Java {version}。")
-        else:
-            print(f"切换到 Java {version} 失败。当前版本: {result.stdout.strip()}")
-    except subprocess.CalledProcessError as e:
-        print(f"切换 Java 版本失败: {e}")
-    except FileNotFoundError:
-        print("未找到 jenv 命令，请确保 jenv 已正确安装并在路径中。")
+        return compile_result, normalize_build_log(log, worktree_dir, project_dir)
 
-def get_compile_result_for_extract_method(project_dir, commit_id, file_path, refactored_code, java_version = 11):
+def get_compile_result_for_extract_method(project_dir, commit_id, file_path, refactored_code, java_version = 11, incremental = False):
 
-    switch_java_version(java_version)
-    compile_result, log = main(project_dir, commit_id, file_path, refactored_code)
-    switch_java_version(17)
-    try:
-        os.chdir("/Users/yisenxu/Downloads/Research/SOEN6491/Code/rag_refactoring")
-        print(f"Switched to project directory: {project_dir}")
-    except Exception as e:
-        print(f"Failed to switch to directory {project_dir}: {e}")
+    compile_result, log = main(project_dir, commit_id, file_path, refactored_code, java_version, incremental)
     if compile_result[0] and compile_result[1] and compile_result[2]:
         return True, "This commit can be compile and test successfully."
     if compile_result[0] and compile_result[1]:
@@ -374,15 +374,8 @@ def get_compile_result_for_extract_method(project_dir, commit_id, file_path, ref
         raise Exception("Failed to compile the previous commit.")
 
 
-def get_compile_result_in_commit(project_dir, commit_id, file_path, refactored_code, java_version = 11):
-    switch_java_version(java_version)
-    compile_result, log = main(project_dir, commit_id, file_path, refactored_code)
-    switch_java_version(17)
-    try:
-        os.chdir("/Users/yisenxu/Downloads/Research/SOEN6491/Code/rag_refactoring")
-        print(f"Switched to project directory: {project_dir}")
-    except Exception as e:
-        print(f"Failed to switch to directory {project_dir}: {e}")
+def get_compile_result_in_commit(project_dir, commit_id, file_path, refactored_code, java_version = 11, incremental = False):
+    compile_result, log = main(project_dir, commit_id, file_path, refactored_code, java_version, incremental)
     if compile_result[0] and compile_result[1] and compile_result[2]:
         return True, "This commit can be compile and test successfully."
     if compile_result[0] and compile_result[1]:
@@ -391,14 +384,7 @@ def get_compile_result_in_commit(project_dir, commit_id, file_path, refactored_c
         raise Exception("Failed to compile the previous commit.")
 
 def get_compile_result_move_operation(project_dir, commit_id, superclass_file_path, superclass_refactored_code, subclass_file_path, subclass_refactored_code, java_version = 11):
-    switch_java_version(java_version)
-    compile_result, log = compile_for_move_operation(project_dir, commit_id, superclass_file_path, superclass_refactored_code, subclass_file_path, subclass_refactored_code)
-    switch_java_version(17)
-    try:
-        os.chdir("/Users/yisenxu/Downloads/Research/SOEN6491/Code/rag_refactoring")
-        print(f"Switched to project directory: {project_dir}")
-    except Exception as e:
-        print(f"Failed to switch to directory {project_dir}: {e}")
+    compile_result, log = compile_for_move_operation(project_dir, commit_id, superclass_file_path, superclass_refactored_code, subclass_file_path, subclass_refactored_code, java_version)
     if compile_result[0] and compile_result[1] and compile_result[2]:
         return True, "This commit can be compile and test successfully."
     if compile_result[0] and compile_result[1]:
@@ -407,9 +393,9 @@ def get_compile_result_move_operation(project_dir, commit_id, superclass_file_pa
         raise Exception("Failed to compile the previous commit.")
 
 
-def get_previous_commit(commit_id):
+def get_previous_commit(commit_id, project_dir=None):
     """获取指定 commit 的上一个 commit"""
-    result = subprocess.run(f"git rev-parse {commit_id}~1", shell=True, text=True, capture_output=True)
+    result = subprocess.run(f"git rev-parse {commit_id}~1", shell=True, text=True, capture_output=True, cwd=project_dir)
     if result.returncode == 0:
         return result.stdout.strip()
     else:
@@ -502,13 +488,11 @@ def check_baseline_refactoring_result():
          result = process_experiment_result(file_path, 0, 3)
          process_result.extend(result)
     save_json(output_file_path, process_result)
-    switch_java_version(1.8)
     for refactoring in process_result:
         commit_id = refactoring['commitId']
         file_path = project_dir + '/' + refactoring['filePath']
-        compile_result, log = main(project_dir, commit_id, file_path, refactoring['agentRefactoredCode'])
+        compile_result, log = main(project_dir, commit_id, file_path, refactoring['agentRefactoredCode'], 1.8)
         refactoring['compileResult'] = compile_result
-    switch_java_version(17)
     save_json(compile_result_file_path, process_result)
 
 def get_ast_accuracy(source_code_before_for_whole, refactored_class_code):
@@ -634,16 +618,13 @@ def get_refactoring_miner_result():
         source_code_before_for_whole = refactoring['sourceCodeBeforeForWhole']
         refactored_class_code = refactoring['agentRefactoredCode']
         refactoring_type = refactoring['type']
-        file_path_before = "/Users/yisenxu/Downloads/Research/SOEN6491/Code/rag_refactoring/data/tmp/source_code_before_for_whole.txt"
-        file_path_after = "/Users/yisenxu/Downloads/Research/SOEN6491/Code/rag_refactoring/data/tmp/source_code_after_for_whole.txt"
-        with open(file_path_before, "w", encoding="utf-8") as file:
-            file.write(source_code_before_for_whole)
-        with open(file_path_after, "w", encoding="utf-8") as file:
-            file.write(refactored_class_code)
         java_file_path = refactoring['filePath']
-        exe_result = subprocess.run(
-            ["./data/tools/RefactoringMiner-3.0.9/bin/RefactoringMiner", "-scr", java_file_path, file_path_before,
-             file_path_after, refactoring_type], capture_output=True, text=True)
+        with ScratchSpace() as scratch:
+            file_path_before = scratch.write("source_code_before_for_whole.txt", source_code_before_for_whole)
+            file_path_after = scratch.write("source_code_after_for_whole.txt", refactored_class_code)
+            exe_result = subprocess.run(
+                ["./data/tools/RefactoringMiner-3.0.9/bin/RefactoringMiner", "-scr", java_file_path, file_path_before,
+                 file_path_after, refactoring_type], capture_output=True, text=True)
         refactoring_result = exe_result.stdout
         last_line = refactoring_result.strip().split('\n')[-1]
         result_word = [word for word in last_line.split()]
@@ -664,29 +645,24 @@ def get_result_without_agent_workflow():
         source_code_before_for_whole = refactoring['sourceCodeBeforeForWhole']
         refactored_class_code = refactoring['agentRefactoredCode']
         refactoring_type = refactoring['type']
-        file_path_before = "/Users/yisenxu/Downloads/Research/SOEN6491/Code/rag_refactoring/data/tmp/source_code_before_for_whole.txt"
-        file_path_after = "/Users/yisenxu/Downloads/Research/SOEN6491/Code/rag_refactoring/data/tmp/source_code_after_for_whole.txt"
-        with open(file_path_before, "w", encoding="utf-8") as file:
-            file.write(source_code_before_for_whole)
-        with open(file_path_after, "w", encoding="utf-8") as file:
-            file.write(refactored_class_code)
         java_file_path = refactoring['filePath']
-        exe_result = subprocess.run(
-            ["./data/tools/RefactoringMiner-3.0.9/bin/RefactoringMiner", "-scr", java_file_path, file_path_before,
-             file_path_after, refactoring_type], capture_output=True, text=True)
+        with ScratchSpace() as scratch:
+            file_path_before = scratch.write("source_code_before_for_whole.txt", source_code_before_for_whole)
+            file_path_after = scratch.write("source_code_after_for_whole.txt", refactored_class_code)
+            exe_result = subprocess.run(
+                ["./data/tools/RefactoringMiner-3.0.9/bin/RefactoringMiner", "-scr", java_file_path, file_path_before,
+                 file_path_after, refactoring_type], capture_output=True, text=True)
         refactoring_result = exe_result.stdout
         last_line = refactoring_result.strip().split('\n')[-1]
         result_word = [word for word in last_line.split()]
         refactoring['refactoringMinerResult'] = result_word
     save_json(compile_result_file_path, process_result)
     project_dir = "/Users/yisenxu/Downloads/Research/SOEN6491/Projects/llm-refactoring-miner/tmp/gson"
-    switch_java_version(1.8)
     for refactoring in process_result:
         commit_id = refactoring['commitId']
         file_path = project_dir + '/' + refactoring['filePath']
-        compile_result, log = main(project_dir, commit_id, file_path, refactoring['agentRefactoredCode'])
+        compile_result, log = main(project_dir, commit_id, file_path, refactoring['agentRefactoredCode'], 1.8)
         refactoring['compileResult'] = compile_result
-    switch_java_version(17)
     save_json(compile_result_file_path, process_result)
 
 if __name__ == "__main__":
@@ -0,0 +1,118 @@
+import itertools
+import json
+import subprocess
+import threading
+from concurrent.futures import Future
+
+# Seconds to wait for a daemon JVM to start and load its tool.
+STARTUP_TIMEOUT = 120
+
+
+class DaemonStartError(RuntimeError):
+    """The daemon process could not be started."""
+
+
+class DaemonClient:
+    def __init__(self, name, command, cwd=None, env=None):
+        """
+        Client of a long-lived tool process speaking JSON lines on stdin/stdout. The process first
+        writes {"ready": true}; then every request is one JSON object with an "id" and the response
+        is one JSON object with the same "id". Several requests can be in flight, the process may
+        answer them in any order. A process that died is started again on the next request; only the
+        requests sent to the dead process fail.
+
+        Parameters:
+            name (str): Name of the daemon in log messages.
+            command (list): The command that starts the daemon.
+            cwd (str, optional): Working directory of the daemon.
+            env (dict, optional): Environment of the daemon.
+        """
+        self.name = name
+        self.command = command
+        self.cwd = cwd
+        self.env = env
+        self.process = None
+        self.start_failed = False
+        # request id -> (future, process the request was sent to)
+        self.pending = {}
+        self.ids = itertools.count(1)
+        self.lock = threading.Lock()
+
+    def _start(self):
+        ready = threading.Event()
+        started = []
+        self.start_failed = True
+        print(f"Starting {self.name} daemon: {' '.join(self.command)}")
+        try:
+            process = subprocess.Popen(self.command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True,
+                                       encoding="utf-8", bufsize=1, cwd=self.cwd, env=self.env)
+        except OSError as e:
+            raise DaemonStartError(f"{self.name} daemon could not be started: {e}")
+        threading.Thread(target=self._read_responses, args=(process, ready, started), daemon=True).start()
+        if not ready.wait(STARTUP_TIMEOUT) or not started:
+            process.kill()
+            raise DaemonStartError(f"{self.name} daemon did not start")
+        self.process = process
+        self.start_failed = False
+
+    def _read_responses(self, process, ready, started):
+        for line in process.stdout:
+            try:
+                response = json.loads(line)
+            except json.JSONDecodeError:
+                print(f"{self.name} daemon: {line.rstrip()}")
+                continue
+            if response.get("ready"):
+                started.append(True)
+                ready.set()
+                continue
+            with self.lock:
+                future, _ = self.pending.pop(response.get("id"), (None, None))
+            if future is not None:
+                future.set_result(response)
+        # the daemon exited, fail the requests it did not answer; requests sent to a restarted process stay pending
+        ready.set()
+        with self.lock:
+            if self.process is process:
+                self.process = None
+            unanswered = [request_id for request_id, (_, target) in self.pending.items() if target is process]
+            futures = [self.pending.pop(request_id)[0] for request_id in unanswered]
+        for future in futures:
+            future.set_exception(RuntimeError(f"{self.name} daemon exited with code {process.wait()}"))
+
+    def request(self, payload, timeout=None):
+        """
+        Sends a request and waits for its response.
+
+        Parameters:
+            payload (dict): The request; the "id" is added here.
+            timeout (float, optional): Seconds to wait for the response.
+
+        Returns:
+            dict: The response of the daemon.
+
+        Raises:
+            DaemonStartError: The daemon could not be started.
+            RuntimeError: The daemon died before answering.
+        """
+        future = Future()
+        with self.lock:
+            if self.process is None or self.process.poll() is not None:
+                self._start()
+            request_id = next(self.ids)
+            self.pending[request_id] = (future, self.process)
+            try:
+                self.process.stdin.write(json.dumps({**payload, "id": request_id}) + "\n")
+                self.process.stdin.flush()
+            except OSError as e:
+                del self.pending[request_id]
+                raise RuntimeError(f"{self.name} daemon is not running: {e}")
+        return future.result(timeout)
+
+    def close(self):
+        """Stops the daemon after the requests in flight are answered."""
+        with self.lock:
+            process, self.process = self.process, None
+        if process is not None:
+            process.stdin.close()
+            process.wait()
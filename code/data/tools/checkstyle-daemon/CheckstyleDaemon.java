@@ -0,0 +1,372 @@
+import com.puppycrawl.tools.checkstyle.Checker;
+import com.puppycrawl.tools.checkstyle.ConfigurationLoader;
+import com.puppycrawl.tools.checkstyle.PropertiesExpander;
+import com.puppycrawl.tools.checkstyle.api.AuditEvent;
+import com.puppycrawl.tools.checkstyle.api.AuditListener;
+import com.puppycrawl.tools.checkstyle.api.Configuration;
+
+import java.io.BufferedReader;
+import java.io.File;
+import java.io.FileDescriptor;
+import java.io.FileOutputStream;
+import java.io.InputStreamReader;
+import java.io.PrintStream;
+import java.nio.charset.StandardCharsets;
+import java.nio.file.Files;
+import java.nio.file.Path;
+import java.util.ArrayList;
+import java.util.Comparator;
+import java.util.LinkedHashMap;
+import java.util.List;
+import java.util.Map;
+import java.util.concurrent.ExecutorService;
+import java.util.concurrent.Executors;
+import java.util.concurrent.TimeUnit;
+import java.util.regex.Matcher;
+import java.util.regex.Pattern;
+import java.util.stream.Stream;
+
+/**
+ * Long-lived Checkstyle process, started by checkstyle_service.py.
+ *
+ * The configuration is parsed once at startup. Reads one JSON request per line from stdin with the
+ * source text of one or more files, e.g. {"id": 1, "files": [{"name": "TempClass.java", "source": "..."}]},
+ * and writes one JSON response per line to stdout with the violations of every file:
+ * {"id": 1, "violations": [{"file": "TempClass.java", "line": 3, "column": 5, "severity": "error",
+ * "message": "...", "check": "LineLength"}]}, or {"id": 1, "error": "..."}. Every worker thread has
+ * its own Checker, so requests run concurrently. The first line written is {"ready": true}.
+ *
+ * Run with the Checkstyle jar on the classpath (Java 11+ source launcher):
+ *   java -cp checkstyle-10.20.1-all.jar CheckstyleDaemon.java config.xml [threads]
+ * where config.xml is a file or a configuration bundled with Checkstyle, e.g. /sun_checks.xml.
+ */
+public class CheckstyleDaemon {
+    private static final PrintStream PROTOCOL =
+            new PrintStream(new FileOutputStream(FileDescriptor.out), true, StandardCharsets.UTF_8);
+
+    private static final Pattern ID = Pattern.compile("\"id\"\\s*:\\s*(\\d+)");
+
+    private static Configuration configuration;
+
+    /** A configured Checker with the listener that collects the violations of the current request. */
+    private static class Worker implements AuditListener {
+        private final Checker checker = new Checker();
+        private Path root;
+        private List<Map<String, Object>> violations;
+
+        Worker() throws Exception {
+            checker.setModuleClassLoader(Checker.class.getClassLoader());
+            checker.configure(configuration);
+            checker.addListener(this);
+        }
+
+        List<Map<String, Object>> check(Path root, List<File> files) throws Exception {
+            this.root = root;
+            violations = new ArrayList<>();
+            // the Checker keeps nothing of the files between runs except its (unused) cache
+            checker.process(files);
+            return violations;
+        }
+
+        @Override
+        public void addError(AuditEvent event) {
+            violations.add(violation(event, event.getLine(), event.getColumn(), event.getSeverityLevel().getName(),
+                    event.getMessage(), checkName(event)));
+        }
+
+        @Override
+        public void addException(AuditEvent event, Throwable throwable) {
+            violations.add(violation(event, 0, 0, "error", String.valueOf(throwable.getMessage()), "Exception"));
+        }
+
+        private Map<String, Object> violation(AuditEvent event, int line, int column, String severity, String message,
+                                              String check) {
+            Map<String, Object> violation = new LinkedHashMap<>();
+            violation.put("file", root.relativize(Path.of(event.getFileName())).toString());
+            violation.put("line", line);
+            violation.put("column", column);
+            violation.put("severity", severity);
+            violation.put("message", message);
+            violation.put("check", check);
+            return violation;
+        }
+
+        @Override
+        public void auditStarted(AuditEvent event) {
+        }
+
+        @Override
+        public void auditFinished(AuditEvent event) {
+        }
+
+        @Override
+        public void fileStarted(AuditEvent event) {
+        }
+
+        @Override
+        public void fileFinished(AuditEvent event) {
+        }
+    }
+
+    /** The name the command line output shows in brackets: the module id or the check name without "Check". */
+    private static String checkName(AuditEvent event) {
+        if (event.getModuleId() != null) {
+            return event.getModuleId();
+        }
+        String name = event.getSourceName();
+        name = name.substring(name.lastIndexOf('.') + 1);
+        return name.endsWith("Check") ? name.substring(0, name.length() - "Check".length()) : name;
+    }
+
+    private static final ThreadLocal<Worker> WORKERS = ThreadLocal.withInitial(() -> {
+        try {
+            return new Worker();
+        } catch (Exception e) {
+            throw new IllegalStateException(e);
+        }
+    });
+
+    private static void respond(Map<String, Object> response) {
+        String line = Json.write(response);
+        synchronized (PROTOCOL) {
+            PROTOCOL.println(line);
+        }
+    }
+
+    @SuppressWarnings("unchecked")
+    private static void handle(Map<String, Object> request) {
+        Map<String, Object> response = new LinkedHashMap<>();
+        response.put("id", request.get("id"));
+        Path root = null;
+        try {
+            root = Files.createTempDirectory("checkstyle-");
+            List<File> files = new ArrayList<>();
+            for (Object element : (List<Object>) request.get("files")) {
+                Map<String, Object> file = (Map<String, Object>) element;
+                Path path = root.resolve((String) file.get("name")).normalize();
+                if (!path.startsWith(root)) {
+                    throw new IllegalArgumentException("file name outside the request: " + file.get("name"));
+                }
+                Files.createDirectories(path.getParent());
+                Files.writeString(path, (String) file.get("source"), StandardCharsets.UTF_8);
+                files.add(path.toFile());
+            }
+            response.put("violations", WORKERS.get().check(root, files));
+        } catch (Throwable e) {
+            response.put("error", e.toString());
+        } finally {
+            if (root != null) {
+                try (Stream<Path> paths = Files.walk(root)) {
+                    paths.sorted(Comparator.reverseOrder()).map(Path::toFile).forEach(File::delete);
+                } catch (Exception ignored) {
+                }
+            }
+        }
+        respond(response);
+    }
+
+    /** Minimal JSON reader and writer, the Checkstyle jar has no JSON library. */
+    static final class Json {
+        private final String text;
+        private int position;
+
+        private Json(String text) {
+            this.text = text;
+        }
+
+        static Object read(String text) {
+            Json json = new Json(text);
+            Object value = json.value();
+            json.skipWhitespace();
+            if (json.position != text.length()) {
+                throw json.error();
+            }
+            return value;
+        }
+
+        private IllegalArgumentException error() {
+            return new IllegalArgumentException("invalid JSON at " + position);
+        }
+
+        private void skipWhitespace() {
+            while (position < text.length() && Character.isWhitespace(text.charAt(position))) {
+                position++;
+            }
+        }
+
+        private void expect(char c) {
+            skipWhitespace();
+            if (position >= text.length() || text.charAt(position) != c) {
+                throw error();
+            }
+            position++;
+        }
+
+        private boolean consume(char c) {
+            skipWhitespace();
+            if (position < text.length() && text.charAt(position) == c) {
+                position++;
+                return true;
+            }
+            return false;
+        }
+
+        private Object value() {
+            skipWhitespace();
+            if (position >= text.length()) {
+                throw error();
+            }
+            char c = text.charAt(position);
+            if (c == '{') {
+                position++;
+                Map<String, Object> object = new LinkedHashMap<>();
+                if (!consume('}')) {
+                    do {
+                        skipWhitespace();
+                        String key = string();
+                        expect(':');
+                        object.put(key, value());
+                    } while (consume(','));
+                    expect('}');
+                }
+                return object;
+            }
+            if (c == '[') {
+                position++;
+                List<Object> array = new ArrayList<>();
+                if (!consume(']')) {
+                    do {
+                        array.add(value());
+                    } while (consume(','));
+                    expect(']');
+                }
+                return array;
+            }
+            if (c == '"') {
+                return string();
+            }
+            for (String literal : new String[]{"true", "false", "null"}) {
+                if (text.startsWith(literal, position)) {
+                    position += literal.length();
+                    return literal.equals("null") ? null : Boolean.valueOf(literal);
+                }
+            }
+            int start = position;
+            while (position < text.length() && "+-0123456789.eE".indexOf(text.charAt(position)) >= 0) {
+                position++;
+            }
+            if (start == position) {
+                throw error();
+            }
+            String number = text.substring(start, position);
+            return number.matches("-?\\d+") ? (Object) Long.valueOf(number) : (Object) Double.valueOf(number);
+        }
+
+        private String string() {
+            if (position >= text.length() || text.charAt(position) != '"') {
+                throw error();
+            }
+            position++;
+            StringBuilder builder = new StringBuilder();
+            while (position < text.length()) {
+                char c = text.charAt(position++);
+                if (c == '"') {
+                    return builder.toString();
+                }
+                if (c != '\\') {
+                    builder.append(c);
+                    continue;
+                }
+                char escaped = text.charAt(position++);
+                switch (escaped) {
+                    case 'b': builder.append('\b'); break;
+                    case 'f': builder.append('\f'); break;
+                    case 'n': builder.append('\n'); break;
+                    case 'r': builder.append('\r'); break;
+                    case 't': builder.append('\t'); break;
+                    case 'u':
+                        builder.append((char) Integer.parseInt(text.substring(position, position + 4), 16));
+                        position += 4;
+                        break;
+                    default: builder.append(escaped);
+                }
+            }
+            throw error();
+        }
+
+        @SuppressWarnings("unchecked")
+        static String write(Object value) {
+            if (value == null) {
+                return "null";
+            }
+            if (value instanceof Map) {
+                StringBuilder builder = new StringBuilder("{");
+                for (Map.Entry<String, Object> entry : ((Map<String, Object>) value).entrySet()) {
+                    if (builder.length() > 1) {
+                        builder.append(", ");
+                    }
+                    builder.append(write(entry.getKey())).append(": ").append(write(entry.getValue()));
+                }
+                return builder.append('}').toString();
+            }
+            if (value instanceof List) {
+                StringBuilder builder = new StringBuilder("[");
+                for (Object element : (List<Object>) value) {
+                    if (builder.length() > 1) {
+                        builder.append(", ");
+                    }
+                    builder.append(write(element));
+                }
+                return builder.append(']').toString();
+            }
+            if (value instanceof Number || value instanceof Boolean) {
+                return value.toString();
+            }
+            StringBuilder builder = new StringBuilder("\"");
+            for (char c : value.toString().toCharArray()) {
+                if (c == '"' || c == '\\') {
+                    builder.append('\\').append(c);
+                } else if (c < 0x20) {
+                    builder.append(String.format("\\u%04x", (int) c));
+                } else {
+                    builder.append(c);
+                }
+            }
+            return builder.append('"').toString();
+        }
+    }
+
+    public static void main(String[] args) throws Exception {
+        configuration = ConfigurationLoader.loadConfiguration(args[0], new PropertiesExpander(System.getProperties()));
+        int threads = args.length > 1 ? Integer.parseInt(args[1]) : Runtime.getRuntime().availableProcessors();
+        // Checkstyle must not write to the protocol stream
+        System.setOut(System.err);
+
+        ExecutorService pool = Executors.newFixedThreadPool(threads);
+        BufferedReader reader = new BufferedReader(new InputStreamReader(System.in, StandardCharsets.UTF_8));
+        PROTOCOL.println("{\"ready\": true}");
+        String line;
+        while ((line = reader.readLine()) != null) {
+            if (line.isBlank()) {
+                continue;
+            }
+            Map<String, Object> request;
+            try {
+                @SuppressWarnings("unchecked")
+                Map<String, Object> parsed = (Map<String, Object>) Json.read(line);
+                request = parsed;
+            } catch (RuntimeException e) {
+                // answer the request if its id can be read, so the client does not wait for it
+                Matcher id = ID.matcher(line);
+                Map<String, Object> response = new LinkedHashMap<>();
+                response.put("id", id.find() ? Long.valueOf(id.group(1)) : null);
+                response.put("error", "invalid request: " + e);
+                respond(response);
+                continue;
+            }
+            pool.submit(() -> handle(request));
+        }
+        pool.shutdown();
+        pool.awaitTermination(10, TimeUnit.MINUTES);
+    }
+}
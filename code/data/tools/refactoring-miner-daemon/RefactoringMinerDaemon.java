@@ -0,0 +1,146 @@
+import com.google.gson.Gson;
+import com.google.gson.JsonArray;
+import com.google.gson.JsonObject;
+import com.google.gson.JsonParser;
+
+import java.io.BufferedReader;
+import java.io.ByteArrayOutputStream;
+import java.io.FileDescriptor;
+import java.io.FileOutputStream;
+import java.io.InputStreamReader;
+import java.io.PrintStream;
+import java.nio.charset.StandardCharsets;
+import java.security.Permission;
+import java.util.regex.Matcher;
+import java.util.regex.Pattern;
+
+/**
+ * Long-lived RefactoringMiner process, started by refactoring_miner_service.py.
+ *
+ * Reads one JSON request per line from stdin, e.g. {"id": 1, "args": ["-scr", ...]}, runs the
+ * command line entry point of RefactoringMiner with these arguments inside this JVM and writes one
+ * JSON response per line to stdout: {"id": 1, "exitCode": 0, "stdout": "...", "stderr": "..."}.
+ * The entry point is not re-entrant, so requests run one at a time in the order they arrive; while
+ * a request runs, System.out and System.err of the whole JVM (including threads RefactoringMiner
+ * starts) are captured for it. The first line written is {"ready": true}.
+ *
+ * A System.exit of RefactoringMiner is turned into the exit code of the request by a security
+ * manager, so the daemon needs Java 17 to 23; on later versions it exits before writing
+ * {"ready": true} and the client runs the command line tool instead.
+ *
+ * Run with the RefactoringMiner jars on the classpath (Java 11+ source launcher):
+ *   java -Djava.security.manager=allow -cp "RefactoringMiner-3.0.10/lib/*" RefactoringMinerDaemon.java
+ */
+public class RefactoringMinerDaemon {
+    private static final Gson GSON = new Gson();
+    private static final PrintStream PROTOCOL =
+            new PrintStream(new FileOutputStream(FileDescriptor.out), true, StandardCharsets.UTF_8);
+    private static final PrintStream LOG =
+            new PrintStream(new FileOutputStream(FileDescriptor.err), true, StandardCharsets.UTF_8);
+    private static final Pattern ID = Pattern.compile("\"id\"\\s*:\\s*(\\d+)");
+
+    /** True while RefactoringMiner runs for a request. */
+    private static volatile boolean running;
+
+    /** Thrown instead of exiting the JVM when RefactoringMiner calls System.exit for a request. */
+    private static class ExitException extends SecurityException {
+        final int status;
+
+        ExitException(int status) {
+            super("System.exit(" + status + ")");
+            this.status = status;
+        }
+    }
+
+    private static void respond(Long id, int exitCode, String stdout, String stderr) {
+        JsonObject response = new JsonObject();
+        response.addProperty("id", id);
+        response.addProperty("exitCode", exitCode);
+        response.addProperty("stdout", stdout);
+        response.addProperty("stderr", stderr);
+        PROTOCOL.println(GSON.toJson(response));
+    }
+
+    private static void handle(JsonObject request) {
+        long id = request.get("id").getAsLong();
+        JsonArray jsonArgs = request.getAsJsonArray("args");
+        String[] args = new String[jsonArgs.size()];
+        for (int i = 0; i < args.length; i++) {
+            args[i] = jsonArgs.get(i).getAsString();
+        }
+        ByteArrayOutputStream out = new ByteArrayOutputStream();
+        ByteArrayOutputStream err = new ByteArrayOutputStream();
+        PrintStream stdout = new PrintStream(out, true, StandardCharsets.UTF_8);
+        PrintStream stderr = new PrintStream(err, true, StandardCharsets.UTF_8);
+        System.setOut(stdout);
+        System.setErr(stderr);
+        running = true;
+        int exitCode = 0;
+        try {
+            org.refactoringminer.RefactoringMiner.main(args);
+        } catch (ExitException e) {
+            exitCode = e.status;
+        } catch (Throwable e) {
+            e.printStackTrace(stderr);
+            exitCode = 1;
+        } finally {
+            running = false;
+            // output written after the request ended goes to the daemon log
+            System.setOut(LOG);
+            System.setErr(LOG);
+            stdout.flush();
+            stderr.flush();
+        }
+        respond(id, exitCode, out.toString(StandardCharsets.UTF_8), err.toString(StandardCharsets.UTF_8));
+    }
+
+    @SuppressWarnings("removal")
+    public static void main(String[] args) throws Exception {
+        // RefactoringMiner must not write to the protocol stream between requests
+        System.setOut(LOG);
+        System.setErr(LOG);
+        try {
+            System.setSecurityManager(new SecurityManager() {
+                @Override
+                public void checkPermission(Permission perm) {
+                }
+
+                @Override
+                public void checkPermission(Permission perm, Object context) {
+                }
+
+                @Override
+                public void checkExit(int status) {
+                    if (running) {
+                        throw new ExitException(status);
+                    }
+                }
+            });
+        } catch (UnsupportedOperationException | SecurityException e) {
+            LOG.println("No security manager on Java " + Runtime.version().feature()
+                    + ", a System.exit of RefactoringMiner would end the daemon: " + e);
+            System.exit(2);
+        }
+
+        BufferedReader reader = new BufferedReader(new InputStreamReader(System.in, StandardCharsets.UTF_8));
+        PROTOCOL.println("{\"ready\": true}");
+        String line;
+        while ((line = reader.readLine()) != null) {
+            if (line.isBlank()) {
+                continue;
+            }
+            JsonObject request;
+            try {
+                request = JsonParser.parseString(line).getAsJsonObject();
+            } catch (RuntimeException e) {
+                // answer the request if its id can be read, so the client does not wait for it
+                Matcher id = ID.matcher(line);
+                respond(id.find() ? Long.valueOf(id.group(1)) : null, 1, "", "invalid request: " + e);
+                continue;
+            }
+            handle(request);
+        }
+        // stdin closed, every request has been answered
+        System.exit(0);
+    }
+}
@@ -1,10 +1,21 @@
+import hashlib
 import json
 import os
 import re
-import subprocess
-from typing import Dict, Tuple, Callable
+import shutil
+import tempfile
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, List, Tuple, Callable
 from compile_experiment import checkout_previous_commit, \
-    switch_java_version, compile_project
+    compile_project, get_previous_commit
+from refactoring_miner_service import run_refactoring_miner
+from scratch_space import ScratchSpace, configure_scratch_space, get_scratch_root
+from worktree_pool import get_worktree_pool, remove_orphaned_worktrees
+
+# Refactoring types whose evaluator checks out, checks or builds the project. The evaluators of the other
+# types return after parsing the refactored code, so they are run without a worktree.
+WORKTREE_REFACTORING_TYPES = set()
 
 def compile_and_test_refactoring(refactoring: Dict, project_prefix_path: str, project_path: str) -> Tuple[bool, bool, str]:
     """
@@ -101,9 +112,7 @@ def compile_project_for_base(project_path, compile_jdk):
     except Exception as e:
         print(f"Failed to switch to directory {project_path}: {e}")
         return False, "Failed to switch to directory."
-    switch_java_version(compile_jdk)
-    compile_re, log = compile_project()
-    switch_java_version(17)
+    compile_re, log = compile_project(java_version=compile_jdk)
     return compile_re, log
 
 def extract_fields_for_extract_method(refactored_code_str):
@@ -155,13 +164,10 @@ def is_java_code(code_str):
         return True
 
 def check_refactoring_for_single_file(project_prefix_path, project_path, origin_file_path, origin_code, origin_refactored_code, refactoring_type):
-    file_path_before = f"{project_prefix_path}/data/tmp/source_code_before_for_whole.txt"
-    file_path_after = f"{project_prefix_path}/data/tmp/source_code_after_for_whole.txt"
-    with open(file_path_before, "w", encoding="utf-8") as file:
-        file.write(origin_code)
-    with open(file_path_after, "w", encoding="utf-8") as file:
-        file.write(origin_refactored_code)
-    return check_refactoring_result_all(project_prefix_path, project_path, refactoring_type, origin_file_path, file_path_before, file_path_after)
+    with ScratchSpace() as scratch:
+        file_path_before = scratch.write("source_code_before_for_whole.txt", origin_code)
+        file_path_after = scratch.write("source_code_after_for_whole.txt", origin_refactored_code)
+        return check_refactoring_result_all(project_prefix_path, project_path, refactoring_type, origin_file_path, file_path_before, file_path_after)
 
 def check_refactoring_result_all(project_prefix_path, project_path, refactoring_type, origin_file_path, file_path_before, file_path_after, target_file_path = None):
     try:
@@ -169,7 +175,6 @@ def check_refactoring_result_all(project_prefix_path, project_path, refactoring_
         print(f"Switched to project directory: {project_path}")
     except Exception as e:
         print(f"Failed to switch to directory {project_path}: {e}")
-    switch_java_version(17)
     try:
         os.chdir(project_prefix_path)
         print(f"Switched to project directory: {project_prefix_path}")
@@ -177,14 +182,14 @@ def check_refactoring_result_all(project_prefix_path, project_path, refactoring_
         print(f"Failed to switch to directory {project_prefix_path}: {e}")
 
     if target_file_path:
-        exe_result = subprocess.run(
-            [f"./data/tools/RefactoringMiner-3.0.10/bin/RefactoringMiner", "-spr", origin_file_path,
+        exe_result = run_refactoring_miner(
+            ["-spr", origin_file_path,
              file_path_before,
-             target_file_path, file_path_after, refactoring_type], capture_output=True, text=True)
+             target_file_path, file_path_after, refactoring_type])
     else:
-        exe_result = subprocess.run(
-            ["./data/tools/RefactoringMiner-3.0.10/bin/RefactoringMiner", "-scr", origin_file_path, file_path_before,
-             file_path_after, refactoring_type], capture_output=True, text=True)
+        exe_result = run_refactoring_miner(
+            ["-scr", origin_file_path, file_path_before,
+             file_path_after, refactoring_type])
     if exe_result.returncode != 0:
         print(f"Error running RefactoringMiner: {exe_result.stderr}")
         return False, "RefactoringMiner execution failed."
@@ -335,13 +340,10 @@ def eval_extract_and_move_method(refactoring: Dict, project_prefix_path: str, pr
     return check_refactoring_result, compile_re
 
 def check_refactoring_for_multiple_files(project_prefix_path, project_path, origin_file_path, origin_refactored_code, target_file_path, target_refactored_code, refactoring_type):
-    original_refactored_code_path_after = f"{project_prefix_path}/data/tmp/original_refactored_code.txt"
-    target_refactored_code_path_after = f"{project_prefix_path}/data/tmp/target_refactored_code.txt"
-    with open(original_refactored_code_path_after, "w", encoding="utf-8") as file:
-        file.write(origin_refactored_code)
-    with open(target_refactored_code_path_after, "w", encoding="utf-8") as file:
-        file.write(target_refactored_code)
-    return check_refactoring_result_all(project_prefix_path,project_path, refactoring_type, origin_file_path, original_refactored_code_path_after, target_refactored_code_path_after, target_file_path)
+    with ScratchSpace() as scratch:
+        original_refactored_code_path_after = scratch.write("original_refactored_code.txt", origin_refactored_code)
+        target_refactored_code_path_after = scratch.write("target_refactored_code.txt", target_refactored_code)
+        return check_refactoring_result_all(project_prefix_path,project_path, refactoring_type, origin_file_path, original_refactored_code_path_after, target_refactored_code_path_after, target_file_path)
 
 def extract_fields_for_extract_and_move_method(refactored_code_str):
     """
@@ -611,7 +613,148 @@ def extract_class_body(java_code: str) -> str:
         return class_body
     return java_code
 
-def main():
+def group_by_commit(refactorings: List[Dict]) -> "OrderedDict[str, List[int]]":
+    """Groups the indexes of the refactorings by commitId, keeping the order of first appearance."""
+    groups = OrderedDict()
+    for index, refactoring in enumerate(refactorings):
+        groups.setdefault(refactoring.get("commitId"), []).append(index)
+    return groups
+
+
+def _init_evaluation_worker(run_tmp_dir: str):
+    """Creates the scratch spaces of the evaluation worker process inside the directory of the run."""
+    configure_scratch_space(root=run_tmp_dir)
+
+
+def _evaluate_commit_group(project_prefix_path: str, project_path: str, commit_id: str,
+                           indexed_refactorings: List[Tuple[int, Dict]]) -> List[Tuple[int, Tuple[bool, bool, str]]]:
+    """
+    Evaluates the refactorings of one commit. Refactorings whose evaluator needs the project (see
+    WORKTREE_REFACTORING_TYPES) run in a worktree of this worker process, leased on first use; it stays
+    at the parent commit for the whole group and is reset between refactorings, keeping ignored build
+    outputs, so the later builds of the group start warm.
+
+    Returns:
+        list: The (index, result) pairs of the group.
+    """
+    pool = None
+    prev_commit = None
+    results = []
+    for index, refactoring in indexed_refactorings:
+        try:
+            if refactoring.get("type") not in WORKTREE_REFACTORING_TYPES:
+                result = compile_and_test_refactoring(refactoring, project_prefix_path, project_path)
+            else:
+                if pool is None:
+                    pool = get_worktree_pool(project_path, max_worktrees=1)
+                    prev_commit = get_previous_commit(commit_id, project_path)
+                if prev_commit is None:
+                    # let the evaluators report the failure against the shared clone as before
+                    result = compile_and_test_refactoring(refactoring, project_prefix_path, project_path)
+                else:
+                    with pool.borrow(prev_commit) as worktree_dir:
+                        result = compile_and_test_refactoring(refactoring, project_prefix_path, worktree_dir)
+        except Exception as e:
+            print(f"Failed to evaluate refactoring {refactoring.get('uniqueId')}: {e}")
+            result = (False, False, "")
+        results.append((index, result))
+    return results
+
+
+def _input_hash(refactoring: Dict) -> str:
+    """Hash of an input refactoring, stored with its partial result to recognize the same input on resume."""
+    return hashlib.sha256(json.dumps(refactoring, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def evaluate_refactorings(refactorings: List[Dict], project_prefix_path: str, project_path: str, output_path: str,
+                          max_workers: int = 4) -> List[Dict]:
+    """
+    Evaluates refactorings in a process pool. Work is scheduled one commit at a time, so refactorings
+    of the same commit share a checkout and a warm build, and every worker uses its own worktree and
+    scratch spaces. Results are appended to <output_path>.partial.jsonl as each commit finishes, with
+    the uniqueId and a hash of their input; a run that is started again skips the refactorings whose
+    input is unchanged. The merged results are written to output_path in input order.
+
+    Parameters:
+        refactorings (list): The refactorings to evaluate.
+        project_prefix_path (str): Path of the code directory (RefactoringMiner lives there).
+        project_path (str): Path of the project repository.
+        output_path (str): Path of the JSON result file.
+        max_workers (int): Number of worker processes (default is 4).
+
+    Returns:
+        list: The refactorings with refactoringMinerResult, compileAndTestResult and toolAfterCode set.
+
+    Raises:
+        RuntimeError: A worker failed on a commit; the results of the other commits are kept for the next run.
+    """
+    partial_path = f"{output_path}.partial.jsonl"
+    input_hashes = [_input_hash(refactoring) for refactoring in refactorings]
+    done = {}
+    if os.path.exists(partial_path):
+        stale = 0
+        with open(partial_path, 'r', encoding='utf-8') as file:
+            for line in file:
+                if line.strip():
+                    record = json.loads(line)
+                    index = record["index"]
+                    if (index < len(refactorings) and record.get("uniqueId") == refactorings[index].get("uniqueId")
+                            and record.get("input") == input_hashes[index]):
+                        done[index] = tuple(record["result"])
+                    else:
+                        stale += 1
+        print(f"Resuming evaluation, {len(done)} refactorings already evaluated, {stale} stale results ignored")
+
+    pending = []
+    for commit_id, indexes in group_by_commit(refactorings).items():
+        indexes = [index for index in indexes if index not in done]
+        if indexes:
+            pending.append((commit_id, [(index, refactorings[index]) for index in indexes]))
+
+    # the scratch spaces of a crashed worker are removed with the directory of the run
+    run_tmp_dir = tempfile.mkdtemp(prefix="evaluation-", dir=get_scratch_root())
+    failed_commits = []
+    try:
+        with open(partial_path, 'a', encoding='utf-8') as partial_file, \
+                ProcessPoolExecutor(max_workers=max_workers, initializer=_init_evaluation_worker,
+                                    initargs=(run_tmp_dir,)) as executor:
+            futures = {executor.submit(_evaluate_commit_group, project_prefix_path, project_path, commit_id, group): commit_id
+                       for commit_id, group in pending}
+            for future in as_completed(futures):
+                try:
+                    results = future.result()
+                except Exception as e:
+                    print(f"Failed to evaluate commit {futures[future]}: {e}")
+                    failed_commits.append(futures[future])
+                    continue
+                for index, result in results:
+                    done[index] = result
+                    partial_file.write(json.dumps({"index": index, "uniqueId": refactorings[index].get("uniqueId"),
+                                                   "input": input_hashes[index], "result": list(result)}) + "\n")
+                partial_file.flush()
+                print(f"Evaluated commit {futures[future]} ({len(done)}/{len(refactorings)})")
+    finally:
+        shutil.rmtree(run_tmp_dir, ignore_errors=True)
+        # the workers have exited, so the worktrees of every worker are orphaned, whether it failed or not
+        remove_orphaned_worktrees(project_path)
+    if failed_commits:
+        raise RuntimeError(f"Evaluation failed for {len(failed_commits)} commits: {', '.join(map(str, failed_commits))}; "
+                           f"run again to retry them")
+
+    refactoring_results = []
+    for index, refactoring in enumerate(refactorings):
+        refactoring_miner_result, compile_and_test_result, after_code = done[index]
+        refactoring['refactoringMinerResult'] = refactoring_miner_result
+        refactoring['compileAndTestResult'] = compile_and_test_result
+        refactoring['toolAfterCode'] = after_code
+        refactoring_results.append(refactoring)
+    with open(output_path, 'w') as file:
+        json.dump(refactoring_results, file)
+    os.remove(partial_path)
+    return refactoring_results
+
+def main(max_workers=4, scratch_tmpfs=False):
+    configure_scratch_space(tmpfs=scratch_tmpfs)
     project_prefix_path = '/Users/yisenxu/Downloads/Research/SOEN6491/Code/refactoring_data_analysis'
     project_name = "pmd"
     model_name_list = [
@@ -636,19 +779,7 @@ def main():
         with open(file_path, 'r') as file:
             data = json.load(file)
 
-        # index_ref = 0
-        refactoring_results = []
-        for refactoring in data:
-            # if start <= index_ref < end:
-            refactoring_miner_result, compile_and_test_result, after_code = compile_and_test_refactoring(refactoring, project_prefix_path, project_path)
-            refactoring['refactoringMinerResult'] = refactoring_miner_result
-            refactoring['compileAndTestResult'] = compile_and_test_result
-            refactoring['toolAfterCode'] = after_code
-            refactoring_results.append(refactoring)
-            # index_ref += 1
-
-        with open(output_path, 'w') as file:
-            json.dump(refactoring_results, file)
+        evaluate_refactorings(data, project_prefix_path, project_path, output_path, max_workers)
 
 if __name__ == "__main__":
     main()
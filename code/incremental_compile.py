@@ -0,0 +1,301 @@
+import json
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+import threading
+
+from build_profile import BuildProfile, get_build_tool
+from compile_cache import CompileCache
+from java_home import java_env, java_major_version, resolve_java_home
+from worktree_pool import get_worktree_pool
+
+JAVAC_BASELINE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'cache', 'javac_baselines')
+
+# Anonymous and local classes (A$1, A$1Local) are not part of the API of a file.
+ANONYMOUS_CLASS = re.compile(r"\$\d")
+
+# Prints the compile classpath and the class output directories of every source set of every project.
+GRADLE_CLASSPATH_INIT_SCRIPT = """
+allprojects {
+    tasks.register('printJavacClasspath') {
+        doLast {
+            if (project.extensions.findByName('sourceSets') != null) {
+                project.sourceSets.each { sourceSet ->
+                    println 'JAVAC_CLASSPATH=' + sourceSet.compileClasspath.asPath
+                    println 'JAVAC_CLASSPATH=' + sourceSet.output.classesDirs.asPath
+                }
+            }
+        }
+    }
+}
+"""
+
+_baseline_locks = {}
+_baseline_locks_lock = threading.Lock()
+# Baselines whose build failed for a reason that may not happen again, not built again in this process.
+_failed_baselines = set()
+
+
+def _git(project_dir, *args):
+    return subprocess.run(["git", "-C", project_dir, *args], text=True, capture_output=True)
+
+
+def _java_tool(java_version, tool):
+    """Path of a JDK tool (javac) of the java_version, the one on PATH if that JDK is not found."""
+    java_home = resolve_java_home(java_version) if java_version is not None else None
+    return os.path.join(java_home, "bin", tool) if java_home else tool
+
+
+def _collect_gradle_classpath(worktree_dir, env):
+    gradle = "./gradlew" if os.path.exists(os.path.join(worktree_dir, "gradlew")) else "gradle"
+    with tempfile.NamedTemporaryFile("w", suffix=".gradle", delete=False) as script:
+        script.write(GRADLE_CLASSPATH_INIT_SCRIPT)
+    try:
+        result = subprocess.run(f"{gradle} -q --init-script {script.name} printJavacClasspath", shell=True,
+                                cwd=worktree_dir, env=env, text=True, capture_output=True)
+    finally:
+        os.remove(script.name)
+    if result.returncode != 0:
+        print(f"Failed to resolve the Gradle classpath: {result.stderr}")
+        return None
+    entries = []
+    for line in result.stdout.splitlines():
+        if line.startswith("JAVAC_CLASSPATH="):
+            entries.extend(path for path in line[len("JAVAC_CLASSPATH="):].split(os.pathsep) if path)
+    return entries
+
+
+def _collect_maven_classpath(worktree_dir, env):
+    result = subprocess.run("mvn -q dependency:build-classpath -Dmdep.outputFile=target/javac.classpath", shell=True,
+                            cwd=worktree_dir, env=env, text=True, capture_output=True)
+    if result.returncode != 0:
+        print(f"Failed to resolve the Maven classpath: {result.stderr}")
+        return None
+    entries = []
+    for root_dir, dirs, files in os.walk(worktree_dir):
+        dirs[:] = [name for name in dirs if name not in (".git", "src")]
+        if os.path.basename(root_dir) == "target" and "javac.classpath" in files:
+            entries.append(os.path.join(root_dir, "classes"))
+            entries.append(os.path.join(root_dir, "test-classes"))
+            with open(os.path.join(root_dir, "javac.classpath"), "r", encoding="utf-8") as file:
+                entries.extend(path for path in file.read().strip().split(os.pathsep) if path)
+    return entries
+
+
+def _build_baseline(project_dir, prev_commit, java_version, baseline_dir):
+    """
+    Builds prev_commit once and copies the classes and classpath entries of the worktree into baseline_dir.
+    A failed build is only recorded in baseline_dir if it failed with compiler errors; returns False if
+    nothing was recorded.
+    """
+    # imported here, compile_experiment imports this module
+    from compile_experiment import compile_project
+    env = java_env(java_version)
+    with get_worktree_pool(project_dir).borrow(prev_commit) as worktree_dir:
+        success, log = compile_project(worktree_dir, java_version)
+        entries = None
+        if success:
+            if get_build_tool(worktree_dir) == "maven":
+                entries = _collect_maven_classpath(worktree_dir, env)
+            else:
+                entries = _collect_gradle_classpath(worktree_dir, env)
+        building_dir = tempfile.mkdtemp(prefix=".building-", dir=os.path.dirname(baseline_dir))
+        classpath = []
+        for index, entry in enumerate(entries or []):
+            entry = os.path.abspath(entry)
+            if not entry.startswith(os.path.abspath(worktree_dir) + os.sep):
+                # dependency jars live in the Maven/Gradle caches and outlive the worktree
+                classpath.append(entry)
+                continue
+            if not os.path.exists(entry):
+                continue
+            # build outputs of the worktree are copied, the worktree is reused for other commits
+            copy_path = os.path.join(building_dir, "classpath", f"{index}-{os.path.basename(entry)}")
+            if os.path.isdir(entry):
+                shutil.copytree(entry, copy_path)
+            else:
+                os.makedirs(os.path.dirname(copy_path), exist_ok=True)
+                shutil.copy2(entry, copy_path)
+            classpath.append(copy_path.replace(building_dir, baseline_dir, 1))
+    manifest = {"commit": prev_commit, "java_version": None if java_version is None else java_major_version(java_version),
+                "success": entries is not None, "classpath": classpath}
+    if not success:
+        manifest["log"] = log
+    if entries is None:
+        print(f"No javac baseline for {prev_commit}: {'classpath not resolved' if success else log}")
+        if success or not CompileCache.is_cacheable(success, log):
+            # network, dependency download or out of memory failures may pass next time, try again in a new run
+            shutil.rmtree(building_dir, ignore_errors=True)
+            return False
+    with open(os.path.join(building_dir, "manifest.json"), "w", encoding="utf-8") as file:
+        json.dump(manifest, file)
+    try:
+        os.rename(building_dir, baseline_dir)
+    except OSError:
+        # another process built the same baseline first
+        shutil.rmtree(building_dir, ignore_errors=True)
+    return True
+
+
+def get_javac_baseline(project_dir, prev_commit, java_version):
+    """
+    Returns the javac baseline of prev_commit: the classpath of the unmodified build, with the
+    compiled classes of the project copied into the baseline cache. The commit is built once per
+    project and JDK; None if that build or the classpath resolution failed. Only failures with
+    compiler errors are remembered across runs, other failures are retried in the next run.
+    """
+    jdk = f"java{java_major_version(java_version)}" if java_version is not None else "java-default"
+    key = f"{BuildProfile.project_key(project_dir)}-{prev_commit}-{jdk}"
+    baseline_dir = os.path.join(JAVAC_BASELINE_DIR, key)
+    with _baseline_locks_lock:
+        lock = _baseline_locks.setdefault(key, threading.Lock())
+    with lock:
+        if key in _failed_baselines:
+            return None
+        manifest_path = os.path.join(baseline_dir, "manifest.json")
+        if os.path.exists(manifest_path):
+            with open(manifest_path, "r", encoding="utf-8") as file:
+                manifest = json.load(file)
+            if not manifest["success"] and not CompileCache.is_cacheable(False, manifest.get("log", [])):
+                # failures without compiler errors were recorded by earlier versions, build them again
+                shutil.rmtree(baseline_dir, ignore_errors=True)
+        if not os.path.exists(manifest_path):
+            os.makedirs(JAVAC_BASELINE_DIR, exist_ok=True)
+            print(f"Building javac baseline {key}...")
+            if not _build_baseline(project_dir, prev_commit, java_version, baseline_dir):
+                _failed_baselines.add(key)
+                return None
+    with open(os.path.join(baseline_dir, "manifest.json"), "r", encoding="utf-8") as file:
+        manifest = json.load(file)
+    return manifest if manifest["success"] else None
+
+
+def _run_javac(baseline, sources, java_version, classes_dir=None):
+    """
+    Compiles sources (path relative to the project -> code) against the baseline into classes_dir (a
+    temp directory that is removed if None); returns (exit code, output, source dir).
+    """
+    work_dir = tempfile.mkdtemp(prefix="javac-")
+    source_dir = os.path.join(work_dir, "src")
+    paths = []
+    for relative_path, code in sources.items():
+        path = os.path.join(source_dir, relative_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as file:
+            file.write(code)
+        paths.append(path)
+    with open(os.path.join(work_dir, "sources.txt"), "w", encoding="utf-8") as file:
+        file.write("\n".join(f'"{path}"' for path in paths))
+    with open(os.path.join(work_dir, "classpath.txt"), "w", encoding="utf-8") as file:
+        file.write(f'-cp "{os.pathsep.join(baseline["classpath"])}"')
+    command = [_java_tool(java_version, "javac"), "-d", classes_dir or os.path.join(work_dir, "classes"), "-proc:none", "-nowarn",
+               "-encoding", "UTF-8", "-Xmaxerrs", "200", f"@{os.path.join(work_dir, 'classpath.txt')}",
+               f"@{os.path.join(work_dir, 'sources.txt')}"]
+    try:
+        result = subprocess.run(command, text=True, capture_output=True)
+    except FileNotFoundError as e:
+        shutil.rmtree(work_dir, ignore_errors=True)
+        return None, str(e), source_dir
+    shutil.rmtree(work_dir, ignore_errors=True)
+    return result.returncode, result.stdout + result.stderr, source_dir
+
+
+def _class_apis(java_version, classpath, class_names):
+    """
+    The non-private API of each class as javap prints it without -p (the declaration and the package,
+    protected and public members), as a sorted list of lines per class; None if javap fails.
+    """
+    try:
+        result = subprocess.run([_java_tool(java_version, "javap"), "-cp", os.pathsep.join(classpath), *class_names],
+                                text=True, capture_output=True)
+    except FileNotFoundError:
+        return None
+    if result.returncode != 0:
+        return None
+    apis = []
+    for line in result.stdout.splitlines():
+        if line.startswith("Compiled from "):
+            apis.append([])
+        elif line.strip() and apis:
+            apis[-1].append(line.strip())
+    return [sorted(api) for api in apis] if len(apis) == len(class_names) else None
+
+
+def _same_api(baseline, classes_dir, java_version):
+    """
+    Whether the classes compiled into classes_dir have the same non-private API as in the baseline build,
+    in which case every file that uses them still compiles against the baseline classes.
+    """
+    class_names = []
+    for root_dir, _, files in os.walk(classes_dir):
+        for name in files:
+            if name.endswith(".class") and not ANONYMOUS_CLASS.search(name):
+                relative_path = os.path.relpath(os.path.join(root_dir, name), classes_dir)
+                class_names.append(relative_path[:-len(".class")].replace(os.sep, "."))
+    if not class_names:
+        return False
+    new_apis = _class_apis(java_version, [classes_dir], class_names)
+    return new_apis is not None and new_apis == _class_apis(java_version, baseline["classpath"], class_names)
+
+
+def incremental_compile(project_dir, commit_id, replaced_files, java_version=None):
+    """
+    Checks a single-file change with javac instead of a full build. The changed file is compiled
+    against the baseline build of the parent commit. javac only decides a success if the non-private
+    API of the compiled classes is identical to the baseline (e.g. an Inline Method of a private
+    method); otherwise files that use the class, in any way, may no longer compile, and None is
+    returned for a full build. If javac reports errors, the original file is compiled the same way;
+    when that fails as well (annotation processors, generated sources, test helpers missing from the
+    classpath) javac cannot decide and None is returned.
+
+    Parameters:
+        project_dir (str): Path to the project repository.
+        commit_id (str): The refactoring commit; its parent is the baseline.
+        replaced_files (dict): Absolute path -> new content of the replaced files.
+        java_version (int | float | str, optional): The JDK to compile with.
+
+    Returns:
+        tuple: (success, log) as returned by compile_project, or None if a full build is needed.
+    """
+    if len(replaced_files) != 1:
+        # cross-file moves change several classes at once, leave them to the full build
+        return None
+    (file_path, new_code), = replaced_files.items()
+    relative_path = os.path.relpath(file_path, project_dir)
+    result = _git(project_dir, "rev-parse", f"{commit_id}~1")
+    if result.returncode != 0:
+        return None
+    prev_commit = result.stdout.strip()
+    baseline = get_javac_baseline(project_dir, prev_commit, java_version)
+    if baseline is None:
+        return None
+    sources = {relative_path: new_code}
+
+    print(f"Compiling {relative_path} with javac...")
+    classes_dir = tempfile.mkdtemp(prefix="javac-classes-")
+    try:
+        returncode, output, source_dir = _run_javac(baseline, sources, java_version, classes_dir)
+        if returncode == 0:
+            if _same_api(baseline, classes_dir, java_version):
+                return True, "Build succeeded."
+            print("The change alters the non-private API of the class, falling back to a full build.")
+            return None
+    finally:
+        shutil.rmtree(classes_dir, ignore_errors=True)
+    if returncode != 1:
+        # 1 means compile errors; anything else is a javac usage or system error
+        print(f"javac could not be run: {output}")
+        return None
+    original = _git(project_dir, "show", f"{prev_commit}:{relative_path.replace(os.sep, '/')}")
+    if original.returncode != 0:
+        return None
+    sources[relative_path] = original.stdout
+    if _run_javac(baseline, sources, java_version)[0] != 0:
+        print("javac also fails on the original code, falling back to a full build.")
+        return None
+    errors = [line.replace(source_dir + os.sep, project_dir.rstrip(os.sep) + os.sep)
+              for line in output.splitlines() if re.search(r"\.java:\d+: error: ", line)]
+    return False, errors
+
@@ -5,10 +5,13 @@ import xml.etree.ElementTree as ET
 from lxml import etree
 from xml.dom import minidom
 
+from java_home import java_env
+from worktree_pool import get_worktree_pool
 
-def run_command(command):
+
+def run_command(command, cwd=None, env=None):
     """运行系统命令并捕获输出"""
-    result = subprocess.run(command, shell=True, text=True, capture_output=True)
+    result = subprocess.run(command, shell=True, text=True, capture_output=True, cwd=cwd, env=env)
     success = result.returncode == 0
     if success:
         print(f"Command succeeded: {command}")
@@ -17,35 +20,9 @@ def run_command(command):
     return success, result
 
 
-def switch_java_version(version):
-    """
-    通过命令行切换 Java 版本。
-
-    :param version: 要切换的 Java 版本（如 '17' 或 '11'）。
-    :return: None
-    """
-    try:
-        # 构建 jenv 切换命令
-
-        command = ["jenv", "global", str(version)]
-
-        # 执行命令
-        subprocess.run(command, check=True)
-
-        # 检查是否切换成功
-        result = subprocess.run(["jenv", "version"], capture_output=True, text=True, check=True)
-        if str(version) in result.stdout:
-            print(f"成功切换到 Java {version}。")
-        else:
-            print(f"切换到 Java {version} 失败。当前版本: {result.stdout.strip()}")
-    except subprocess.CalledProcessError as e:
-        print(f"切换 Java 版本失败: {e}")
-    except FileNotFoundError:
-        print("未找到 jenv 命令，请确保 jenv 已正确安装并在路径中。")
-
-def get_previous_commit(commit_id):
+def get_previous_commit(commit_id, project_dir=None):
     """获取指定 commit 的上一个 commit"""
-    result = subprocess.run(f"git rev-parse {commit_id}~1", shell=True, text=True, capture_output=True)
+    result = subprocess.run(f"git rev-parse {commit_id}~1", shell=True, text=True, capture_output=True, cwd=project_dir)
     if result.returncode == 0:
         return result.stdout.strip()
     else:
@@ -258,9 +235,10 @@ def modify_pom_file(project_dir, pom_file):
     run_mvn_tidy_pom(project_dir)
 
 
-def run_maven_verify():
+def run_maven_verify(project_dir=None, java_version=None):
     """运行 mvn clean verify"""
-    success, result = run_command("mvn clean package  -Drat.skip=true -Dmaven.javadoc.skip=true")
+    success, result = run_command("mvn clean package  -Drat.skip=true -Dmaven.javadoc.skip=true", cwd=project_dir,
+                                  env=java_env(java_version))
     str_result = ""
     if not success:
         # 打印构建失败的详细信息
@@ -276,7 +254,7 @@ def run_maven_verify():
     return success, str_result
 
 
-def extract_method_coverage(class_name, method_name=None, class_file=None):
+def extract_method_coverage(class_name, method_name=None, class_file=None, project_dir="."):
     """
     Extracts coverage information for a specific method in a given class from a JaCoCo XML report.
 
@@ -284,14 +262,15 @@ def extract_method_coverage(class_name, method_name=None, class_file=None):
         xml_file (str): Path to the JaCoCo XML report file.
         class_name (str): Fully qualified class name to extract coverage information for.
         method_name (str, optional): Method name to extract coverage information for. If None, extract all methods.
+        project_dir (str, optional): Directory searched for jacoco.xml reports (default is the current directory).
 
     Returns:
         dict: A dictionary where the keys are method names and values are their coverage details.
               Returns an empty dictionary if the class or method is not found.
     """
-    # Find all JaCoCo XML files in the current directory and subdirectories
+    # Find all JaCoCo XML files in the project directory and subdirectories
     jacoco_files = []
-    for root_dir, _, files in os.walk("."):
+    for root_dir, _, files in os.walk(project_dir):
         for file in files:
             if file == "jacoco.xml":
                 jacoco_files.append(os.path.join(root_dir, file))
@@ -399,34 +378,30 @@ def run_mvn_tidy_pom(project_dir):
 
 
 def get_jacoco_result(project_dir, commit_hash, class_name, method_name, class_file, pom_file, java_version):
-
+    previous_commit = get_previous_commit(commit_hash, project_dir)
+    if not previous_commit:
+        return False, False, {"Switch Failed": {"missed": 0, "covered": 0}}
+    # Step 1: 在 worktree 中切换到指定 commit, the shared clone is left untouched
     try:
-        os.chdir(project_dir)
-        print(f"Switched to project directory: {project_dir}")
-    except Exception as e:
-        print(f"Failed to switch to directory {project_dir}: {e}")
-        return
+        with get_worktree_pool(project_dir).borrow(previous_commit) as worktree_dir:
+            return _get_jacoco_result_in_worktree(worktree_dir, class_name, method_name, class_file, java_version)
+    except RuntimeError as e:
+        print(f"Failed to switch to commit {previous_commit}: {e}")
+        return False, False, {"Switch Failed": {"missed": 0, "covered": 0}}
 
 
-    previous_commit = get_previous_commit(commit_hash)
-    # Step 1: 切换到指定 commit
-    switch_result = switch_to_commit(previous_commit)
-    if not switch_result:
-        print(f"Failed to switch to commit {previous_commit}")
-        return False, False, {"Switch Failed": {"missed": 0, "covered": 0}}
+def _get_jacoco_result_in_worktree(worktree_dir, class_name, method_name, class_file, java_version):
     coverage = None
     # Step 3: 修改 pom.xml
-    modify_build_file(project_dir)
+    modify_build_file(worktree_dir)
     # Step 4: 编译并生成覆盖率报告
-    switch_java_version(java_version)
-    verify_result, log = run_maven_verify()
-    switch_java_version(17)
+    verify_result, log = run_maven_verify(worktree_dir, java_version)
     if not verify_result:
         print(f"Failed to build the project: {log}")
         return False, False, {"Build Failed": {"missed": 0, "covered": 0}}
     # Step 2: 判断方法是否为测试方法
     if not is_test_method(class_file):
-        coverage =  extract_method_coverage(class_name, method_name, class_file)
+        coverage =  extract_method_coverage(class_name, method_name, class_file, worktree_dir)
         # Step 5: 提取覆盖率信息
         if coverage:
             if coverage[method_name]["LINE"]["covered"] != 0:
@@ -0,0 +1,101 @@
+import glob
+import os
+import re
+import subprocess
+import threading
+
+_java_homes = {}
+_java_homes_lock = threading.Lock()
+
+
+def java_major_version(version):
+    """
+    Normalizes a Java version as written in compileJDK (e.g. 11, '17', 1.8, '1.8') to its major version.
+
+    Returns:
+        str: The major version, e.g. '8', '11' or '17'.
+    """
+    version = str(version).strip()
+    if version.startswith("1."):
+        version = version[2:]
+    return version.split(".")[0]
+
+
+def _release_version(java_home):
+    """Reads the major version from the 'release' file of a JDK, None if it is not a JDK."""
+    release_file = os.path.join(java_home, "release")
+    if not os.path.isfile(release_file):
+        return None
+    with open(release_file, "r", encoding="utf-8", errors="ignore") as file:
+        match = re.search(r'^JAVA_VERSION="([^"]+)"', file.read(), re.MULTILINE)
+    return java_major_version(match.group(1)) if match else None
+
+
+def _candidate_java_homes():
+    """JDK directories installed by jenv, the macOS installer or the Linux packages."""
+    jenv_root = os.environ.get("JENV_ROOT", os.path.expanduser("~/.jenv"))
+    candidates = sorted(glob.glob(os.path.join(jenv_root, "versions", "*")))
+    candidates += sorted(glob.glob("/Library/Java/JavaVirtualMachines/*/Contents/Home"))
+    candidates += sorted(glob.glob("/usr/lib/jvm/*"))
+    return [os.path.realpath(candidate) for candidate in candidates]
+
+
+def _find_java_home(major):
+    # an explicit JAVA<major>_HOME, e.g. JAVA11_HOME, wins
+    java_home = os.environ.get(f"JAVA{major}_HOME")
+    if java_home and os.path.isdir(java_home):
+        return java_home
+    for candidate in _candidate_java_homes():
+        if _release_version(candidate) == major:
+            return candidate
+    if os.path.exists("/usr/libexec/java_home"):
+        version = "1.8" if major == "8" else major
+        result = subprocess.run(["/usr/libexec/java_home", "-v", version], capture_output=True, text=True)
+        if result.returncode == 0 and result.stdout.strip():
+            return result.stdout.strip()
+    return None
+
+
+def resolve_java_home(version):
+    """
+    Resolves the JAVA_HOME of a Java version. The lookup runs once per version and process.
+
+    Parameters:
+        version (int | float | str): The Java version, e.g. 11, 1.8 or '17'.
+
+    Returns:
+        str: The JDK directory, or None if no JDK of that version is installed.
+    """
+    major = java_major_version(version)
+    with _java_homes_lock:
+        if major not in _java_homes:
+            _java_homes[major] = _find_java_home(major)
+            if _java_homes[major] is None:
+                print(f"No JDK found for Java {version}; set JAVA{major}_HOME to its installation directory.")
+            else:
+                print(f"Using JAVA_HOME {_java_homes[major]} for Java {version}")
+        return _java_homes[major]
+
+
+def java_env(version, base_env=None):
+    """
+    Environment for a subprocess that must run with a given Java version: JAVA_HOME points to the
+    JDK and its bin directory comes first on PATH. Nothing global is changed, so builds with
+    different Java versions can run at the same time.
+
+    Parameters:
+        version (int | float | str): The Java version, None to keep the inherited environment.
+        base_env (dict, optional): The environment to extend (default is os.environ).
+
+    Returns:
+        dict: The environment to pass as env= to subprocess.run, or None to inherit the current one.
+    """
+    if version is None:
+        return base_env
+    java_home = resolve_java_home(version)
+    if java_home is None:
+        return base_env
+    env = dict(os.environ if base_env is None else base_env)
+    env["JAVA_HOME"] = java_home
+    env["PATH"] = os.path.join(java_home, "bin") + os.pathsep + env.get("PATH", "")
+    return env
@@ -1,7 +1,6 @@
 import json
 import os
 import re
-import subprocess
 
 from langchain.prompts import PromptTemplate
 from langchain_community.chat_models import ChatOllama
@@ -10,8 +9,11 @@ from langchain_openai import ChatOpenAI
 from tqdm import tqdm
 
 from compile_experiment import checkout_previous_commit, \
-    switch_java_version, compile_project
+    compile_project
+from model.refactoring_dataset import load_shared_dataset
 from project_util import get_project_structure
+from refactoring_miner_service import run_refactoring_miner
+from scratch_space import ScratchSpace
 
 project_prefix_path = '/Users/yisenxu/Downloads/Research/SOEN6491/Code/refactoring_benchmark'
 # OpenAI API key
@@ -33,8 +35,7 @@ project_name = "mockito"
 
 file_path = f'{project_prefix_path}/data/{project_name}/{project_name}_pure_refactoring_data.json'
 project_path = f'/Users/yisenxu/Downloads/Research/SOEN6491/Projects/llm-refactoring-miner/tmp/{project_name}'
-with open(file_path, 'r') as file:
-    data = json.load(file)
+data = load_shared_dataset(file_path)
 
 
 # Function to load the prompt template from a file
@@ -212,9 +213,7 @@ def compile_project_for_base(compile_jdk):
     except Exception as e:
         print(f"Failed to switch to directory {project_path}: {e}")
         return False, "Failed to switch to directory."
-    switch_java_version(compile_jdk)
-    compile_re, log = compile_project()
-    switch_java_version(17)
+    compile_re, log = compile_project(java_version=compile_jdk)
     return compile_re, log
 
 
@@ -368,13 +367,10 @@ def handle_import_in_target_class(extracted_method_code, origin_class_code, targ
     return static_imports_to_add + imports_to_add
 
 def check_refactoring_for_single_file(origin_file_path, origin_code, origin_refactored_code, refactoring_type):
-    file_path_before = f"{project_prefix_path}/data/tmp/source_code_before_for_whole.txt"
-    file_path_after = f"{project_prefix_path}/data/tmp/source_code_after_for_whole.txt"
-    with open(file_path_before, "w", encoding="utf-8") as file:
-        file.write(origin_code)
-    with open(file_path_after, "w", encoding="utf-8") as file:
-        file.write(origin_refactored_code)
-    return check_refactoring_result_all(refactoring_type, origin_file_path, file_path_before, file_path_after)
+    with ScratchSpace() as scratch:
+        file_path_before = scratch.write("source_code_before_for_whole.txt", origin_code)
+        file_path_after = scratch.write("source_code_after_for_whole.txt", origin_refactored_code)
+        return check_refactoring_result_all(refactoring_type, origin_file_path, file_path_before, file_path_after)
 
 
 def check_refactoring_result_all(refactoring_type, origin_file_path, file_path_before, file_path_after, target_file_path = None):
@@ -384,7 +380,6 @@ def check_refactoring_result_all(refactoring_type, origin_file_path, file_path_b
         print(f"Switched to project directory: {project_path}")
     except Exception as e:
         print(f"Failed to switch to directory {project_path}: {e}")
-    switch_java_version(17)
     try:
         os.chdir(project_prefix_path)
         print(f"Switched to project directory: {project_prefix_path}")
@@ -392,14 +387,14 @@ def check_refactoring_result_all(refactoring_type, origin_file_path, file_path_b
         print(f"Failed to switch to directory {project_prefix_path}: {e}")
 
     if target_file_path:
-        exe_result = subprocess.run(
-            [f"./data/tools/RefactoringMiner-3.0.10/bin/RefactoringMiner", "-spr", origin_file_path,
+        exe_result = run_refactoring_miner(
+            ["-spr", origin_file_path,
              file_path_before,
-             target_file_path, file_path_after, refactoring_type], capture_output=True, text=True)
+             target_file_path, file_path_after, refactoring_type])
     else:
-        exe_result = subprocess.run(
-            ["./data/tools/RefactoringMiner-3.0.10/bin/RefactoringMiner", "-scr", origin_file_path, file_path_before,
-             file_path_after, refactoring_type], capture_output=True, text=True)
+        exe_result = run_refactoring_miner(
+            ["-scr", origin_file_path, file_path_before,
+             file_path_after, refactoring_type])
     if exe_result.returncode != 0:
         print(f"Error running RefactoringMiner: {exe_result.stderr}")
         return False, "RefactoringMiner execution failed."
@@ -414,13 +409,10 @@ def check_refactoring_result_all(refactoring_type, origin_file_path, file_path_b
         return False, " the code didn't perform " + refactoring_type + " operation."
 
 def check_refactoring_for_multiple_files(origin_file_path, origin_refactored_code, target_file_path, target_refactored_code, refactoring_type):
-    original_refactored_code_path_after = f"{project_prefix_path}/data/tmp/original_refactored_code.txt"
-    target_refactored_code_path_after = f"{project_prefix_path}/data/tmp/target_refactored_code.txt"
-    with open(original_refactored_code_path_after, "w", encoding="utf-8") as file:
-        file.write(origin_refactored_code)
-    with open(target_refactored_code_path_after, "w", encoding="utf-8") as file:
-        file.write(target_refactored_code)
-    return check_refactoring_result_all(refactoring_type, origin_file_path, original_refactored_code_path_after, target_refactored_code_path_after, target_file_path)
+    with ScratchSpace() as scratch:
+        original_refactored_code_path_after = scratch.write("original_refactored_code.txt", origin_refactored_code)
+        target_refactored_code_path_after = scratch.write("target_refactored_code.txt", target_refactored_code)
+        return check_refactoring_result_all(refactoring_type, origin_file_path, original_refactored_code_path_after, target_refactored_code_path_after, target_file_path)
 
 def extract_fields_for_extract_method(refactored_code_str):
     """extract the fields from the refactored code string"""
@@ -568,36 +560,33 @@ def check_refactoring_compile_result(refactoring_id: str, refactored_code_str: s
     print("call check_refactoring_result, refactoring_id:", refactoring_id)
     if refactored_code_str == "":
         return False, "The refactored code is empty.", False, "The refactored code is empty."
-    for refactoring in data:
-        if refactoring['uniqueId'] == refactoring_id:
-            refactoring_type = refactoring['type']
-            if refactoring_type == "Extract Method":
-                return check_extract_method_refactoring_compile_result(refactoring_id, refactoring, refactored_code_str)
-            if refactoring_type == "Move Method":
-                return check_move_method_refactoring_compile_result(refactoring_id, refactoring, refactored_code_str)
-            if refactoring_type == "Inline Method":
-                return check_inline_method_refactoring_compile_result(refactoring_id, refactoring, refactored_code_str)
-            if refactoring_type == "Move And Rename Method":
-                return check_move_method_refactoring_compile_result(refactoring_id, refactoring, refactored_code_str)
-            if refactoring_type == "Extract And Move Method":
-                return check_extract_and_move_method_refactoring_compile_result(refactoring_id, refactoring, refactored_code_str)
-            if refactoring_type == "Move And Inline Method":
-                return False, "the code didn't perform move and inline method operation.", False, "the code didn't perform move and inline method operation."
+    refactoring = data.get(refactoring_id)
+    if refactoring is not None:
+        refactoring_type = refactoring['type']
+        if refactoring_type == "Extract Method":
+            return check_extract_method_refactoring_compile_result(refactoring_id, refactoring, refactored_code_str)
+        if refactoring_type == "Move Method":
+            return check_move_method_refactoring_compile_result(refactoring_id, refactoring, refactored_code_str)
+        if refactoring_type == "Inline Method":
+            return check_inline_method_refactoring_compile_result(refactoring_id, refactoring, refactored_code_str)
+        if refactoring_type == "Move And Rename Method":
+            return check_move_method_refactoring_compile_result(refactoring_id, refactoring, refactored_code_str)
+        if refactoring_type == "Extract And Move Method":
+            return check_extract_and_move_method_refactoring_compile_result(refactoring_id, refactoring, refactored_code_str)
+        if refactoring_type == "Move And Inline Method":
+            return False, "the code didn't perform move and inline method operation.", False, "the code didn't perform move and inline method operation."
     return False, "cannot find the refactoring id", False, "cannot find the refactoring id"
 
 
 def check_extraction_refactoring(refactoring, refactored_class_code, refactoring_type):
     source_code_before_for_whole = refactoring['sourceCodeBeforeForWhole']
-    file_path_before = "/Users/yisenxu/Downloads/Research/SOEN6491/Code/rag_refactoring/data/tmp/source_code_before_for_whole.txt"
-    file_path_after = "/Users/yisenxu/Downloads/Research/SOEN6491/Code/rag_refactoring/data/tmp/source_code_after_for_whole.txt"
-    with open(file_path_before, "w", encoding="utf-8") as file:
-        file.write(source_code_before_for_whole)
-    with open(file_path_after, "w", encoding="utf-8") as file:
-        file.write(refactored_class_code)
     java_file_path = refactoring['filePathBefore']
-    exe_result = subprocess.run(
-        [f"{project_prefix_path}/data/tools/RefactoringMiner-3.0.10/bin/RefactoringMiner", "-scr", java_file_path, file_path_before,
-         file_path_after, refactoring_type], capture_output=True, text=True)
+    with ScratchSpace() as scratch:
+        file_path_before = scratch.write("source_code_before_for_whole.txt", source_code_before_for_whole)
+        file_path_after = scratch.write("source_code_after_for_whole.txt", refactored_class_code)
+        exe_result = run_refactoring_miner(
+            ["-scr", java_file_path, file_path_before,
+             file_path_after, refactoring_type])
     refactoring_result = exe_result.stdout
     last_line = refactoring_result.strip().split('\n')[-1]
     result_word = [word for word in last_line.split()]
@@ -648,10 +637,10 @@ def get_project_structure_info(refactoring_id: str = "") -> list:
     print("call get_project_structure_info, refactoring_id:", refactoring_id)
     if refactoring_id == "":
         return "Please provide the refactoring_id parameter."
-    for refactoring in data:
-        if refactoring['uniqueId'] == refactoring_id:
-            file_path_before = refactoring['filePathBefore']
-            return get_project_structure(project_path, refactoring['commitId'], file_path_before)
+    refactoring = data.get(refactoring_id)
+    if refactoring is not None:
+        file_path_before = refactoring['filePathBefore']
+        return get_project_structure(project_path, refactoring['commitId'], file_path_before)
 
 
 def get_prompt_template(refactoring_type):
@@ -0,0 +1,75 @@
+import json
+import os
+
+_shared_datasets = {}
+
+
+class RefactoringDataset:
+    def __init__(self, refactorings):
+        """
+        Initializes the dataset with a list of refactoring records and indexes them by uniqueId.
+        Like add, a later record replaces any earlier record with the same uniqueId.
+
+        Parameters:
+            refactorings (list): A list of refactoring dicts, each carrying a 'uniqueId' field.
+        """
+        self.refactorings = []
+        self.refactoring_index = {}
+        for refactoring in refactorings:
+            self.add(refactoring)
+
+    @staticmethod
+    def load_from_file(file_path):
+        """load the refactoring records from a JSON list file."""
+        with open(file_path, 'r') as file:
+            return RefactoringDataset(json.load(file))
+
+    def get(self, unique_id, default=None):
+        """
+        Looks up a refactoring record by its uniqueId.
+
+        Parameters:
+            unique_id (str): The uniqueId of the refactoring.
+            default: Value returned when the id is unknown (default is None).
+
+        Returns:
+            dict: The refactoring record itself (not a copy), so updates are visible to every tool.
+        """
+        return self.refactoring_index.get(unique_id, default)
+
+    def add(self, refactoring):
+        """
+        Adds a derived refactoring record, e.g. the '_move' entries of Extract And Move Method.
+        A record added later replaces any earlier record with the same uniqueId.
+
+        Parameters:
+            refactoring (dict): The refactoring record to add.
+        """
+        self.refactorings.append(refactoring)
+        self.refactoring_index[refactoring['uniqueId']] = refactoring
+
+    def __contains__(self, unique_id):
+        return unique_id in self.refactoring_index
+
+    def __iter__(self):
+        return iter(self.refactorings)
+
+    def __len__(self):
+        return len(self.refactorings)
+
+
+def load_shared_dataset(file_path):
+    """
+    Loads the dataset once per process and shares it between every module that asks for the same file,
+    so records added by one tool (e.g. '_move' entries) are visible to the others.
+
+    Parameters:
+        file_path (str): Path to the evaluation data JSON file.
+
+    Returns:
+        RefactoringDataset: The shared dataset for this file.
+    """
+    key = os.path.abspath(file_path)
+    if key not in _shared_datasets:
+        _shared_datasets[key] = RefactoringDataset.load_from_file(file_path)
+    return _shared_datasets[key]
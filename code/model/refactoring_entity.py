@@ -55,7 +55,7 @@ class RefactoringRepository:
             for refactoring_data in commit.get("refactoringAnalyses", []):
                 if 'contextDescription' in refactoring_data:
                     refactoring = Refactoring(refactoring_data)
-                    refactoring_map[refactoring.context_description + '\n' + remove_java_comments(refactoring.source_code_before)] = refactoring.to_dict()
+                    refactoring_map[self.document_text(refactoring_data)] = refactoring.to_dict()
         return refactoring_map
 
     def save_to_file(self, filename, format="json"):
@@ -72,6 +72,28 @@ class RefactoringRepository:
         with open(filename, "r" if format == "json" else "rb") as f:
             return json.load(f) if format == "json" else pickle.load(f)
 
+    @staticmethod
+    def load_by_unique_id(filename):
+        """
+        Loads refactorings keyed by uniqueId, so retrieval can carry short ids. filename is either a
+        RefactoringMiner data file ({"commits": [...]}), whose records are all kept, or a refactoring_map
+        file keyed by document text, where records sharing the same text were already collapsed into one
+        when it was saved; callers must expect ids of the search indexes to be missing from that map.
+        """
+        with open(filename, "r") as f:
+            data = json.load(f)
+        if isinstance(data.get("commits"), list):
+            return {refactoring_data['uniqueId']: Refactoring(refactoring_data).to_dict()
+                    for commit in data["commits"]
+                    for refactoring_data in commit.get("refactoringAnalyses", [])
+                    if 'contextDescription' in refactoring_data}
+        return {refactoring['uniqueId']: refactoring for refactoring in data.values()}
+
+    @staticmethod
+    def document_text(refactoring):
+        """The text indexed for a refactoring in the vector store and BM25 (the refactoring_map key)."""
+        return refactoring['contextDescription'] + '\n' + remove_java_comments(refactoring['sourceCodeBeforeRefactoring'])
+
     def find_by_context_description(self, description):
         """search refactoring by contextDescription."""
         return self.refactoring_map.get(description, "Refactoring not found")
@@ -3,8 +3,7 @@ import functools
 import json
 import operator
 import os
-import re
-import subprocess
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import Annotated, Sequence
 
@@ -25,13 +24,18 @@ from tqdm import tqdm
 from typing_extensions import TypedDict
 
 from bm25 import BM25
-from compile_experiment import get_compile_result_in_commit, switch_java_version
+from checkstyle_service import format_violations, run_checkstyle
+from compile_experiment import get_compile_result_in_commit
 from rag.contextual_rag_process import get_context_description
+from refactoring_miner_service import run_refactoring_miner
+from scratch_space import ScratchSpace, configure_scratch_space
 from multiple_agent_rag_refactoring_util import extract_method_util
 from utils.project_util import get_project_structure, read_java_file_content_in_commit
-from rag.rag_embedding import search_chroma, add_documents_to_chroma, chroma_client
-from rag.reciprocal_rank_fusion import ReciprocalRankFusion
+from rag.rag_embedding import add_documents_to_chroma, get_collection
+from rag.hybrid_retriever import HybridRetriever
+from rag.retrieval_cache import RetrievalCache
 from model.refactoring_entity import RefactoringRepository
+from model.refactoring_dataset import load_shared_dataset
 from rag.reranking import Reranking
 from workflow_for_fix_bug import repair_code
 
@@ -40,9 +44,10 @@ with open('config.yaml', 'r') as file:
 # OpenAI API key
 OPENAI_API_KEY = config['OPENAI_API_KEY']
 project_prefix_path = config['project_prefix_path']
-refactoring_map = RefactoringRepository.load_from_file(f"{project_prefix_path}/data/refactoring_info/refactoring_map_em_wc_v4.json",
-                                                   format="json")
+refactoring_map = RefactoringRepository.load_by_unique_id(f"{project_prefix_path}/data/refactoring_info/refactoring_map_em_wc_v4.json")
 project_name = config['project_name']
+incremental_compile = config.get('incremental_compile', False)
+configure_scratch_space(tmpfs=config.get('scratch_tmpfs', False))
 
 file_path = f'{project_prefix_path}/data/{project_name}/{project_name}_evaluation_data.json'
 project_path = f'{project_prefix_path}/projects/{project_name}'
@@ -56,9 +61,14 @@ REFACTORING_RESULT = False
 ERROR_LOG = ""
 EXTRACT_METHOD = ""
 REFACTORING_ID = ""
+# similar refactorings retrieved ahead of time by precompute_similar_refactorings, keyed by (refactoring id, type)
+SIMILAR_REFACTORINGS = {}
+# refactoring types the agents do not handle
+SKIPPED_REFACTORING_TYPES = ("Pull Up Method", "Push Down Method")
 
-with open(file_path, 'r') as file:
-    data = json.load(file)
+data = load_shared_dataset(file_path)
+hybrid_retriever = HybridRetriever('refactoring_miner_em_wc_context_agent_collection')
+retrieval_cache = RetrievalCache(f'{project_prefix_path}/data/cache/retrieval_results.sqlite')
 
 def create_agent(llm, tools, system_message: str):
     """Create an agent."""
@@ -100,16 +110,38 @@ def create_debugger_agent(llm, system_message: str):
     return prompt | llm
 
 
+def load_bm25_index(refactoring_type):
+    """
+    Loads the BM25 index of a refactoring type. A legacy '_bm25result.pkl' index is converted to the
+    index directory on first use, with the uniqueIds of its documents taken from refactoring_map.
+
+    Raises:
+        FileNotFoundError: There is neither an index directory nor a legacy index for the type.
+    """
+    index_prefix = f'{project_prefix_path}/data/model/refactoring_miner_em_wc_context_agent_collection_' + refactoring_type
+    index_path = index_prefix + '_bm25index'
+    legacy_path = index_prefix + '_bm25result.pkl'
+    if os.path.isdir(index_path):
+        return BM25.load_cached_model(index_path)
+    if not os.path.exists(legacy_path):
+        raise FileNotFoundError(f"No BM25 index for {refactoring_type}: neither {index_path} nor {legacy_path} exists")
+    doc_id_by_text = {RefactoringRepository.document_text(refactoring): unique_id
+                      for unique_id, refactoring in refactoring_map.items()}
+    return BM25.convert_legacy_model(legacy_path, index_path, doc_id_by_text)
+
+
 @tool
 def get_similar_refactoring(source_code_before_refactoring: str, refactoring_type: str) -> list:
     """
     Get similar refactoring examples based on the source code before refactoring and refactoring type.
     """
     global REFACTORING_ID
+    if (REFACTORING_ID, refactoring_type) in SIMILAR_REFACTORINGS:
+        return SIMILAR_REFACTORINGS[(REFACTORING_ID, refactoring_type)]
     refactoring = get_refactoring(REFACTORING_ID)
     contextual_description = get_context_description(refactoring)
     print("call get_similar_refactoring, source_code_before_refactoring: ", source_code_before_refactoring, "refactoring_type: ", refactoring_type)
-    bm25_model = BM25.load_model(f'{project_prefix_path}/data/model/refactoring_miner_em_wc_context_agent_collection_' + refactoring_type +'_bm25result.pkl')
+    bm25_model = load_bm25_index(refactoring_type)
     return get_historical_refactorings(contextual_description, refactoring_map, bm25_model, refactoring_type)
 
 
@@ -120,9 +152,9 @@ def get_method_body_by_refactoring_id(refactoring_id: str) -> str:
     """
     print("call get_method_body_by_refactoring_id, refactoring_id: ", refactoring_id)
 
-    for refactoring in data:
-        if refactoring['uniqueId'] == refactoring_id:
-            return refactoring['sourceCodeBeforeRefactoring']
+    refactoring = data.get(refactoring_id)
+    if refactoring is not None:
+        return refactoring['sourceCodeBeforeRefactoring']
 
 @tool
 def get_call_graph_by_refactoring_id(refactoring_id: str) -> str:
@@ -130,11 +162,11 @@ def get_call_graph_by_refactoring_id(refactoring_id: str) -> str:
     Get the call graph by refactoring ID.
     """
     print("call get_call_graph_by_refactoring_id, refactoring_id: ", refactoring_id)
-    for refactoring in data:
-        if refactoring['uniqueId'] == refactoring_id:
-            if 'invokedMethod' not in refactoring:
-                return "No call graph available."
-            return refactoring['invokedMethod']
+    refactoring = data.get(refactoring_id)
+    if refactoring is not None:
+        if 'invokedMethod' not in refactoring:
+            return "No call graph available."
+        return refactoring['invokedMethod']
 
 @tool
 def get_class_signature_by_refactoring_id(refactoring_id: str) -> str:
@@ -142,17 +174,17 @@ def get_class_signature_by_refactoring_id(refactoring_id: str) -> str:
     Get the class signature by refactoring ID.
     """
     print("call get_class_signature_by_refactoring_id, refactoring_id: ", refactoring_id)
-    for refactoring in data:
-        if refactoring['uniqueId'] == refactoring_id:
-            return refactoring['classSignatureBefore']
+    refactoring = data.get(refactoring_id)
+    if refactoring is not None:
+        return refactoring['classSignatureBefore']
 
 @tool
 def get_methods_to_be_refactored_by_refactoring_id(refactoring_id: str) -> list:
     """ Get the methods to be refactored by refactoring ID."""
     print("call get_methods_to_be_refactored_by_refactoring_id, refactoring_id: ", refactoring_id)
-    for refactoring in data:
-        if refactoring['uniqueId'] == refactoring_id:
-            return refactoring['methodNameBefore'] + "\n" + refactoring['sourceCodeBeforeRefactoring']
+    refactoring = data.get(refactoring_id)
+    if refactoring is not None:
+        return refactoring['methodNameBefore'] + "\n" + refactoring['sourceCodeBeforeRefactoring']
 
 @tool
 def get_package_name_by_refactoring_id(refactoring_id: str) -> str:
@@ -160,9 +192,9 @@ def get_package_name_by_refactoring_id(refactoring_id: str) -> str:
     Get the package name by refactoring ID.
     """
     print("call get_package_name_by_refactoring_id, refactoring_id: ", refactoring_id)
-    for refactoring in data:
-        if refactoring['uniqueId'] == refactoring_id:
-            return refactoring['packageNameBefore']
+    refactoring = data.get(refactoring_id)
+    if refactoring is not None:
+        return refactoring['packageNameBefore']
 
 @tool
 def get_class_name_by_refactoring_id(refactoring_id: str) -> str:
@@ -170,42 +202,23 @@ def get_class_name_by_refactoring_id(refactoring_id: str) -> str:
     Get the class name by refactoring ID.
     """
     print("call get_class_name_by_refactoring_id, refactoring_id: ", refactoring_id)
-    for refactoring in data:
-        if refactoring['uniqueId'] == refactoring_id:
-            return refactoring['classNameBefore']
+    refactoring = data.get(refactoring_id)
+    if refactoring is not None:
+        return refactoring['classNameBefore']
 
 
 @tool
 def check_java_style(refactored_code: str, target_file_path:str = "") -> str:
     """Input: refactored_code, target_file_path. If you perform move operation, you need to provide the exist target file path. Function: Check the Java code style using Checkstyle."""
-    config_file = f"{project_prefix_path}/data/config/sun_checks.xml"
-    file_path = f"{project_prefix_path}/data/tmp/TempClass.java"
     print("call check_java_style")
-    file_path = Path(file_path)
-    file_path.write_text(refactored_code, encoding="utf-8")
     global REFACTORED_CODE
     global EXTRACT_METHOD
     REFACTORED_CODE = refactored_code
-    # run checkstyle
-    result = subprocess.run(
-        ["java","-jar",f"{project_prefix_path}/data/tools/checkstyle-10.20.1-all.jar", "-c", config_file, str(file_path)],
-        capture_output=True,
-        text=True
-    )
-    style_result = result.stdout
-    lines = style_result.strip().splitlines()
-    error_lines = lines[2:] if len(lines) > 2 else []
-    error_descriptions = []
-    pattern = re.compile(r':(\d+):(\d+): (.*? \[.*?\].*?)')
-    for line in error_lines:
-        match = pattern.search(line)
-        if match:
-            line_number = int(match.group(1)) - 4
-            column_number = match.group(2)
-            message = match.group(3)
-            result = f"line:{line_number} column:{column_number}: {message}"
-            error_descriptions.append(result)
-    return "\n".join(error_descriptions)
+    violations = run_checkstyle({"TempClass.java": refactored_code})["TempClass.java"]
+    # file-level violations have no column (e.g. the missing package-info.java of the lone TempClass.java)
+    # and cannot be fixed in the refactored code, they are left out like the column-less lines used to be
+    violations = [violation for violation in violations if violation['column'] > 0]
+    return format_violations(violations, line_offset=-4)
 
 @tool
 def check_refactoring_result(refactoring_id: str, refactored_class_code: str, target_file_path: str = ""):
@@ -220,14 +233,14 @@ def check_refactoring_result(refactoring_id: str, refactored_class_code: str, ta
         REFACTORING_RESULT = False
         return "False, Please provide the complete code without omitting any parts."
     refactoring_type = ""
-    for refactoring in data:
-        if refactoring['uniqueId'] == refactoring_id:
-            refactoring_type = refactoring['type']
-            if refactoring_type == "Move Method" or refactoring_type == "Move And Rename Method":
-                return check_move_method_refactoring(refactoring, refactored_class_code, target_file_path)
-            if refactoring_type == "Move And Inline Method":
-                return check_move_and_inline_method_refactoring(refactoring, refactored_class_code, target_file_path)
-            return check_refactoring(refactoring, refactored_class_code, refactoring_type)
+    refactoring = data.get(refactoring_id)
+    if refactoring is not None:
+        refactoring_type = refactoring['type']
+        if refactoring_type == "Move Method" or refactoring_type == "Move And Rename Method":
+            return check_move_method_refactoring(refactoring, refactored_class_code, target_file_path)
+        if refactoring_type == "Move And Inline Method":
+            return check_move_and_inline_method_refactoring(refactoring, refactored_class_code, target_file_path)
+        return check_refactoring(refactoring, refactored_class_code, refactoring_type)
     REFACTORING_RESULT = False
     return False, "the code didn't perform "+ refactoring_type + " operation."
 
@@ -242,36 +255,32 @@ def check_refactoring_result_with_context(refactoring_id: str, refactored_class_
         REFACTORING_RESULT = False
         return False,"Please provide the complete code without omitting any parts."
     refactoring_type = ""
-    for refactoring in data:
-        if refactoring['uniqueId'] == refactoring_id:
-            refactoring_type = refactoring['type']
-            if refactoring_type == "Move Method" or refactoring_type == "Move And Rename Method":
-                return check_move_method_refactoring(refactoring, refactored_class_code, target_file_path)
-            if refactoring_type == "Move And Inline Method":
-                return check_move_and_inline_method_refactoring(refactoring, refactored_class_code, target_file_path)
-            return check_refactoring(refactoring, refactored_class_code, refactoring_type)
+    refactoring = data.get(refactoring_id)
+    if refactoring is not None:
+        refactoring_type = refactoring['type']
+        if refactoring_type == "Move Method" or refactoring_type == "Move And Rename Method":
+            return check_move_method_refactoring(refactoring, refactored_class_code, target_file_path)
+        if refactoring_type == "Move And Inline Method":
+            return check_move_and_inline_method_refactoring(refactoring, refactored_class_code, target_file_path)
+        return check_refactoring(refactoring, refactored_class_code, refactoring_type)
     REFACTORING_RESULT = False
     return False, "the code didn't perform "+ refactoring_type + " operation."
 
 def check_refactoring(refactoring, refactored_class_code, refactoring_type):
     global REFACTORING_RESULT
     source_code_before_for_whole = refactoring['sourceCodeBeforeForWhole']
-    file_path_before = f"{project_prefix_path}/data/tmp/source_code_before_for_whole.txt"
-    file_path_after = f"{project_prefix_path}/data/tmp/source_code_after_for_whole.txt"
-    with open(file_path_before, "w", encoding="utf-8") as file:
-        file.write(source_code_before_for_whole)
-    with open(file_path_after, "w", encoding="utf-8") as file:
-        file.write(refactored_class_code)
     java_file_path = refactoring['filePathBefore']
     try:
         os.chdir(project_prefix_path)
         print(f"Switched to project directory: {project_path}")
     except Exception as e:
         print(f"Failed to switch to directory {project_path}: {e}")
-    switch_java_version(17)
-    exe_result = subprocess.run(
-        ["./data/tools/RefactoringMiner-3.0.10/bin/RefactoringMiner", "-scr", java_file_path, file_path_before,
-         file_path_after, refactoring_type], capture_output=True, text=True)
+    with ScratchSpace() as scratch:
+        file_path_before = scratch.write("source_code_before_for_whole.txt", source_code_before_for_whole)
+        file_path_after = scratch.write("source_code_after_for_whole.txt", refactored_class_code)
+        exe_result = run_refactoring_miner(
+            ["-scr", java_file_path, file_path_before,
+             file_path_after, refactoring_type])
     refactoring_result = exe_result.stdout
     last_line = refactoring_result.strip().split('\n')[-1]
     result_word = [word for word in last_line.split()]
@@ -289,15 +298,12 @@ def check_refactoring_for_multiple_files(refactoring, target_file_path, refactor
         refactoring['sourceCodeBeforeRefactoring'], "")
     refactoring_type = refactoring['type']
     target_refactored_code = refactored_class_code
-    original_refactored_code_path_after = f"{project_prefix_path}/data/tmp/original_refactored_code.txt"
-    target_refactored_code_path_after = f"{project_prefix_path}/data/tmp/target_refactored_code.txt"
-    with open(original_refactored_code_path_after, "w", encoding="utf-8") as file:
-        file.write(original_refactored_code)
-    with open(target_refactored_code_path_after, "w", encoding="utf-8") as file:
-        file.write(target_refactored_code)
-    exe_result = subprocess.run(
-        ["./data/tools/RefactoringMiner-3.0.10/bin/RefactoringMiner", "-spr", original_file_path, original_refactored_code_path_after,
-         target_file_path, target_refactored_code_path_after, refactoring_type], capture_output=True, text=True)
+    with ScratchSpace() as scratch:
+        original_refactored_code_path_after = scratch.write("original_refactored_code.txt", original_refactored_code)
+        target_refactored_code_path_after = scratch.write("target_refactored_code.txt", target_refactored_code)
+        exe_result = run_refactoring_miner(
+            ["-spr", original_file_path, original_refactored_code_path_after,
+             target_file_path, target_refactored_code_path_after, refactoring_type])
     refactoring_result = exe_result.stdout
     last_line = refactoring_result.strip().split('\n')[-1]
     result_word = [word for word in last_line.split()]
@@ -353,35 +359,35 @@ def get_project_structure_info(refactoring_id: str = "") -> list:
     print("call get_project_structure_info, refactoring_id:", refactoring_id)
     if refactoring_id == "":
         return "Please provide the refactoring_id parameter."
-    for refactoring in data:
-        if refactoring['uniqueId'] == refactoring_id:
-            file_path_before = refactoring['filePathBefore']
-            return get_project_structure(project_path, refactoring['commitId'], file_path_before)
+    refactoring = data.get(refactoring_id)
+    if refactoring is not None:
+        file_path_before = refactoring['filePathBefore']
+        return get_project_structure(project_path, refactoring['commitId'], file_path_before)
 
 @tool
 def get_class_content_by_refactoring_id(refactoring_id: str) -> str:
     """Get the class content by refactoring ID."""
     print("call get_class_content_by_refactoring_id, refactoring_id: ", refactoring_id)
-    for refactoring in data:
-        if refactoring['uniqueId'] == refactoring_id:
-            return refactoring['sourceCodeBeforeForWhole']
+    refactoring = data.get(refactoring_id)
+    if refactoring is not None:
+        return refactoring['sourceCodeBeforeForWhole']
 
 @tool
 def get_java_file_content(refactoring_id: str, file_path: str) -> str:
     """This is for move operation to check the target file's content. Get the Java file content by refactoring ID and absolute file path."""
     print("call get_java_file_content, refactoring_id: ", refactoring_id, "file_path: ", file_path)
-    for refactoring in data:
-        if refactoring['uniqueId'] == refactoring_id:
-            file_path = project_path + "/" + file_path
-            return read_java_file_content_in_commit(project_path, refactoring['commitId'], file_path)
+    refactoring = data.get(refactoring_id)
+    if refactoring is not None:
+        file_path = project_path + "/" + file_path
+        return read_java_file_content_in_commit(project_path, refactoring['commitId'], file_path)
 
 @tool
 def get_refactoring_operation_by_refactoring_id(refactoring_id: str) -> str:
     """Get the refactoring operation by refactoring ID."""
     print("call get_refactoring_operation_by_refactoring_id, refactoring_id: ", refactoring_id)
-    for refactoring in data:
-        if refactoring['uniqueId'] == refactoring_id:
-            return refactoring['type']
+    refactoring = data.get(refactoring_id)
+    if refactoring is not None:
+        return refactoring['type']
 
 def check_packages_and_imports(refactored_class_code):
     lines = refactored_class_code.split("\n")
@@ -413,21 +419,21 @@ def check_compile_result(refactoring_id: str, refactored_class_code: str, target
         COMPILE_RESULT = False
         ERROR_LOG = "False, Please provide the package and import statements in the refactored code."
         return "False, Please provide the package and import statements in the refactored code." + refactoring_log
-    for refactoring in data:
-        if refactoring['uniqueId'] == refactoring_id:
-            if refactoring['type'] == "Move Method" or refactoring['type'] == "Move And Rename Method" or refactoring['type'] == "Move And Inline Method":
-                return check_move_method_compile_result(refactoring, refactored_class_code, target_file_path) + refactoring_log
-            file_path = project_path + "/" + refactoring['filePathBefore']
-            java_version = refactoring['compileJDK']
-            compile_result, log = get_compile_result_in_commit(project_path, refactoring['commitId'], file_path, refactored_class_code, java_version)
-            if compile_result:
-                COMPILE_RESULT = True
-                ERROR_LOG = ""
-                return "The refactored code compiles successfully." + refactoring_log
-            else:
-                COMPILE_RESULT = False
-                ERROR_LOG = log
-                return f"The refactored code does not compile successfully. The error log is as follows: {log}" + refactoring_log
+    refactoring = data.get(refactoring_id)
+    if refactoring is not None:
+        if refactoring['type'] == "Move Method" or refactoring['type'] == "Move And Rename Method" or refactoring['type'] == "Move And Inline Method":
+            return check_move_method_compile_result(refactoring, refactored_class_code, target_file_path) + refactoring_log
+        file_path = project_path + "/" + refactoring['filePathBefore']
+        java_version = refactoring['compileJDK']
+        compile_result, log = get_compile_result_in_commit(project_path, refactoring['commitId'], file_path, refactored_class_code, java_version, incremental_compile)
+        if compile_result:
+            COMPILE_RESULT = True
+            ERROR_LOG = ""
+            return "The refactored code compiles successfully." + refactoring_log
+        else:
+            COMPILE_RESULT = False
+            ERROR_LOG = log
+            return f"The refactored code does not compile successfully. The error log is as follows: {log}" + refactoring_log
     COMPILE_RESULT = False
     ERROR_LOG = "cannot find the refactoring id"
     return "cannot find the refactoring id" + refactoring_log
@@ -458,39 +464,92 @@ def check_move_method_compile_result(refactoring, refactored_class_code, target_
         return f"The refactored code does not compile successfully. The error log is as follows: {log}"
 
 def get_historical_refactorings(search_text, refactoring_map, bm25_model, refactoring_type):
-    # get embedding search result
-    embedding_result = search_chroma(search_text, n_results=10, collection_name='refactoring_miner_em_wc_context_agent_collection', refactoring_type=refactoring_type)
-    embedding_document = embedding_result['documents'][0]
-    # get BM25 search result
-    bm25_document = bm25_model.search(search_text, top_n=10)
-    # reciprocal rank fusion
-    ranked_lists = [embedding_document, bm25_document]
-    rrf = ReciprocalRankFusion(k=60)
-
-    scores = rrf.fuse(ranked_lists)
-
-    # Get the top 10 documents
-    top_docs = rrf.get_top_n(scores, n=10)
-
-    top_docs_text = [doc[0] for doc in top_docs]
-    # Reranking the top 10 documents
-    reranker = Reranking("colbert")
-    query = search_text
-    ranked_results = reranker.rerank(query, top_docs_text)
-    top_ranked_result = ranked_results.top_k(3)
-    metadata_refactoring = []
-    for result in top_ranked_result:
-        metadata_refactoring.append(refactoring_map[result.document.text])
-    search_result = "\n".join([
-        f"Example {i + 1}:\n Refactoring Description:\n {example['description']}\n SourceCodeBeforeRefactoring:\n {example['sourceCodeBeforeRefactoring']}\n filePathBefore:\n {example['filePathBefore']}\n SourceCodeAfterRefactoring:\n {example['sourceCodeAfterRefactoring']}"
-        for i, example in enumerate(metadata_refactoring)
-    ])
-    return search_result
+    return get_historical_refactorings_batch([search_text], refactoring_map, bm25_model, refactoring_type)[0]
+
+def get_historical_refactorings_batch(search_texts, refactoring_map, bm25_model, refactoring_type):
+    # results of earlier runs are reused as long as neither the collection nor the BM25 index changed
+    index_version = hybrid_retriever.get_index_version(bm25_model, refactoring_type)
+    cache_keys = [RetrievalCache.make_key(search_text, refactoring_type, 3, f"colbert|{index_version}")
+                  for search_text in search_texts]
+    example_ids = retrieval_cache.get_many(cache_keys) if index_version is not None else {}
+    missing = [i for i, cache_key in enumerate(cache_keys) if cache_key not in example_ids]
+    if missing:
+        missing_texts = [search_texts[i] for i in missing]
+        # embedding and BM25 search run concurrently for all queries, then reciprocal rank fusion of the top 10 documents
+        # ids the text-keyed map file lost (records with the same document text) are skipped before the
+        # fused list is cut to the top 10, so the reranker still gets 10 candidates
+        top_docs_list, failed_legs = hybrid_retriever.retrieve_batch(missing_texts, bm25_model, refactoring_type,
+                                                                     doc_filter=refactoring_map.__contains__)
+
+        # documents are carried by uniqueId, only the top 10 are turned back into text for the reranker
+        top_doc_ids_list = [[doc[0] for doc in top_docs] for top_docs in top_docs_list]
+        new_example_ids = {cache_keys[i]: [] for i, top_doc_ids in zip(missing, top_doc_ids_list) if not top_doc_ids}
+        reranked = [position for position, top_doc_ids in enumerate(top_doc_ids_list) if top_doc_ids]
+        if reranked:
+            top_docs_text_list = [[RefactoringRepository.document_text(refactoring_map[doc_id])
+                                   for doc_id in top_doc_ids_list[position]] for position in reranked]
+            # Reranking the top 10 documents
+            reranker = Reranking.get_shared("colbert")
+            ranked_results_list = reranker.rerank_batch([missing_texts[position] for position in reranked],
+                                                        top_docs_text_list,
+                                                        [top_doc_ids_list[position] for position in reranked])
+            for position, ranked_results in zip(reranked, ranked_results_list):
+                top_ranked_result = ranked_results.top_k(3)
+                new_example_ids[cache_keys[missing[position]]] = [result.document.doc_id for result in top_ranked_result]
+        # results fused from a single leg are not what the index would answer next time
+        if index_version is not None and not failed_legs:
+            retrieval_cache.put_many(new_example_ids)
+        example_ids.update(new_example_ids)
+
+    search_results = []
+    for cache_key in cache_keys:
+        metadata_refactoring = []
+        for doc_id in example_ids[cache_key]:
+            example = refactoring_map.get(doc_id)
+            if example is not None:
+                metadata_refactoring.append(example)
+        search_result = "\n".join([
+            f"Example {i + 1}:\n Refactoring Description:\n {example['description']}\n SourceCodeBeforeRefactoring:\n {example['sourceCodeBeforeRefactoring']}\n filePathBefore:\n {example['filePathBefore']}\n SourceCodeAfterRefactoring:\n {example['sourceCodeAfterRefactoring']}"
+            for i, example in enumerate(metadata_refactoring)
+        ])
+        search_results.append(search_result)
+    return search_results
+
+def precompute_similar_refactorings(refactoring_ids, max_workers=8):
+    """
+    Retrieves the similar refactorings of many refactorings up front, one batch per refactoring type,
+    so get_similar_refactoring answers from SIMILAR_REFACTORINGS while the agents run. The results are
+    keyed by the type the agents see: Extract And Move Method runs as Extract Method first (see
+    handle_extract_and_move_method), and the skipped types are left out. The context descriptions used
+    as queries are generated concurrently, max_workers LLM requests at a time.
+    """
+    ids_by_type = {}
+    for refactoring_id in refactoring_ids:
+        refactoring = get_refactoring(refactoring_id)
+        if refactoring is None or refactoring['type'] in SKIPPED_REFACTORING_TYPES:
+            continue
+        refactoring_type = "Extract Method" if refactoring['type'] == "Extract And Move Method" else refactoring['type']
+        ids_by_type.setdefault(refactoring_type, []).append(refactoring_id)
+    bm25_models = {}
+    for refactoring_type in ids_by_type:
+        try:
+            bm25_models[refactoring_type] = load_bm25_index(refactoring_type)
+        except FileNotFoundError as e:
+            print(f"{e}, skip precomputing its similar refactorings.")
+    type_refactoring_ids = {refactoring_type: ids_by_type[refactoring_type] for refactoring_type in bm25_models}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        search_texts = {refactoring_type: list(executor.map(get_context_description, map(get_refactoring, ids)))
+                        for refactoring_type, ids in type_refactoring_ids.items()}
+    for refactoring_type, ids in type_refactoring_ids.items():
+        search_results = get_historical_refactorings_batch(search_texts[refactoring_type], refactoring_map,
+                                                           bm25_models[refactoring_type], refactoring_type)
+        for refactoring_id, search_result in zip(ids, search_results):
+            SIMILAR_REFACTORINGS[(refactoring_id, refactoring_type)] = search_result
 
 def get_refactoring_type(refactoring_id):
-    for refactoring in data:
-        if refactoring['uniqueId'] == refactoring_id:
-            return refactoring['type']
+    refactoring = data.get(refactoring_id)
+    if refactoring is not None:
+        return refactoring['type']
 
 refactoring_tools = [get_refactoring_operation_by_refactoring_id, get_project_structure_info, get_class_content_by_refactoring_id, get_java_file_content, get_class_signature_by_refactoring_id, get_package_name_by_refactoring_id, get_similar_refactoring, get_call_graph_by_refactoring_id, get_class_name_by_refactoring_id, get_methods_to_be_refactored_by_refactoring_id]
 reviewer_tools = [check_compile_result, check_refactoring_result, check_java_style]
@@ -703,14 +762,14 @@ def add_result_to_refactoring(refactoring_id, answers):
     global REFACTORED_CODE
     global REFACTORING_RESULT
     global COMPILE_RESULT
-    for refactoring in data:
-        if refactoring['uniqueId'] == refactoring_id:
-            answers_track = [answers[i]["messages"][0].content for i in range(len(answers))]
-            refactoring['agentChatLog'] = answers_track
-            refactoring['refactoringMinerResult'] = REFACTORING_RESULT
-            refactoring['agentRefactoredCode'] = REFACTORED_CODE
-            refactoring['compileAndTestResult'] = COMPILE_RESULT
-            return refactoring
+    refactoring = data.get(refactoring_id)
+    if refactoring is not None:
+        answers_track = [answers[i]["messages"][0].content for i in range(len(answers))]
+        refactoring['agentChatLog'] = answers_track
+        refactoring['refactoringMinerResult'] = REFACTORING_RESULT
+        refactoring['agentRefactoredCode'] = REFACTORED_CODE
+        refactoring['compileAndTestResult'] = COMPILE_RESULT
+        return refactoring
 
 def refactor_code(refactoring_id, prompt2):
     answers = []
@@ -768,15 +827,13 @@ def perform_repair(refactoring_for_repair):
     return refactoring_for_repair
 
 def set_refactoring_type(refactoring_id, refactoring_type):
-    for refactoring in data:
-        if refactoring['uniqueId'] == refactoring_id:
-            # 1. first perform extract method refactoring
-            refactoring['type'] = refactoring_type
+    refactoring = data.get(refactoring_id)
+    if refactoring is not None:
+        # 1. first perform extract method refactoring
+        refactoring['type'] = refactoring_type
 
 def get_refactoring(refactoring_id):
-    for refactoring in data:
-        if refactoring['uniqueId'] == refactoring_id:
-            return refactoring
+    return data.get(refactoring_id)
 
 def get_after_move_refactoring(refactoring_id, refactoring_result, refactoring_code):
     # global EXTRACT_METHOD
@@ -787,7 +844,7 @@ def get_after_move_refactoring(refactoring_id, refactoring_result, refactoring_c
     refactoring_for_move['uniqueId'] = refactoring_id + "_move"
     refactoring_for_move['sourceCodeBeforeRefactoring'] = refactoring_result['extractMethodCode']
     refactoring_for_move['methodNameBefore'] = ""
-    data.append(refactoring_for_move)
+    data.add(refactoring_for_move)
     prompt2 = f"{file_contents.format(refactoring_id=refactoring_for_move['uniqueId'])}"
     refactoring_result_after_move = refactor_code(refactoring_for_move['uniqueId'], prompt2)
     return refactoring_result_after_move
@@ -817,7 +874,7 @@ def handle_extract_and_move_method(refactoring_id):
 
 if __name__ == "__main__":
 
-    connection = chroma_client.get_or_create_collection(name='refactoring_miner_em_wc_context_agent_collection')
+    connection = get_collection('refactoring_miner_em_wc_context_agent_collection')
     if connection.count() == 0:
         print("add documents to chroma")
         add_documents_to_chroma('refactoring_miner_em_wc_context_agent_collection',
@@ -830,8 +887,12 @@ if __name__ == "__main__":
         print ("document count: ")
         print(connection.count())
 
+    # load the ColBERT weights once, before the first agent asks for similar refactorings
+    Reranking.get_shared("colbert").warm_up()
 
     refactoring_ids = get_refactoring_ids_from_json()
+    # batch the retrieval of every refactoring before the agents start
+    precompute_similar_refactorings(refactoring_ids)
     refactoring_result_list = []
     for refactoring_id in tqdm(refactoring_ids):
         REFACTORING_ID = refactoring_id
@@ -839,7 +900,7 @@ if __name__ == "__main__":
         COMPILE_RESULT = False
         prompt2 = f"{file_contents.format(refactoring_id=refactoring_id)}"
         refactoring_type = get_refactoring_type(refactoring_id)
-        if refactoring_type == "Pull Up Method" or refactoring_type == "Push Down Method":
+        if refactoring_type in SKIPPED_REFACTORING_TYPES:
             print(f"Refactoring {refactoring_id} is Pull Up Method or Push Down Method, skip.")
             continue
         if refactoring_type == "Extract Method":
@@ -3,6 +3,8 @@ import subprocess
 
 import git
 
+from utils.git_file_index import get_file_index
+
 
 def run_command(command):
     """运行系统命令并捕获输出"""
@@ -126,14 +128,13 @@ def checkout_previous_commit(commit_id, project_dir):
 
 def get_project_structure(repo_path, commit_hash, file_path_before):
     """
-    Main function to reset, checkout a commit, and return the project structure with .java files.
+    Return the .java files of the previous commit of commit_hash that are under the first three
+    components of file_path_before, looked up in the file index of that commit (nothing is checked out).
     """
     try:
-        checkout_previous_commit(commit_hash, repo_path)
-        # Get project structure with .java files only
-        structure_list = get_project_structure_with_java_files(repo_path, "", file_path_before)
-
-        return structure_list
+        file_name_list = file_path_before.split("/")
+        parent_file_name = file_name_list[0] + "/" + file_name_list[1] + "/" + file_name_list[2]
+        return get_file_index(repo_path, f"{commit_hash}^").files_under(parent_file_name + "/", ".java")
     except Exception as e:
         return f"Error: {e}"
 
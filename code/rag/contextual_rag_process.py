@@ -1,5 +1,10 @@
+import hashlib
 import json
 import os
+import sqlite3
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
 import yaml
 from langchain_core.messages import HumanMessage
@@ -97,9 +102,7 @@ def process_commits(file_path, prompt_file_path, output_file_path, limit=None):
     save_json(output_file_path, data)
     print(f"Processed {count} refactorings.")
 
-def get_context_description(refactoring):
-    prompt_file_path = f'{project_prefix_path}/data/prompts/context_refactoring_prompt.txt'
-    prompt_template = load_prompt_template(prompt_file_path)
+def build_context_prompt(refactoring, prompt_template):
     context_description = generate_context_description(refactoring)
     source_code_content = refactoring.get('sourceCodeBeforeRefactoring', '')
     prompt = PromptTemplate(
@@ -109,13 +112,93 @@ def get_context_description(refactoring):
     print(f"Context Description:\n{context_description}\n")
 
     # Generate the final prompt
-    final_prompt = prompt.format(
+    return prompt.format(
         WHOLE_CONTEXT=context_description.strip(),
         SOURCE_CODE=source_code_content.strip(),
     )
 
+
+class ContextDescriptionCache:
+    def __init__(self, cache_path):
+        """
+        Persistent store of LLM-generated context descriptions, keyed by a hash of the model and the rendered
+        prompt, so a description is generated once per prompt. Records derived at run time (e.g. the '_move'
+        records of Extract And Move Method) reuse a uniqueId with different code, so the id is only kept for
+        reference and never used for lookups.
+
+        Parameters:
+            cache_path (str): Path of the SQLite cache file.
+        """
+        os.makedirs(os.path.dirname(os.path.abspath(cache_path)), exist_ok=True)
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(cache_path, check_same_thread=False, timeout=60)
+        self.connection.execute("CREATE TABLE IF NOT EXISTS prompt_context_descriptions "
+                                "(prompt_hash TEXT PRIMARY KEY, unique_id TEXT, description TEXT NOT NULL)")
+        self.connection.commit()
+
+    def get(self, prompt_hash):
+        with self.lock:
+            row = self.connection.execute("SELECT description FROM prompt_context_descriptions "
+                                          "WHERE prompt_hash = ?", (prompt_hash,)).fetchone()
+        return row[0] if row else None
+
+    def put(self, prompt_hash, description, unique_id=None):
+        with self.lock:
+            self.connection.execute("INSERT OR REPLACE INTO prompt_context_descriptions "
+                                    "(prompt_hash, unique_id, description) VALUES (?, ?, ?)",
+                                    (prompt_hash, unique_id, description))
+            self.connection.commit()
+
+
+context_description_cache = ContextDescriptionCache(f'{project_prefix_path}/data/cache/context_descriptions.sqlite')
+
+
+def get_prompt_hash(final_prompt):
+    """Hash of the rendered prompt and the model name; a change to either invalidates the cached description."""
+    return hashlib.sha256(f"{llm.model_name}\0{final_prompt}".encode('utf-8')).hexdigest()
+
+
+def get_context_description(refactoring):
+    """
+    Returns the context description used as retrieval query for a refactoring. It is generated by the LLM
+    on the first request and then served from the cache, so retrieval makes no LLM call on a warm cache.
+    """
+    prompt_file_path = f'{project_prefix_path}/data/prompts/context_refactoring_prompt.txt'
+    prompt_template = load_prompt_template(prompt_file_path)
+    final_prompt = build_context_prompt(refactoring, prompt_template)
+    prompt_hash = get_prompt_hash(final_prompt)
+    cached_description = context_description_cache.get(prompt_hash)
+    if cached_description is not None:
+        return cached_description
+
     print(final_prompt)
     # Call the LLM to generate the refactored code
     messages = [HumanMessage(content=final_prompt)]
     result = llm.invoke(messages).content
-    return result
\ No newline at end of file
+    context_description_cache.put(prompt_hash, result, refactoring.get('uniqueId'))
+    return result
+
+
+def precompute_context_descriptions(file_path, max_workers=8):
+    """
+    Fills the context description cache for every refactoring of an evaluation data file, so the agents
+    never wait on the LLM to build their retrieval queries.
+
+    Parameters:
+        file_path (str): Path to the evaluation data JSON file (a list of refactorings).
+        max_workers (int): Number of concurrent LLM requests (default is 8).
+    """
+    refactorings = load_json(file_path)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        list(executor.map(get_context_description, refactorings))
+    print(f"Context descriptions ready for {len(refactorings)} refactorings.")
+
+
+if __name__ == "__main__":
+    # usage: python -m rag.contextual_rag_process [evaluation_data.json]
+    if len(sys.argv) > 1:
+        evaluation_file_path = sys.argv[1]
+    else:
+        project_name = config['project_name']
+        evaluation_file_path = f'{project_prefix_path}/data/{project_name}/{project_name}_evaluation_data.json'
+    precompute_context_descriptions(evaluation_file_path)
@@ -0,0 +1,114 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+# Maximum number of embeddings kept by an EmbeddingCache before the least recently used ones are dropped.
+EMBEDDING_CACHE_SIZE = 200000
+
+
+class EmbeddingCache:
+    def __init__(self, embedding_function, model_id: str, cache_path: str, max_entries: int = EMBEDDING_CACHE_SIZE):
+        """
+        Wraps an embedding function with a persistent cache keyed by a hash of (model id, text), so a
+        document or query text is only embedded once. Vectors are stored as float16 blobs in a SQLite
+        file, and the least recently used entries are evicted beyond max_entries. It can be passed
+        wherever a Chroma embedding function is expected.
+
+        Parameters:
+            embedding_function (callable): The embedding function to cache, e.g. DefaultEmbeddingFunction().
+            model_id (str): Identifies the embedding model; part of every cache key.
+            cache_path (str): Path of the SQLite cache file.
+            max_entries (int): Maximum number of cached embeddings (default is EMBEDDING_CACHE_SIZE).
+        """
+        self.embedding_function = embedding_function
+        self.model_id = model_id
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(os.path.dirname(os.path.abspath(cache_path)), exist_ok=True)
+        self.connection = sqlite3.connect(cache_path, check_same_thread=False, timeout=60)
+        self.connection.execute("CREATE TABLE IF NOT EXISTS embeddings "
+                                "(key TEXT PRIMARY KEY, vector BLOB NOT NULL, last_used REAL NOT NULL)")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)")
+        self.connection.commit()
+
+    def key(self, text: str) -> str:
+        """The cache key of a text: the SHA-256 of the model id and the text."""
+        return hashlib.sha256(f"{self.model_id}\0{text}".encode("utf-8")).hexdigest()
+
+    def __call__(self, input):
+        """
+        Embeds a list of texts, calling the wrapped embedding function only for texts not in the cache.
+
+        Parameters:
+            input (List[str]): The texts to embed.
+
+        Returns:
+            List[np.ndarray]: One float32 embedding per text, in input order.
+        """
+        keys = [self.key(text) for text in input]
+        vectors = self.get_many(set(keys))
+        missing = {}
+        for key, text in zip(keys, input):
+            if key not in vectors:
+                # embed every missing text once, even if it occurs several times in the input
+                missing.setdefault(key, text)
+        with self.lock:
+            # the ingestion thread pool embeds several batches at once
+            self.hits += len(keys) - sum(key in missing for key in keys)
+            self.misses += len(missing)
+        if missing:
+            embedded = self.embedding_function(list(missing.values()))
+            new_vectors = {key: np.asarray(vector, dtype=np.float16) for key, vector in zip(missing, embedded)}
+            self._store(new_vectors)
+            vectors.update(new_vectors)
+        return [vectors[key].astype(np.float32) for key in keys]
+
+    def get_many(self, keys) -> dict:
+        """
+        Returns the cached float16 vectors of the given keys (key -> vector) and marks them as recently
+        used, with one UPDATE per 500 keys and a single commit for the whole lookup.
+        """
+        keys = list(keys)
+        found = []
+        with self.lock:
+            # stay below SQLite's default limit of bound parameters
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                found.extend(self.connection.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", chunk).fetchall())
+            if found:
+                now = time.time()
+                found_keys = [key for key, _ in found]
+                for start in range(0, len(found_keys), 500):
+                    chunk = found_keys[start:start + 500]
+                    placeholders = ",".join("?" * len(chunk))
+                    self.connection.execute(f"UPDATE embeddings SET last_used = ? WHERE key IN ({placeholders})",
+                                            [now, *chunk])
+                self.connection.commit()
+        return {key: np.frombuffer(blob, dtype=np.float16) for key, blob in found}
+
+    def _store(self, vectors):
+        """Inserts new embeddings and evicts the least recently used ones beyond max_entries."""
+        now = time.time()
+        with self.lock:
+            self.connection.executemany("INSERT OR REPLACE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)",
+                                        [(key, vector.tobytes(), now) for key, vector in vectors.items()])
+            count = self.connection.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            if count > self.max_entries:
+                self.connection.execute("DELETE FROM embeddings WHERE key IN "
+                                        "(SELECT key FROM embeddings ORDER BY last_used LIMIT ?)",
+                                        (count - self.max_entries,))
+            self.connection.commit()
+
+    def stats(self) -> dict:
+        """Hit/miss counters of this process and the number of cached embeddings."""
+        with self.lock:
+            entries = self.connection.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        return {"hits": self.hits, "misses": self.misses, "entries": entries}
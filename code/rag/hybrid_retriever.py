@@ -0,0 +1,114 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+from rag.rag_embedding import get_collection_version, search_chroma_batch
+from rag.reciprocal_rank_fusion import ReciprocalRankFusion
+
+
+class HybridRetriever:
+    def __init__(self, collection_name, n_results=10, rrf_k=60, vector_timeout=30.0, bm25_timeout=30.0,
+                 max_workers=4):
+        """
+        Hybrid retriever that runs the vector search and the BM25 search concurrently and fuses
+        both rankings with Reciprocal Rank Fusion, so a query costs about as much as the slower leg.
+        Documents are identified by id throughout; the BM25 indexes must be built with doc_ids.
+
+        Parameters:
+            collection_name (str): Name of the vector store collection.
+            n_results (int): Number of documents taken from each leg and returned after fusion (default is 10).
+            rrf_k (int): The RRF constant (default is 60).
+            vector_timeout (float): Seconds to wait for the vector leg, None to wait forever (default is 30).
+            bm25_timeout (float): Seconds to wait for the BM25 leg, None to wait forever (default is 30).
+            max_workers (int): Size of the thread pool shared by all queries (default is 4).
+        """
+        self.collection_name = collection_name
+        self.n_results = n_results
+        self.rrf = ReciprocalRankFusion(k=rrf_k)
+        self.vector_timeout = vector_timeout
+        self.bm25_timeout = bm25_timeout
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+
+    def _vector_search(self, search_texts, refactoring_type):
+        embedding_result = search_chroma_batch(search_texts, n_results=self.n_results,
+                                               collection_name=self.collection_name, refactoring_type=refactoring_type)
+        return embedding_result['ids']
+
+    def get_index_version(self, bm25_model, refactoring_type):
+        """
+        Version string of everything a retrieval for this refactoring type depends on: the vector
+        collection, the BM25 index and the fusion parameters. None if the BM25 model was not loaded
+        from a saved index, in which case results should not be cached.
+        """
+        if getattr(bm25_model, 'index_version', None) is None:
+            return None
+        collection_version = get_collection_version(self.collection_name, refactoring_type)
+        return f"{self.collection_name}:{collection_version}|bm25:{bm25_model.index_version}|rrf:{self.rrf.k}:{self.n_results}"
+
+    def retrieve(self, search_text, bm25_model, refactoring_type, doc_filter=None):
+        """
+        Retrieves the fused top documents for a query. Both legs return document ids (the refactoring
+        uniqueIds), so fusion never hashes the document text.
+
+        Parameters:
+            search_text (str): The query text.
+            bm25_model (BM25): The BM25 index of the refactoring type.
+            refactoring_type (str): The refactoring type, used to filter the vector search.
+            doc_filter (callable, optional): Keeps only the document ids it returns True for.
+
+        Returns:
+            list: The top documents as (document id, score) tuples sorted by RRF score.
+        """
+        results, _ = self.retrieve_batch([search_text], bm25_model, refactoring_type, doc_filter=doc_filter)
+        return results[0]
+
+    def retrieve_batch(self, search_texts, bm25_model, refactoring_type, doc_filter=None):
+        """
+        Retrieves the fused top documents for several queries of the same refactoring type. The vector
+        leg embeds and queries all texts at once and the BM25 leg scores them with one sparse matrix product.
+        A leg that times out or fails is left out of the fusion and reported, so callers can avoid
+        caching results that only one leg contributed to.
+
+        Parameters:
+            search_texts (list): The query texts.
+            bm25_model (BM25): The BM25 index of the refactoring type.
+            refactoring_type (str): The refactoring type, used to filter the vector search.
+            doc_filter (callable, optional): Keeps only the document ids it returns True for. The fused
+                documents are filtered before they are cut to n_results, so up to n_results remain.
+
+        Returns:
+            tuple: For each query, the top documents as (document id, score) tuples sorted by RRF score,
+                and the names of the legs ("vector", "bm25") that timed out or failed.
+        """
+        if not search_texts:
+            return [], []
+        if getattr(bm25_model, 'doc_ids', None) is None:
+            # without ids the BM25 leg would fail on every query and only the vector leg would be fused
+            raise ValueError(f"The BM25 index of {refactoring_type} has no document ids, rebuild or convert it")
+        start = time.monotonic()
+        legs = [
+            ("vector", self.vector_timeout, self.executor.submit(self._vector_search, search_texts, refactoring_type)),
+            ("bm25", self.bm25_timeout, self.executor.submit(bm25_model.search_ids_batch, search_texts,
+                                                             top_n=self.n_results)),
+        ]
+        scores = [{} for _ in search_texts]
+        failures = []
+        # fuse the legs in a fixed order so ties are broken the same way on every run
+        for name, timeout, future in legs:
+            remaining = None if timeout is None else max(0.0, start + timeout - time.monotonic())
+            try:
+                for query_scores, ranked_list in zip(scores, future.result(timeout=remaining)):
+                    self.rrf.update(query_scores, ranked_list)
+            except TimeoutError:
+                print(f"{name} search timed out after {timeout}s, fusing the remaining results only")
+                failures.append(name)
+            except Exception as e:
+                print(f"{name} search failed: {e}")
+                failures.append(name)
+                if len(failures) == len(legs):
+                    raise
+        if len(failures) == len(legs):
+            raise TimeoutError(f"hybrid search timed out for {len(search_texts)} queries")
+        if doc_filter is not None:
+            scores = [{doc_id: score for doc_id, score in query_scores.items() if doc_filter(doc_id)}
+                      for query_scores in scores]
+        return [self.rrf.get_top_n(query_scores, n=self.n_results) for query_scores in scores], failures
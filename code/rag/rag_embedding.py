@@ -1,7 +1,9 @@
 import json
 import os
 import re
-from collections import defaultdict
+import time
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
 
 import yaml
 from tqdm import tqdm
@@ -9,6 +11,8 @@ from tqdm import tqdm
 import chromadb
 
 from bm25 import BM25
+from rag.embedding_cache import EmbeddingCache
+from rag.vector_store import LocalVectorCollection
 
 
 current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -16,10 +20,13 @@ config_path = os.path.join(current_dir, '..', 'config.yaml')
 config_path = os.path.abspath(config_path)
 with open(config_path, 'r') as file:
     config = yaml.safe_load(file)
-# OpenAI API key
-chromadb_host = config['chromadb_host']
+# vector store backend: "local" (in-process, persisted under vector_store_path) or "chroma" (chromadb server)
+vector_store = config.get('vector_store', 'chroma')
+vector_store_path = config.get('vector_store_path', os.path.join(current_dir, '..', 'data', 'vector_store'))
+chromadb_host = config.get('chromadb_host', 'localhost')
+embedding_cache_path = config.get('embedding_cache_path',
+                                  os.path.join(current_dir, '..', 'data', 'embedding_cache', 'embeddings.sqlite'))
 
-chroma_client = chromadb.HttpClient(host=chromadb_host, port=8000)
 from chromadb.utils import embedding_functions
 
 
@@ -33,82 +40,256 @@ def remove_java_comments(java_code):
 
 # Create a new collection
 default_ef = embedding_functions.DefaultEmbeddingFunction();
+# documents and queries are embedded through the cache, so unchanged texts are never embedded twice
+cached_ef = EmbeddingCache(default_ef, 'all-MiniLM-L6-v2', embedding_cache_path)
 # chroma_client.delete_collection(name="refactoring_collection")
 
+_chroma_client = None
+_collections = {}
 
 
-def add_documents_to_chroma(collection_name, file_path, num_count):
-    collection = chroma_client.get_or_create_collection(name=collection_name)
-    # create a new collection
+def get_collection(collection_name):
+    """
+    Returns the collection for the configured vector store backend, creating it if needed.
+    Both backends expose the same count/add/upsert/query calls.
+    """
+    global _chroma_client
+    if collection_name in _collections:
+        return _collections[collection_name]
+    if vector_store == 'local':
+        collection = LocalVectorCollection(os.path.join(vector_store_path, collection_name), cached_ef)
+    elif vector_store == 'chroma':
+        if _chroma_client is None:
+            _chroma_client = chromadb.HttpClient(host=chromadb_host, port=8000)
+        collection = _chroma_client.get_or_create_collection(name=collection_name, embedding_function=cached_ef)
+    else:
+        raise ValueError(f"Unknown vector_store backend in config.yaml: {vector_store}")
+    _collections[collection_name] = collection
+    return collection
+
+
+def iter_commits(file_path, chunk_size=1 << 20):
+    """
+    Streams the elements of the top-level "commits" array of a RefactoringMiner JSON file one at a time,
+    so the whole file is never held in memory.
+    """
+    decoder = json.JSONDecoder()
     with open(file_path, 'r') as file:
-        data = json.load(file)
-    documents = []
-    metadata_refactoring = []
-    ids = []
+        buffer = ''
+        position = -1
+        # find the start of the commits array
+        while position < 0:
+            chunk = file.read(chunk_size)
+            if not chunk:
+                return
+            buffer += chunk
+            match = re.search(r'"commits"\s*:\s*\[', buffer)
+            if match:
+                position = match.end()
+        while True:
+            # skip separators between two commits
+            while True:
+                while position < len(buffer) and buffer[position] in ' \t\r\n,':
+                    position += 1
+                if position < len(buffer):
+                    break
+                chunk = file.read(chunk_size)
+                if not chunk:
+                    raise ValueError(f"Unterminated commits array in {file_path}")
+                buffer = chunk
+                position = 0
+            if buffer[position] == ']':
+                return
+            try:
+                commit, end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                # the commit continues in the next chunk
+                chunk = file.read(chunk_size)
+                if not chunk:
+                    raise
+                buffer = buffer[position:] + chunk
+                position = 0
+                continue
+            yield commit
+            buffer = buffer[end:]
+            position = 0
+
+
+def _load_ingest_progress(progress_path, source, collection):
+    """
+    The number of commits stored by the previous ingestion of the same input, 0 if the input changed or
+    the collection holds fewer documents than were stored (e.g. it was deleted or recreated since).
+    """
+    if os.path.exists(progress_path):
+        with open(progress_path, 'r') as file:
+            progress = json.load(file)
+        if progress.get('source') != source:
+            print(f"Input changed since the last ingestion, restarting: {progress_path}")
+        elif progress.get('documents', -1) < 0 or collection.count() < progress['documents']:
+            print(f"The collection does not hold the {progress.get('documents', 'unknown')} documents "
+                  f"of the last ingestion, restarting: {progress_path}")
+        else:
+            return progress['commits_done']
+    return 0
+
+
+def _save_ingest_progress(progress_path, source, commits_done, documents):
+    os.makedirs(os.path.dirname(progress_path), exist_ok=True)
+    tmp_path = progress_path + '.tmp'
+    with open(tmp_path, 'w') as file:
+        json.dump({'source': source, 'commits_done': commits_done, 'documents': documents}, file)
+    os.replace(tmp_path, progress_path)
+
+
+def _ingest_version_path(collection_name):
+    return os.path.join(vector_store_path, 'ingest_versions', f'{collection_name}.json')
+
+
+def _write_ingest_version(collection_name):
+    """Stamps the collection as changed, so cached retrieval results of its previous contents are not reused."""
+    version_path = _ingest_version_path(collection_name)
+    os.makedirs(os.path.dirname(version_path), exist_ok=True)
+    tmp_path = version_path + '.tmp'
+    with open(tmp_path, 'w') as file:
+        json.dump({'stamp': time.time_ns()}, file)
+    os.replace(tmp_path, version_path)
+
+
+def _read_ingest_version(collection_name):
+    version_path = _ingest_version_path(collection_name)
+    if not os.path.exists(version_path):
+        return None
+    with open(version_path, 'r') as file:
+        return json.load(file).get('stamp')
+
+
+def add_documents_to_chroma(collection_name, file_path, num_count, batch_size=64, max_workers=4, resume=True):
+    """
+    Streams the refactorings of a RefactoringMiner JSON file into the collection. Documents are embedded
+    in fixed-size batches on a thread pool and upserted batch by batch. The number of commits already
+    stored is recorded after every batch together with the size of the collection, so an interrupted
+    ingestion resumes where it stopped unless the collection lost documents in the meantime. The local
+    store appends every batch to its partitions as a segment and compacts the segments at the end.
+    The per-type BM25 indexes are written once all commits are processed. The collection's ingest version
+    (see get_collection_version) is stamped when the ingestion starts and again when it ends.
+
+    Parameters:
+        collection_name (str): Name of the collection.
+        file_path (str): Path to the RefactoringMiner JSON file.
+        num_count (int): Maximum number of refactorings to add.
+        batch_size (int): Number of documents embedded and upserted together (default is 64).
+        max_workers (int): Number of batches embedded in parallel (default is 4).
+        resume (bool): Skip the commits stored by a previous, interrupted run if the collection still
+            holds its documents (default is True).
+    """
+    collection = get_collection(collection_name)
+    progress_path = os.path.join(vector_store_path, 'ingest_progress', f'{collection_name}.json')
+    stat = os.stat(file_path)
+    source = {'file_path': os.path.abspath(file_path), 'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size,
+              'num_count': num_count}
+    commits_done = _load_ingest_progress(progress_path, source, collection) if resume else 0
+    if commits_done:
+        print(f"Resuming ingestion after {commits_done} commits")
+
     group_documents = defaultdict(list)
+    group_ids = defaultdict(list)
     unique_ids_set = set()
     count = 0
-    # read the data and add to the collection
-    for commit in tqdm(data['commits']):
-        if "refactoringAnalyses" not in commit:
-            continue
-        if count >= num_count:
-            break
-        for refactoring in commit['refactoringAnalyses']:
-            unique_id = refactoring['uniqueId']
-
-            # check if the uniqueId is already in the set
-            if unique_id not in unique_ids_set and refactoring['isPureRefactoring']:
-                # get the source code before refactoring
-                source_before = remove_java_comments(refactoring['sourceCodeBeforeRefactoring'])
-                context_description = refactoring['contextDescription']
-                refactoring_data_to_store = {
-                    "type": refactoring['type'],
-                    "sourceCodeBeforeRefactoring": refactoring['sourceCodeBeforeRefactoring'],
-                    "filePathBefore": refactoring['filePathBefore'],
-                    "isPureRefactoring": refactoring['isPureRefactoring'],
-                    "commitId": refactoring['commitId'],
-                    "packageNameBefore": refactoring['packageNameBefore'],
-                    "classNameBefore": refactoring['classNameBefore'],
-                    "methodNameBefore": refactoring['methodNameBefore'],
-                    "invokedMethod": "invokedMethod" in refactoring and refactoring['invokedMethod'] or "",
-                    "classSignatureBefore": "classSignatureBefore" in refactoring and refactoring['classSignatureBefore'] or "",
-                    "sourceCodeAfterRefactoring": refactoring['sourceCodeAfterRefactoring'],
-                    "diffSourceCode": refactoring['diffSourceCode'],
-                    "uniqueId": refactoring['uniqueId'],
-                    "contextDescription": refactoring['contextDescription'],
-                }
-                # add the document to the list
-                documents.append(context_description + '\n' + source_before)
-                group_documents[refactoring['type']].append(context_description + '\n' + source_before)
-                metadata_refactoring.append(refactoring_data_to_store)
-                ids.append(unique_id)
-                count += 1
-
-                # add the uniqueId to the set
-                unique_ids_set.add(unique_id)
-            else:
-                if unique_id in unique_ids_set:
-                    print(f"Skipping duplicate uniqueId: {unique_id}")
-
-
-    # add the documents to the collection
-    if documents:
-        collection.add(
+    batch = ([], [], [], 0)
+    pending = deque()
+
+    def embed(batch):
+        documents, metadatas, ids, commits_completed = batch
+        return documents, metadatas, ids, commits_completed, cached_ef(documents)
+
+    def upsert(future):
+        documents, metadatas, ids, commits_completed, embeddings = future.result()
+        collection.upsert(
             documents=documents,
-            metadatas=metadata_refactoring,
+            metadatas=metadatas,
             ids=ids,
+            embeddings=[embedding.tolist() for embedding in embeddings],
         )
+        _save_ingest_progress(progress_path, source, commits_completed, collection.count())
+
+    _write_ingest_version(collection_name)
+    commit_index = 0
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        # read the data and add to the collection
+        for commit_index, commit in enumerate(tqdm(iter_commits(file_path))):
+            if "refactoringAnalyses" not in commit:
+                continue
+            if count >= num_count:
+                break
+            for refactoring in commit['refactoringAnalyses']:
+                unique_id = refactoring['uniqueId']
+
+                # check if the uniqueId is already in the set
+                if unique_id not in unique_ids_set and refactoring['isPureRefactoring']:
+                    # get the source code before refactoring
+                    source_before = remove_java_comments(refactoring['sourceCodeBeforeRefactoring'])
+                    context_description = refactoring['contextDescription']
+                    refactoring_data_to_store = {
+                        "type": refactoring['type'],
+                        "sourceCodeBeforeRefactoring": refactoring['sourceCodeBeforeRefactoring'],
+                        "filePathBefore": refactoring['filePathBefore'],
+                        "isPureRefactoring": refactoring['isPureRefactoring'],
+                        "commitId": refactoring['commitId'],
+                        "packageNameBefore": refactoring['packageNameBefore'],
+                        "classNameBefore": refactoring['classNameBefore'],
+                        "methodNameBefore": refactoring['methodNameBefore'],
+                        "invokedMethod": "invokedMethod" in refactoring and refactoring['invokedMethod'] or "",
+                        "classSignatureBefore": "classSignatureBefore" in refactoring and refactoring['classSignatureBefore'] or "",
+                        "sourceCodeAfterRefactoring": refactoring['sourceCodeAfterRefactoring'],
+                        "diffSourceCode": refactoring['diffSourceCode'],
+                        "uniqueId": refactoring['uniqueId'],
+                        "contextDescription": refactoring['contextDescription'],
+                    }
+                    group_documents[refactoring['type']].append(context_description + '\n' + source_before)
+                    group_ids[refactoring['type']].append(unique_id)
+                    count += 1
+
+                    # add the uniqueId to the set
+                    unique_ids_set.add(unique_id)
+                    if commit_index < commits_done:
+                        # already stored by the interrupted run, only needed for BM25
+                        continue
+                    # add the document to the batch
+                    batch[0].append(context_description + '\n' + source_before)
+                    batch[1].append(refactoring_data_to_store)
+                    batch[2].append(unique_id)
+                    if len(batch[0]) >= batch_size:
+                        # the current commit may continue in the next batch
+                        pending.append(executor.submit(embed, batch[:3] + (commit_index,)))
+                        batch = ([], [], [], 0)
+                else:
+                    if unique_id in unique_ids_set:
+                        print(f"Skipping duplicate uniqueId: {unique_id}")
+            # upsert finished batches in order, so the recorded progress never skips a batch
+            while pending and (pending[0].done() or len(pending) > max_workers):
+                upsert(pending.popleft())
+        else:
+            commit_index += 1
+        if batch[0]:
+            pending.append(executor.submit(embed, batch[:3] + (max(commit_index, commits_done),)))
+        while pending:
+            upsert(pending.popleft())
+    if isinstance(collection, LocalVectorCollection):
+        collection.compact()
+    _write_ingest_version(collection_name)
+
+    if group_documents:
         # add document to bm25
         for key, value in group_documents.items():
-            bm25_model = BM25(value)
-            bm25_model.save_model(f'data/model/{collection_name}_{key}_bm25result.pkl')
+            bm25_model = BM25(value, doc_ids=group_ids[key])
+            bm25_model.save_model(f'data/model/{collection_name}_{key}_bm25index')
     else:
         print("No new unique IDs to add.")
 
+
 def search_chroma(text,n_results,collection_name, refactoring_type):
 
-    collection = chroma_client.get_or_create_collection(name=collection_name)
+    collection = get_collection(collection_name)
     # test the search
     results = collection.query(
         query_texts = [text],  # search query
@@ -120,5 +301,29 @@ def search_chroma(text,n_results,collection_name, refactoring_type):
     return results
 
 
+def get_collection_version(collection_name, refactoring_type):
+    """
+    Version string of the documents a search for this refactoring type sees. The local store reports when
+    the type's partition was last written. A Chroma server does not track changes, so its version is the
+    stamp written by add_documents_to_chroma together with the number of documents.
+    """
+    collection = get_collection(collection_name)
+    if isinstance(collection, LocalVectorCollection):
+        return collection.get_version(where={"type": refactoring_type})
+    return f"ingest-{_read_ingest_version(collection_name)}|count-{collection.count()}"
+
+
+def search_chroma_batch(texts, n_results, collection_name, refactoring_type):
+    """Like search_chroma for several query texts at once: one embedding batch and one collection query."""
+    collection = get_collection(collection_name)
+    return collection.query(
+        query_texts=texts,
+        n_results=n_results,
+        where={
+            "type": refactoring_type
+        }
+    )
+
+
 
 
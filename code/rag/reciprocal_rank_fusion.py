@@ -20,15 +20,31 @@ class ReciprocalRankFusion:
         rrf_scores = {}
 
         for ranked_list in ranked_lists:
-            for rank, doc_id in enumerate(ranked_list):
-                # Compute the reciprocal rank for the document
-                score = 1 / (self.k + rank + 1)
-
-                # Accumulate the score for the document
-                if doc_id in rrf_scores:
-                    rrf_scores[doc_id] += score
-                else:
-                    rrf_scores[doc_id] = score
+            self.update(rrf_scores, ranked_list)
+
+        return rrf_scores
+
+    def update(self, rrf_scores, ranked_list):
+        """
+        Add the RRF contributions of one more ranked list to existing scores, so lists can be
+        fused one at a time as they become available.
+
+        Args:
+            rrf_scores (dict): The scores to update in place.
+            ranked_list (list): A ranked list of document IDs.
+
+        Returns:
+            dict: The updated scores.
+        """
+        for rank, doc_id in enumerate(ranked_list):
+            # Compute the reciprocal rank for the document
+            score = 1 / (self.k + rank + 1)
+
+            # Accumulate the score for the document
+            if doc_id in rrf_scores:
+                rrf_scores[doc_id] += score
+            else:
+                rrf_scores[doc_id] = score
 
         return rrf_scores
 
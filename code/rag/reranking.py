@@ -1,10 +1,19 @@
 import os
-from typing import List, Optional, Any
+import threading
+from typing import List, Optional, Any, Union
 
+import torch
 from rerankers import Reranker
+from rerankers.models.colbert_ranker import ColBERTRanker, _colbert_score
+from rerankers.results import RankedResults, Result
+from rerankers.utils import prep_docs
 
 
 class Reranking:
+    # Process-wide instances created by get_shared, keyed by (model_name, model_type, api_key).
+    _shared_instances = {}
+    _shared_lock = threading.Lock()
+
     def __init__(self, model_name, model_type: Optional[str] = None,
                  api_key: Optional[str] = None):
         """
@@ -23,7 +32,7 @@ class Reranking:
         else:
             self.ranker = Reranker(model_name)
 
-    def rerank(self, query: str, documents: List[str], doc_ids: Optional[List[int]] = None,
+    def rerank(self, query: str, documents: List[str], doc_ids: Optional[List[Union[int, str]]] = None,
                metadata: Optional[List[dict]] = None) -> Any:
         """
         Reranks the given documents based on the query.
@@ -31,12 +40,14 @@ class Reranking:
         Parameters:
             query (str): The query string for reranking.
             documents (List[str]): List of documents to rerank.
-            doc_ids (Optional[List[int]]): List of document IDs (optional).
+            doc_ids (Optional[List[Union[int, str]]]): List of document IDs, e.g. refactoring uniqueIds (optional).
             metadata (Optional[List[dict]]): Metadata for each document (optional).
 
         Returns:
             Any: Ranked results containing the reranked documents.
         """
+        if not documents:
+            return RankedResults(results=[], query=query, has_scores=True)
         # If doc_ids are not provided, generate them
         if doc_ids is None:
             doc_ids = list(range(len(documents)))
@@ -45,6 +56,100 @@ class Reranking:
         results = self.ranker.rank(query, documents, doc_ids=doc_ids, metadata=metadata)
         return results
 
+    def rerank_batch(self, queries: List[str], documents_list: List[List[str]],
+                     doc_ids_list: Optional[List[List[Union[int, str]]]] = None) -> List[Any]:
+        """
+        Reranks the candidate documents of several queries with the same loaded model. With a ColBERT
+        model the documents of all queries are encoded in one model call and every query is scored
+        against its own candidates; other models rank one query at a time. Queries without candidates
+        get empty results without calling the model.
+
+        Parameters:
+            queries (List[str]): The query strings.
+            documents_list (List[List[str]]): The candidate documents of each query.
+            doc_ids_list (Optional[List[List[Union[int, str]]]]): The document IDs of each query (optional).
+
+        Returns:
+            List[Any]: The ranked results of each query, in query order.
+        """
+        if doc_ids_list is None:
+            doc_ids_list = [None] * len(queries)
+        results = [RankedResults(results=[], query=query, has_scores=True) for query in queries]
+        ranked = [position for position, documents in enumerate(documents_list) if documents]
+        if not ranked:
+            return results
+        if isinstance(self.ranker, ColBERTRanker):
+            ranked_results = self._rank_colbert_batch([queries[position] for position in ranked],
+                                                      [documents_list[position] for position in ranked],
+                                                      [doc_ids_list[position] for position in ranked])
+        else:
+            ranked_results = [self.rerank(queries[position], documents_list[position], doc_ids=doc_ids_list[position])
+                              for position in ranked]
+        for position, ranked_result in zip(ranked, ranked_results):
+            results[position] = ranked_result
+        return results
+
+    def _rank_colbert_batch(self, queries, documents_list, doc_ids_list):
+        """
+        ColBERTRanker.rank for several queries: the documents of all queries go through the model as one
+        padded batch (split by the ranker's batch_size), then each query is encoded and scored by MaxSim
+        against its own slice. Queries are encoded one at a time because the ranker pads every query to
+        its own length.
+        """
+        ranker = self.ranker
+        documents = [document for documents in documents_list for document in documents]
+        with torch.no_grad():
+            documents_encoding = ranker._document_encode(documents)
+            document_embeddings = ranker._to_embs(documents_encoding)
+            results = []
+            start = 0
+            for query, query_documents, doc_ids in zip(queries, documents_list, doc_ids_list):
+                end = start + len(query_documents)
+                query_encoding = ranker._query_encode([query])
+                scores = _colbert_score(ranker._to_embs(query_encoding), document_embeddings[start:end],
+                                        query_encoding["attention_mask"],
+                                        documents_encoding["attention_mask"][start:end]).cpu().tolist()[0]
+                start = end
+                docs = prep_docs(query_documents, doc_ids)
+                ranked_docs = sorted(zip(docs, scores), key=lambda pair: pair[1], reverse=True)
+                results.append(RankedResults(results=[Result(document=doc, score=score, rank=rank + 1)
+                                                      for rank, (doc, score) in enumerate(ranked_docs)],
+                                             query=query, has_scores=True))
+        return results
+
+    def warm_up(self):
+        """
+        Runs a tiny rerank so the model weights and tokenizer are fully initialized
+        before the first real query.
+
+        Returns:
+            Reranking: The same instance, to allow chaining.
+        """
+        self.rerank("warm up", ["warm up document"])
+        return self
+
+    @classmethod
+    def get_shared(cls, model_name, model_type: Optional[str] = None,
+                   api_key: Optional[str] = None) -> 'Reranking':
+        """
+        Returns the process-wide Reranking instance for the given model, creating it on first use.
+
+        Parameters:
+            model_name (str): The name of the reranking model (e.g. 'colbert').
+            model_type (Optional[str]): The type of the model, passed through to the constructor.
+            api_key (Optional[str]): API key for models requiring authentication.
+
+        Returns:
+            Reranking: The shared instance for this model.
+        """
+        key = (model_name, model_type, api_key)
+        with cls._shared_lock:
+            instance = cls._shared_instances.get(key)
+            if instance is None:
+                instance = cls(model_name, model_type=model_type, api_key=api_key)
+                cls._shared_instances[key] = instance
+        return instance
+
 
 # Example Usage
 if __name__ == "__main__":
@@ -0,0 +1,50 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+
+
+class RetrievalCache:
+    def __init__(self, cache_path):
+        """
+        Persistent cache of hybrid retrieval results. An entry maps a query (text, refactoring type,
+        number of examples, index version) to the uniqueIds of the selected examples, so repeated
+        experiment runs skip the vector search, BM25 and reranking. The index version covers the
+        vector collection and the BM25 index, so rebuilding either invalidates the cached results.
+
+        Parameters:
+            cache_path (str): Path of the SQLite cache file.
+        """
+        os.makedirs(os.path.dirname(os.path.abspath(cache_path)), exist_ok=True)
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(cache_path, check_same_thread=False, timeout=60)
+        self.connection.execute("CREATE TABLE IF NOT EXISTS retrieval_results "
+                                "(key TEXT PRIMARY KEY, doc_ids TEXT NOT NULL)")
+        self.connection.commit()
+
+    @staticmethod
+    def make_key(search_text, refactoring_type, top_k, index_version):
+        """The cache key of a query: a hash of the query text, type, k and index version."""
+        return hashlib.sha256(json.dumps([search_text, refactoring_type, top_k, index_version]).encode('utf-8')).hexdigest()
+
+    def get_many(self, keys):
+        """Returns {key: list of uniqueIds} for the keys found in the cache."""
+        keys = list(keys)
+        found = {}
+        with self.lock:
+            # stay below SQLite's default limit of bound parameters
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                for key, doc_ids in self.connection.execute(
+                        f"SELECT key, doc_ids FROM retrieval_results WHERE key IN ({placeholders})", chunk):
+                    found[key] = json.loads(doc_ids)
+        return found
+
+    def put_many(self, results):
+        """Stores {key: list of uniqueIds}."""
+        with self.lock:
+            self.connection.executemany("INSERT OR REPLACE INTO retrieval_results (key, doc_ids) VALUES (?, ?)",
+                                        [(key, json.dumps(doc_ids)) for key, doc_ids in results.items()])
+            self.connection.commit()
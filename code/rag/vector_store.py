@@ -0,0 +1,447 @@
+import json
+import os
+import shutil
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from urllib.parse import quote
+
+import numpy as np
+
+
+class VectorCollection(ABC):
+    """
+    Interface of a vector collection. It follows the part of the Chroma collection API used by the
+    RAG pipeline (count, add, upsert, query), so a Chroma collection can be used in its place.
+    """
+
+    @abstractmethod
+    def count(self) -> int:
+        raise NotImplementedError
+
+    @abstractmethod
+    def add(self, ids, documents, metadatas, embeddings=None):
+        raise NotImplementedError
+
+    @abstractmethod
+    def upsert(self, ids, documents, metadatas, embeddings=None):
+        raise NotImplementedError
+
+    @abstractmethod
+    def query(self, query_texts=None, n_results=10, where=None, query_embeddings=None):
+        raise NotImplementedError
+
+
+class _Partition:
+    """The documents of one partition value, with their embeddings as a (documents x dimensions) matrix."""
+
+    def __init__(self, ids=None, documents=None, metadatas=None, embeddings=None):
+        self.ids = ids or []
+        self.documents = documents or []
+        self.metadatas = metadatas or []
+        self.embeddings = embeddings
+        self.id_index = {unique_id: row for row, unique_id in enumerate(self.ids)}
+
+    def upsert(self, ids, documents, metadatas, embeddings):
+        new_rows = []
+        for position, unique_id in enumerate(ids):
+            row = self.id_index.get(unique_id)
+            if row is None:
+                new_rows.append(position)
+                continue
+            self.documents[row] = documents[position]
+            self.metadatas[row] = metadatas[position]
+            self.embeddings[row] = embeddings[position]
+        if not new_rows:
+            return
+        for position in new_rows:
+            self.id_index[ids[position]] = len(self.ids)
+            self.ids.append(ids[position])
+            self.documents.append(documents[position])
+            self.metadatas.append(metadatas[position])
+        if self.embeddings is None or len(self.embeddings) == 0:
+            self.embeddings = embeddings[new_rows]
+        else:
+            self.embeddings = np.concatenate([self.embeddings, embeddings[new_rows]])
+
+    def delete(self, unique_id):
+        row = self.id_index.pop(unique_id)
+        del self.ids[row]
+        del self.documents[row]
+        del self.metadatas[row]
+        self.embeddings = np.delete(self.embeddings, row, axis=0)
+        self.id_index = {unique_id: row for row, unique_id in enumerate(self.ids)}
+
+    def search(self, query_embeddings, n_results):
+        """Returns the (rows, squared L2 distances) of the nearest documents for every query."""
+        if not self.ids:
+            return [(np.array([], dtype=np.int64), np.array([], dtype=np.float32)) for _ in query_embeddings]
+        # ||q - e||^2 = ||q||^2 - 2 q.e + ||e||^2, Chroma's default 'l2' space
+        distances = (np.sum(query_embeddings ** 2, axis=1)[:, None]
+                     - 2 * query_embeddings @ self.embeddings.T
+                     + np.sum(self.embeddings ** 2, axis=1)[None, :])
+        n_results = min(n_results, len(self.ids))
+        results = []
+        for row_distances in distances:
+            rows = np.argpartition(row_distances, n_results - 1)[:n_results]
+            rows = rows[np.argsort(row_distances[rows], kind="stable")]
+            results.append((rows, row_distances[rows]))
+        return results
+
+
+class LocalVectorCollection(VectorCollection):
+    """
+    In-process vector collection persisted to a directory, searched by brute force with NumPy.
+    Documents are pre-partitioned by one metadata field (the refactoring type), so a query with
+    where={partition_key: value} only scans the matching partition instead of post-filtering.
+    Each partition is stored as embeddings.npy plus records.json in a data directory named by the
+    partition's manifest.json, followed by segments in the same format that hold the batches upserted
+    since, and loaded on first use. Every upsert appends one segment and the manifest is replaced last,
+    so an upsert is durable once it returns; the segments are compacted into a new data directory
+    once they hold more documents than it. Inside deferred_save, upserts only change the partitions
+    in memory and they are written by flush.
+    """
+
+    # Number of segments after which a partition is compacted regardless of their size.
+    MAX_SEGMENTS = 256
+
+    def __init__(self, directory: str, embedding_function, partition_key: str = "type"):
+        self.directory = directory
+        self.embedding_function = embedding_function
+        self.partition_key = partition_key
+        self.partitions = {}
+        # directory name -> partition value of the partitions on disk, rescanned when the directory changes
+        self.partition_names = {}
+        self.partitions_dir_version = None
+        # id -> partition value of every stored document, built when an upsert first needs it
+        self.id_partitions = None
+        self.autosave = True
+        # partition value -> {"upserted": ids, "deleted": ids} of the changes not written yet
+        self.pending = {}
+        # partition value -> number of documents in the segments of the partition
+        self.segment_documents = {}
+        self.lock = threading.Lock()
+        os.makedirs(self._partitions_dir(), exist_ok=True)
+
+    def _partitions_dir(self):
+        return os.path.join(self.directory, "partitions")
+
+    def _partition_path(self, value):
+        return os.path.join(self._partitions_dir(), quote(str(value), safe=""))
+
+    def _partition_values(self):
+        """
+        All partition values, the ones on disk and the ones only in memory. The directory is only listed
+        again when its modification time changed, i.e. when a partition was created by another process.
+        """
+        stat = os.stat(self._partitions_dir())
+        version = (stat.st_mtime_ns, stat.st_size)
+        if version != self.partitions_dir_version:
+            for name in os.listdir(self._partitions_dir()):
+                if name in self.partition_names:
+                    continue
+                manifest_path = os.path.join(self._partitions_dir(), name, "partition.json")
+                if os.path.exists(manifest_path):
+                    with open(manifest_path, "r", encoding="utf-8") as file:
+                        self.partition_names[name] = json.load(file)["partition"]
+            self.partitions_dir_version = version
+        return set(self.partitions) | set(self.partition_names.values())
+
+    def _id_partitions(self):
+        """The id -> partition value map, loading every partition the first time."""
+        if self.id_partitions is None:
+            self.id_partitions = {}
+            for value in self._partition_values():
+                for unique_id in self._get_partition(value).ids:
+                    self.id_partitions[unique_id] = value
+        return self.id_partitions
+
+    def _read_manifest(self, value):
+        """The manifest of a saved partition, None if the partition was never saved."""
+        manifest_path = os.path.join(self._partition_path(value), "manifest.json")
+        if not os.path.exists(manifest_path):
+            return None
+        with open(manifest_path, "r", encoding="utf-8") as file:
+            return json.load(file)
+
+    def _write_manifest(self, value, manifest):
+        path = self._partition_path(value)
+        tmp_path = os.path.join(path, f".manifest.{os.getpid()}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            json.dump(manifest, file)
+        os.replace(tmp_path, os.path.join(path, "manifest.json"))
+
+    def _create_partition_dir(self, value):
+        path = self._partition_path(value)
+        if not os.path.exists(os.path.join(path, "partition.json")):
+            os.makedirs(path, exist_ok=True)
+            with open(os.path.join(path, "partition.json"), "w", encoding="utf-8") as file:
+                json.dump({"partition": value}, file)
+        return path
+
+    @staticmethod
+    def _write_records(directory, records, embeddings):
+        """Writes embeddings.npy and records.json into a new directory."""
+        os.makedirs(directory)
+        np.save(os.path.join(directory, "embeddings.npy"), embeddings.astype(np.float32))
+        with open(os.path.join(directory, "records.json"), "w", encoding="utf-8") as file:
+            json.dump(records, file)
+
+    @staticmethod
+    def _read_records(directory):
+        with open(os.path.join(directory, "records.json"), "r", encoding="utf-8") as file:
+            records = json.load(file)
+        return records, np.load(os.path.join(directory, "embeddings.npy"))
+
+    def _get_partition(self, value):
+        partition = self.partitions.get(value)
+        if partition is not None:
+            return partition
+        path = self._partition_path(value)
+        manifest = self._read_manifest(value)
+        if manifest is None:
+            manifest = {"data": None, "segments": []}
+            # partitions saved before the manifest kept the files next to partition.json
+            if os.path.exists(os.path.join(path, "records.json")):
+                manifest["data"] = ""
+        partition = _Partition()
+        if manifest["data"] is not None:
+            records, embeddings = self._read_records(os.path.join(path, manifest["data"]))
+            partition = _Partition(records["ids"], records["documents"], records["metadatas"], embeddings)
+        # the batches upserted since the partition was last written in full, in order
+        for segment in manifest.get("segments", []):
+            records, embeddings = self._read_records(os.path.join(path, segment))
+            for unique_id in records["deleted"]:
+                if unique_id in partition.id_index:
+                    partition.delete(unique_id)
+            if records["ids"]:
+                partition.upsert(records["ids"], records["documents"], records["metadatas"], embeddings)
+        self.partitions[value] = partition
+        self.segment_documents[value] = sum(manifest.get("segment_documents", []))
+        return partition
+
+    def _save_partition(self, value):
+        """
+        Writes a partition in full into a new data directory and then switches the manifest to it in one
+        atomic rename, so readers never combine the embeddings of one save with the records of another and
+        an interrupted save leaves the previous one intact. This compacts the partition's segments. The
+        files of the previous manifest are kept for readers that are still loading them; older ones are
+        removed, including segments of an append that was interrupted before its manifest was written.
+        """
+        partition = self.partitions[value]
+        path = self._create_partition_dir(value)
+        previous = self._read_manifest(value)
+        data_name = f"data-{time.time_ns()}-{os.getpid()}"
+        embeddings = partition.embeddings if partition.embeddings is not None else np.zeros((0, 0), np.float32)
+        self._write_records(os.path.join(path, data_name), {
+            "partition": value,
+            "ids": partition.ids,
+            "documents": partition.documents,
+            "metadatas": partition.metadatas,
+        }, embeddings)
+        self._write_manifest(value, {"partition": value, "data": data_name, "segments": [],
+                                     "segment_documents": []})
+        self.pending.pop(value, None)
+        self.segment_documents[value] = 0
+        kept = [data_name] + ([previous["data"]] + previous.get("segments", []) if previous is not None else [])
+        oldest_kept = min(int(name.split("-")[1]) for name in kept if name)
+        for name in os.listdir(path):
+            if name.startswith(("data-", "segment-")) and name not in kept and int(name.split("-")[1]) < oldest_kept:
+                shutil.rmtree(os.path.join(path, name), ignore_errors=True)
+
+    def _append_segment(self, value):
+        """
+        Writes the documents upserted into a partition (and the ids moved out of it) since it was last
+        written as a segment, and adds the segment to the manifest in one atomic rename. The cost of a
+        write is the size of the batch, not of the partition.
+        """
+        partition = self.partitions[value]
+        changes = self.pending.pop(value)
+        path = self._create_partition_dir(value)
+        manifest = self._read_manifest(value)
+        if manifest is None:
+            # a partition saved before the manifest is compacted into the new layout first
+            if os.path.exists(os.path.join(path, "records.json")):
+                self._save_partition(value)
+                return
+            manifest = {"partition": value, "data": None, "segments": [], "segment_documents": []}
+        rows = [partition.id_index[unique_id] for unique_id in changes["upserted"]]
+        embeddings = partition.embeddings[rows] if rows else np.zeros((0, 0), np.float32)
+        segment_name = f"segment-{time.time_ns()}-{os.getpid()}"
+        self._write_records(os.path.join(path, segment_name), {
+            "partition": value,
+            "ids": [partition.ids[row] for row in rows],
+            "documents": [partition.documents[row] for row in rows],
+            "metadatas": [partition.metadatas[row] for row in rows],
+            "deleted": sorted(changes["deleted"]),
+        }, embeddings)
+        manifest["segments"] = manifest.get("segments", []) + [segment_name]
+        manifest["segment_documents"] = manifest.get("segment_documents", []) + [len(rows)]
+        self._write_manifest(value, manifest)
+        self.segment_documents[value] = sum(manifest["segment_documents"])
+
+    def _write_partition(self, value):
+        """
+        Persists the pending changes of a partition: as a new segment, or by compacting the partition once
+        its segments hold more documents than the last full write (so the total cost of the full writes
+        stays proportional to the size of the partition) or there are more than MAX_SEGMENTS of them.
+        """
+        manifest = self._read_manifest(value)
+        segments = len(manifest.get("segments", [])) if manifest is not None else 0
+        base_documents = len(self.partitions[value].ids) - self.segment_documents.get(value, 0)
+        if segments >= self.MAX_SEGMENTS or self.segment_documents.get(value, 0) > max(base_documents, 0):
+            self._save_partition(value)
+        else:
+            self._append_segment(value)
+
+    @contextmanager
+    def deferred_save(self):
+        """
+        Within the block, upserts only change the partitions in memory; the changed partitions are
+        written by flush or when the block ends.
+        """
+        with self.lock:
+            self.autosave = False
+        try:
+            yield self
+        finally:
+            with self.lock:
+                self.autosave = True
+            self.flush()
+
+    def flush(self):
+        """Writes the changes of the partitions changed since the last write."""
+        with self.lock:
+            for value in list(self.pending):
+                self._write_partition(value)
+
+    def compact(self):
+        """Rewrites every partition that has segments as one data directory, so it loads from a single file pair."""
+        with self.lock:
+            for value in self._partition_values():
+                manifest = self._read_manifest(value)
+                if manifest is not None and manifest.get("segments"):
+                    self._get_partition(value)
+                    self._save_partition(value)
+
+    def _partition_of(self, metadata):
+        return (metadata or {}).get(self.partition_key, "")
+
+    def _where_partition(self, where):
+        """Maps a Chroma style where filter on the partition key to the partition value."""
+        if not where:
+            return None
+        if list(where) != [self.partition_key]:
+            raise ValueError(f"LocalVectorCollection only filters on '{self.partition_key}', got {where}")
+        value = where[self.partition_key]
+        if isinstance(value, dict):
+            if list(value) != ["$eq"]:
+                raise ValueError(f"LocalVectorCollection only supports equality filters, got {where}")
+            value = value["$eq"]
+        return value
+
+    def get_version(self, where=None) -> str:
+        """
+        Returns a version string of the stored documents that a query with this where filter can see.
+        It changes whenever one of those partitions is written again.
+        """
+        value = self._where_partition(where)
+        with self.lock:
+            values = [value] if value is not None else sorted(self._partition_values(), key=str)
+        versions = []
+        for partition_value in values:
+            manifest = self._read_manifest(partition_value)
+            records_path = os.path.join(self._partition_path(partition_value), "records.json")
+            if manifest is not None:
+                versions.append((manifest.get("segments") or [manifest["data"]])[-1])
+            elif os.path.exists(records_path):
+                stat = os.stat(records_path)
+                versions.append(f"{stat.st_mtime_ns}-{stat.st_size}")
+            else:
+                versions.append("empty")
+        return ",".join(versions)
+
+    def count(self) -> int:
+        with self.lock:
+            return sum(len(self._get_partition(value).ids) for value in self._partition_values())
+
+    def add(self, ids, documents, metadatas, embeddings=None):
+        """Adds documents, skipping ids that are already stored (like Chroma's add)."""
+        with self.lock:
+            existing = set(unique_id for unique_id in ids if unique_id in self._id_partitions())
+        keep = [position for position, unique_id in enumerate(ids) if unique_id not in existing]
+        for position, unique_id in enumerate(ids):
+            if unique_id in existing:
+                print(f"Skipping existing id: {unique_id}")
+        if not keep:
+            return
+        self.upsert([ids[position] for position in keep],
+                    [documents[position] for position in keep],
+                    [metadatas[position] for position in keep],
+                    None if embeddings is None else [embeddings[position] for position in keep])
+
+    def upsert(self, ids, documents, metadatas, embeddings=None):
+        """
+        Inserts documents or replaces the stored documents with the same ids, then writes the changes of
+        the touched partitions as segments (or keeps them for flush inside deferred_save).
+        """
+        if not ids:
+            return
+        if embeddings is None:
+            embeddings = self.embedding_function(documents)
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        grouped = {}
+        for position, metadata in enumerate(metadatas):
+            grouped.setdefault(self._partition_of(metadata), []).append(position)
+        with self.lock:
+            id_partitions = self._id_partitions()
+            for value, positions in grouped.items():
+                for position in positions:
+                    old_value = id_partitions.get(ids[position])
+                    if old_value is not None and old_value != value:
+                        # an id whose partition value changed is moved out of its old partition
+                        self._get_partition(old_value).delete(ids[position])
+                        changes = self.pending.setdefault(old_value, {"upserted": {}, "deleted": set()})
+                        changes["upserted"].pop(ids[position], None)
+                        changes["deleted"].add(ids[position])
+                    id_partitions[ids[position]] = value
+            for value, positions in grouped.items():
+                self._get_partition(value).upsert([ids[position] for position in positions],
+                                                  [documents[position] for position in positions],
+                                                  [metadatas[position] for position in positions],
+                                                  embeddings[positions])
+                changes = self.pending.setdefault(value, {"upserted": {}, "deleted": set()})
+                for position in positions:
+                    changes["upserted"][ids[position]] = True
+                    changes["deleted"].discard(ids[position])
+            if self.autosave:
+                for value in list(self.pending):
+                    self._write_partition(value)
+
+    def query(self, query_texts=None, n_results=10, where=None, query_embeddings=None):
+        """
+        Returns the nearest documents of each query in the Chroma result layout
+        ({'ids': [[...]], 'documents': [[...]], 'metadatas': [[...]], 'distances': [[...]]}).
+        """
+        if query_embeddings is None:
+            query_embeddings = self.embedding_function(query_texts)
+        query_embeddings = np.asarray(query_embeddings, dtype=np.float32)
+        value = self._where_partition(where)
+        with self.lock:
+            values = [value] if value is not None else sorted(self._partition_values(), key=str)
+            partitions = [self._get_partition(partition_value) for partition_value in values]
+            candidates = [(partition, partition.search(query_embeddings, n_results)) for partition in partitions]
+            results = {"ids": [], "documents": [], "metadatas": [], "distances": [], "embeddings": None}
+            for query_index in range(len(query_embeddings)):
+                hits = []
+                for partition, partition_results in candidates:
+                    rows, distances = partition_results[query_index]
+                    hits.extend((float(distance), partition, int(row)) for row, distance in zip(rows, distances))
+                hits.sort(key=lambda hit: hit[0])
+                hits = hits[:n_results]
+                results["ids"].append([partition.ids[row] for _, partition, row in hits])
+                results["documents"].append([partition.documents[row] for _, partition, row in hits])
+                results["metadatas"].append([partition.metadatas[row] for _, partition, row in hits])
+                results["distances"].append([distance for distance, _, _ in hits])
+        return results
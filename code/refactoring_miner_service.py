@@ -0,0 +1,89 @@
+import os
+import subprocess
+import threading
+
+from daemon_client import DaemonClient, DaemonStartError
+from java_home import java_env
+
+TOOLS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'tools')
+REFACTORING_MINER_HOME = os.path.join(TOOLS_DIR, 'RefactoringMiner-3.0.10')
+DAEMON_SOURCE = os.path.join(TOOLS_DIR, 'refactoring-miner-daemon', 'RefactoringMinerDaemon.java')
+
+# Java version RefactoringMiner runs with.
+REFACTORING_MINER_JAVA_VERSION = 17
+
+_service = None
+_service_failed = False
+_service_lock = threading.Lock()
+
+
+class RefactoringMinerService(DaemonClient):
+    def __init__(self, home=REFACTORING_MINER_HOME, java_version=REFACTORING_MINER_JAVA_VERSION):
+        """
+        Client of a long-lived RefactoringMiner daemon (RefactoringMinerDaemon.java). The JVM is
+        started once and keeps RefactoringMiner loaded; every call sends the command line arguments
+        and the daemon answers with the exit code and the output of the run, so a check costs the
+        detection only instead of a JVM start. The daemon runs one request at a time, since the
+        RefactoringMiner entry point is not re-entrant; concurrent callers queue up.
+
+        Parameters:
+            home (str): The RefactoringMiner distribution (with bin/ and lib/).
+            java_version (int): The Java version to run the daemon with (17 to 23, it needs a security manager).
+        """
+        command = ["java", "-Djava.security.manager=allow", "-cp", os.path.join(home, "lib", "*"),
+                   DAEMON_SOURCE]
+        super().__init__("RefactoringMiner", command, cwd=os.path.dirname(TOOLS_DIR), env=java_env(java_version))
+
+    def run(self, args, timeout=None):
+        """
+        Runs RefactoringMiner with command line arguments, e.g. ["-scr", file_path, before, after, type].
+
+        Parameters:
+            args (list): The arguments after the RefactoringMiner command.
+            timeout (float, optional): Seconds to wait for the result.
+
+        Returns:
+            subprocess.CompletedProcess: The exit code, stdout and stderr of the run.
+        """
+        # the daemon has its own working directory, relative paths of existing files are resolved here
+        args = [os.path.abspath(arg) if not os.path.isabs(arg) and os.path.exists(arg) else arg for arg in args]
+        response = self.request({"args": args}, timeout)
+        return subprocess.CompletedProcess(args, response["exitCode"], response["stdout"], response["stderr"])
+
+
+def get_refactoring_miner_service():
+    """Returns the process-wide RefactoringMiner daemon client, None if the daemon cannot be used."""
+    global _service
+    with _service_lock:
+        if _service is None and not _service_failed:
+            if os.path.isdir(os.path.join(REFACTORING_MINER_HOME, "lib")):
+                _service = RefactoringMinerService()
+    return None if _service_failed else _service
+
+
+def run_refactoring_miner(args):
+    """
+    Runs RefactoringMiner 3.0.10 with command line arguments on the shared daemon. Without the
+    daemon (no lib/ directory, no JDK or a failed start) the bin/RefactoringMiner script is run
+    instead, as before.
+
+    Parameters:
+        args (list): The arguments after the RefactoringMiner command, e.g. ["-scr", ...].
+
+    Returns:
+        subprocess.CompletedProcess: The exit code, stdout and stderr of the run.
+    """
+    global _service_failed
+    service = get_refactoring_miner_service()
+    if service is not None:
+        try:
+            return service.run(args)
+        except DaemonStartError as e:
+            print(f"{e}, running the command line tool instead")
+            with _service_lock:
+                # a daemon that does not start is not tried again by this process
+                _service_failed = True
+        except RuntimeError as e:
+            print(f"{e}, running the command line tool instead")
+    return subprocess.run([os.path.join(REFACTORING_MINER_HOME, "bin", "RefactoringMiner"), *args],
+                          capture_output=True, text=True, env=java_env(REFACTORING_MINER_JAVA_VERSION))
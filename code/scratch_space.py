@@ -0,0 +1,68 @@
+import os
+import shutil
+import tempfile
+import threading
+
+SCRATCH_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'tmp')
+
+# Memory-backed file system used for scratch spaces when tmpfs is enabled (Linux).
+TMPFS_DIR = '/dev/shm'
+
+_scratch_root = None
+_scratch_root_lock = threading.Lock()
+
+
+def configure_scratch_space(root=None, tmpfs=False):
+    """
+    Sets the directory scratch spaces are created in.
+
+    Parameters:
+        root (str, optional): The directory; wins over tmpfs.
+        tmpfs (bool): Put the scratch spaces on tmpfs (TMPFS_DIR) if it exists, SCRATCH_ROOT otherwise.
+    """
+    global _scratch_root
+    if root is None and tmpfs:
+        if os.path.isdir(TMPFS_DIR):
+            root = os.path.join(TMPFS_DIR, f"pure-refactor-{os.getuid() if hasattr(os, 'getuid') else 0}")
+        else:
+            print(f"{TMPFS_DIR} does not exist, scratch spaces stay in {SCRATCH_ROOT}")
+    with _scratch_root_lock:
+        _scratch_root = root
+
+
+def get_scratch_root():
+    """The directory scratch spaces are created in, created if missing."""
+    with _scratch_root_lock:
+        root = _scratch_root or SCRATCH_ROOT
+    os.makedirs(root, exist_ok=True)
+    return root
+
+
+class ScratchSpace:
+    def __init__(self, prefix="task-"):
+        """
+        Temp directory of one task, e.g. the before/after files of one RefactoringMiner check. Every
+        task writes into its own directory, so concurrent tasks never overwrite each other's input;
+        used as a context manager the directory is removed when the task is done.
+
+        Parameters:
+            prefix (str): Prefix of the directory name.
+        """
+        self.path = tempfile.mkdtemp(prefix=prefix, dir=get_scratch_root())
+
+    def write(self, name, content):
+        """Writes a text file into the scratch space and returns its path."""
+        path = os.path.join(self.path, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as file:
+            file.write(content)
+        return path
+
+    def cleanup(self):
+        shutil.rmtree(self.path, ignore_errors=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.cleanup()
@@ -0,0 +1,81 @@
+import os
+import threading
+from collections import OrderedDict
+
+import git
+
+# Number of decoded files a reader keeps in memory.
+MAX_CACHED_BLOBS = 512
+
+_readers = {}
+_readers_lock = threading.Lock()
+
+
+class GitBlobReader:
+    def __init__(self, repo_path, max_cached_blobs=MAX_CACHED_BLOBS):
+        """
+        Reads file contents of any commit from the git object store, without touching the working
+        tree. The repository handle is kept open, so objects are read through its persistent
+        `git cat-file --batch` process, and the decoded contents are kept in an LRU cache.
+
+        Parameters:
+            repo_path (str): Path to the repository.
+            max_cached_blobs (int): Number of decoded files to keep (default is MAX_CACHED_BLOBS).
+        """
+        self.repo_path = os.path.abspath(repo_path)
+        self.repo = git.Repo(self.repo_path)
+        self.max_cached_blobs = max_cached_blobs
+        # (revision, path) -> content, least recently used first
+        self.cache = OrderedDict()
+        self.trees = {}
+        # the cat-file process of the repository handle serves one request at a time
+        self.lock = threading.Lock()
+
+    def read(self, revision, path):
+        """
+        Returns the content of a file in a revision.
+
+        Parameters:
+            revision (str): A commit hash or revision expression, e.g. '<commit>^'.
+            path (str): Path of the file, relative to the repository or absolute inside it.
+
+        Returns:
+            str: The content of the file.
+
+        Raises:
+            FileNotFoundError: The revision has no file at path.
+            IsADirectoryError: The path is a directory in the revision.
+        """
+        if os.path.isabs(path):
+            path = os.path.relpath(path, self.repo_path)
+        path = path.replace(os.sep, "/")
+        key = (revision, path)
+        with self.lock:
+            content = self.cache.get(key)
+            if content is not None:
+                self.cache.move_to_end(key)
+                return content
+            tree = self.trees.get(revision)
+            if tree is None:
+                tree = self.trees[revision] = self.repo.commit(revision).tree
+            try:
+                item = tree / path
+            except KeyError:
+                raise FileNotFoundError(f"{path} does not exist in {revision}")
+            if item.type != "blob":
+                raise IsADirectoryError(f"{path} is not a file in {revision}")
+            content = item.data_stream.read().decode("utf-8", errors="replace")
+            self.cache[key] = content
+            if len(self.cache) > self.max_cached_blobs:
+                self.cache.popitem(last=False)
+        return content
+
+
+def get_blob_reader(repo_path):
+    """Returns the process-wide blob reader of a repository, opening it on first use."""
+    key = os.path.abspath(repo_path)
+    with _readers_lock:
+        reader = _readers.get(key)
+        if reader is None:
+            reader = _readers[key] = GitBlobReader(key)
+    return reader
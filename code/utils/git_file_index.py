@@ -0,0 +1,126 @@
+import bisect
+import json
+import os
+import re
+import subprocess
+import threading
+from collections import OrderedDict
+
+FILE_INDEX_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'cache', 'file_index')
+
+# Number of commit indexes kept in memory.
+MAX_LOADED_INDEXES = 32
+
+# Revisions relative to a commit hash (e.g. '<commit>^') always name the same commit.
+IMMUTABLE_REVISION = re.compile(r"[0-9a-f]{7,40}([~^]\d*)*")
+
+_indexes = OrderedDict()
+_commits = {}
+_indexes_lock = threading.Lock()
+
+
+class CommitFileIndex:
+    def __init__(self, commit, paths):
+        """
+        The files of one commit, as listed by `git ls-tree -r`, sorted for prefix lookups.
+
+        Parameters:
+            commit (str): The commit hash.
+            paths (list): Path of every file of the commit, relative to the repository.
+        """
+        self.commit = commit
+        self.paths = sorted(paths)
+        self._by_directory = None
+
+    def files_under(self, prefix, suffix=""):
+        """
+        Returns the files whose path starts with prefix (e.g. 'gson/src/main/java/'), in path order.
+
+        Parameters:
+            prefix (str): The path prefix.
+            suffix (str): Only files ending with it, e.g. '.java'.
+        """
+        start = bisect.bisect_left(self.paths, prefix)
+        files = []
+        for path in self.paths[start:]:
+            if not path.startswith(prefix):
+                break
+            if path.endswith(suffix):
+                files.append(path)
+        return files
+
+    def files_in_package(self, package, suffix=".java"):
+        """
+        Returns the files directly in a Java package (e.g. 'com.google.gson') in any source root.
+
+        Parameters:
+            package (str): The package name.
+            suffix (str): Only files ending with it (default is '.java').
+        """
+        if self._by_directory is None:
+            by_directory = {}
+            for path in self.paths:
+                directory, _, _ = path.rpartition("/")
+                by_directory.setdefault(directory, []).append(path)
+            self._by_directory = by_directory
+        package_dir = package.replace(".", "/")
+        files = []
+        for directory, paths in self._by_directory.items():
+            if directory == package_dir or directory.endswith("/" + package_dir):
+                files.extend(path for path in paths if path.endswith(suffix))
+        return sorted(files)
+
+
+def _git(repo_path, *args):
+    result = subprocess.run(["git", "-C", repo_path, *args], capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"git {' '.join(args)} failed in {repo_path}: {result.stderr.strip()}")
+    return result.stdout
+
+
+def _load_or_build(repo_path, commit):
+    index_path = os.path.join(FILE_INDEX_DIR, commit[:2], f"{commit}.json")
+    if os.path.exists(index_path):
+        with open(index_path, 'r', encoding='utf-8') as file:
+            return CommitFileIndex(commit, json.load(file)["paths"])
+    paths = [path for path in _git(repo_path, "ls-tree", "-r", "-z", "--name-only", commit).split("\0") if path]
+    os.makedirs(os.path.dirname(index_path), exist_ok=True)
+    tmp_path = f"{index_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as file:
+        json.dump({"commit": commit, "paths": paths}, file)
+    os.replace(tmp_path, index_path)
+    return CommitFileIndex(commit, paths)
+
+
+def get_file_index(repo_path, revision):
+    """
+    Returns the file index of a revision. An index is built once per commit from `git ls-tree -r`
+    and stored under FILE_INDEX_DIR, so later runs load it from disk; the most recently used
+    indexes stay in memory.
+
+    Parameters:
+        repo_path (str): Path to the repository.
+        revision (str): A commit hash or revision expression, e.g. '<commit>^'.
+
+    Returns:
+        CommitFileIndex: The files of the commit.
+    """
+    key = (os.path.abspath(repo_path), revision)
+    with _indexes_lock:
+        commit = _commits.get(key)
+    if commit is None:
+        commit = _git(repo_path, "rev-parse", "--verify", f"{revision}^{{commit}}").strip()
+        if IMMUTABLE_REVISION.fullmatch(revision):
+            with _indexes_lock:
+                _commits[key] = commit
+    with _indexes_lock:
+        index = _indexes.get(commit)
+        if index is not None:
+            _indexes.move_to_end(commit)
+            return index
+    index = _load_or_build(repo_path, commit)
+    with _indexes_lock:
+        _indexes[commit] = index
+        if len(_indexes) > MAX_LOADED_INDEXES:
+            _indexes.popitem(last=False)
+    return index
@@ -1,6 +1,9 @@
 import os
 import git
 
+from utils.git_blob_reader import get_blob_reader
+from utils.git_file_index import get_file_index
+
 
 def reset_and_checkout(repo_path, commit_hash):
     """
@@ -62,16 +65,16 @@ def get_project_structure_with_java_files(root_dir, relative_to="", file_path_be
     return java_files
 
 def read_java_file_content_in_commit(repo_path, commit_hash, file_path):
+    """
+    Read the content of a file as it is in the previous commit of commit_hash, from the git object
+    store (the working tree is not checked out).
+    """
     try:
-        # Get the hash of the previous commit
-        previous_commit = get_previous_commit(repo_path, commit_hash)
-
-        # Reset and checkout the specified commit
-        reset_and_checkout(repo_path, previous_commit)
-
-        # Get project structure with .java files only
-        structure = read_java_file_content(file_path)
-        return structure
+        return get_blob_reader(repo_path).read(f"{commit_hash}^", file_path)
+    except FileNotFoundError:
+        return f"Error: {file_path} does not exist."
+    except IsADirectoryError:
+        return f"Error: {file_path} is not a valid file."
     except Exception as e:
         return f"Error: {e}"
 
@@ -93,17 +96,13 @@ def read_java_file_content(file_path):
 
 def get_project_structure(repo_path, commit_hash, file_path_before):
     """
-    Main function to reset, checkout a commit, and return the project structure with .java files.
+    Return the .java files of the previous commit of commit_hash that are under the first three
+    components of file_path_before (e.g. src/main/java), looked up in the file index of that commit
+    (nothing is checked out).
     """
     try:
-        previous_commit = get_previous_commit(repo_path, commit_hash)
-
-        # Reset and checkout the specified commit
-        reset_and_checkout(repo_path, previous_commit)
-
-        # Get project structure with .java files only
-        structure_list = get_project_structure_with_java_files(repo_path, "", file_path_before)
-
-        return structure_list
+        file_name_list = file_path_before.split("/")
+        parent_file_name = file_name_list[0] + "/" + file_name_list[1] + "/" + file_name_list[2]
+        return get_file_index(repo_path, f"{commit_hash}^").files_under(parent_file_name + "/", ".java")
     except Exception as e:
         return f"Error: {e}"
@@ -22,6 +22,7 @@ from typing_extensions import TypedDict
 
 from compile_experiment import get_compile_result_in_commit
 from model.refactoring_entity import RefactoringRepository
+from model.refactoring_dataset import load_shared_dataset
 
 with open('config.yaml', 'r') as file:
     config = yaml.safe_load(file)
@@ -29,8 +30,7 @@ with open('config.yaml', 'r') as file:
 OPENAI_API_KEY = config['OPENAI_API_KEY']
 project_prefix_path = config['project_prefix_path']
 project_name = config['project_name']
-refactoring_map = RefactoringRepository.load_from_file(f"{project_prefix_path}/data/refactoring_info/refactoring_map_em_wc_v4.json",
-                                                           format="json")
+refactoring_map = RefactoringRepository.load_by_unique_id(f"{project_prefix_path}/data/refactoring_info/refactoring_map_em_wc_v4.json")
 COMPILE_RESULT_FOR_REPAIR = False
 REPAIRED_CODE = ""
 
@@ -38,8 +38,7 @@ REPAIRED_CODE = ""
 file_path = f'{project_prefix_path}/data/{project_name}/{project_name}_evaluation_data.json'
 project_path = f'{project_prefix_path}/projects/{project_name}'
 
-with open(file_path, 'r') as file:
-    data = json.load(file)
+data = load_shared_dataset(file_path)
 
 def create_agent(llm, tools, system_message: str):
     """Create an agent."""
@@ -91,25 +90,25 @@ def check_compile_result(bug_id: str, repaired_code: str) -> str:
     if lazy_code:
         COMPILE_RESULT_FOR_REPAIR = False
         return "False, Please provide the complete code without omitting any parts."
-    for refactoring in data:
-        if refactoring['uniqueId'] == bug_id:
-            file_path = project_path + "/" + refactoring['filePathBefore']
-            compile_result, log = get_compile_result_in_commit(project_path, refactoring['commitId'], file_path, repaired_code)
-            if compile_result:
-                COMPILE_RESULT_FOR_REPAIR = True
-                return "The repaired code compiles successfully."
-            else:
-                COMPILE_RESULT_FOR_REPAIR = False
-                buggy_code_file_path = f"{project_prefix_path}/data/bugs/" + \
-                                       bug_id + "_buggy_code.txt"
-                buggy_code_file_path = Path(buggy_code_file_path)
-                buggy_code_file_path.write_text(repaired_code, encoding="utf-8")
-                error_log_file_path = f"{project_prefix_path}/data/error_logs/" + \
-                                      bug_id + "_error_log.txt"
-                error_log_file_path = Path(error_log_file_path)
-                log = str(log)
-                error_log_file_path.write_text(log, encoding="utf-8")
-                return f"The repaired code does not compile successfully. The error log is as follows: {log}"
+    refactoring = data.get(bug_id)
+    if refactoring is not None:
+        file_path = project_path + "/" + refactoring['filePathBefore']
+        compile_result, log = get_compile_result_in_commit(project_path, refactoring['commitId'], file_path, repaired_code)
+        if compile_result:
+            COMPILE_RESULT_FOR_REPAIR = True
+            return "The repaired code compiles successfully."
+        else:
+            COMPILE_RESULT_FOR_REPAIR = False
+            buggy_code_file_path = f"{project_prefix_path}/data/bugs/" + \
+                                   bug_id + "_buggy_code.txt"
+            buggy_code_file_path = Path(buggy_code_file_path)
+            buggy_code_file_path.write_text(repaired_code, encoding="utf-8")
+            error_log_file_path = f"{project_prefix_path}/data/error_logs/" + \
+                                  bug_id + "_error_log.txt"
+            error_log_file_path = Path(error_log_file_path)
+            log = str(log)
+            error_log_file_path.write_text(log, encoding="utf-8")
+            return f"The repaired code does not compile successfully. The error log is as follows: {log}"
     COMPILE_RESULT_FOR_REPAIR = False
     return "cannot find the bug id"
 
@@ -255,13 +254,13 @@ with open('data/prompts/repair_prompt.txt', 'r') as file:
 def add_result_to_refactoring(refactoring_id, answers):
     global REPAIRED_CODE
     global COMPILE_RESULT_FOR_REPAIR
-    for refactoring in data:
-        if refactoring['uniqueId'] == refactoring_id:
-            answers_track = [answers[i]["messages"][0].content for i in range(len(answers))]
-            refactoring['repairAgentChatLog'] = answers_track
-            refactoring['repairRefactoredCode'] = REPAIRED_CODE
-            refactoring['repairCompileAndTestResult'] = COMPILE_RESULT_FOR_REPAIR
-            return refactoring
+    refactoring = data.get(refactoring_id)
+    if refactoring is not None:
+        answers_track = [answers[i]["messages"][0].content for i in range(len(answers))]
+        refactoring['repairAgentChatLog'] = answers_track
+        refactoring['repairRefactoredCode'] = REPAIRED_CODE
+        refactoring['repairCompileAndTestResult'] = COMPILE_RESULT_FOR_REPAIR
+        return refactoring
 
 def extract_compile_and_test_result(answers_track):
     for answer in answers_track:
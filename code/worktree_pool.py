@@ -0,0 +1,217 @@
+import atexit
+import os
+import shutil
+import subprocess
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+# Maximum number of worktrees a pool keeps checked out for one repository.
+MAX_WORKTREES = 4
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def run_git(repo_dir, *args):
+    """run a git command in repo_dir and return the completed process."""
+    result = subprocess.run(["git", "-C", repo_dir, *args], text=True, capture_output=True)
+    if result.returncode != 0:
+        print(f"Command failed: git {' '.join(args)} in {repo_dir}\n{result.stderr}")
+    return result
+
+
+class WorktreePool:
+    def __init__(self, repo_path, pool_dir=None, max_worktrees=MAX_WORKTREES):
+        """
+        Pool of `git worktree` checkouts of one repository. A build borrows a worktree checked out at
+        the commit it needs instead of resetting the shared clone, so several refactorings can be
+        compiled at the same time and a worktree that is already at the right commit is reused as is.
+        Idle worktrees are recycled least recently used first once max_worktrees exist. The worktrees are
+        removed by close, which runs at exit for the pools of get_worktree_pool; worktrees left behind
+        by processes that no longer run are removed when a pool of the same repository is created.
+
+        Parameters:
+            repo_path (str): Path to the project repository (the shared clone).
+            pool_dir (str, optional): Directory for the worktrees (default is .worktrees/<project> next to the repository).
+            max_worktrees (int): Maximum number of worktrees (default is MAX_WORKTREES).
+        """
+        self.repo_path = os.path.abspath(repo_path)
+        if pool_dir is None:
+            pool_dir = default_pools_dir(self.repo_path)
+        # one sub-directory per process, so pools of concurrent processes never share a worktree
+        self.pool_dir = os.path.join(os.path.abspath(pool_dir), str(os.getpid()))
+        self.max_worktrees = max_worktrees
+        self.condition = threading.Condition()
+        # idle worktree path -> commit it is checked out at, least recently used first
+        self.idle = OrderedDict()
+        self.leased = {}
+        self.created = 0
+        _remove_orphaned_pool_dirs(os.path.dirname(self.pool_dir))
+        run_git(self.repo_path, "worktree", "prune")
+
+    def lease(self, commit_id):
+        """
+        Borrows a clean worktree checked out at commit_id, waiting if every worktree is in use.
+
+        Parameters:
+            commit_id (str): The commit to check out.
+
+        Returns:
+            str: The path of the worktree; give it back with give_back.
+        """
+        with self.condition:
+            while True:
+                path = next((p for p, commit in self.idle.items() if commit == commit_id), None)
+                if path is None and self.created < self.max_worktrees:
+                    path = os.path.join(self.pool_dir, f"worktree-{self.created}")
+                    self.created += 1
+                    checked_out = None
+                    break
+                if path is None and self.idle:
+                    # recycle the least recently used idle worktree
+                    path = next(iter(self.idle))
+                if path is not None:
+                    checked_out = self.idle.pop(path)
+                    break
+                self.condition.wait()
+            self.leased[path] = commit_id
+        try:
+            if os.path.isdir(path) and checked_out == commit_id:
+                # already at the commit, only undo the files the previous build changed
+                self._reset_changes(path)
+            elif os.path.isdir(path):
+                # discard the changes of the previous build, keep ignored build outputs for incremental builds
+                if run_git(path, "checkout", "-f", "--detach", commit_id).returncode != 0:
+                    raise RuntimeError(f"Failed to checkout {commit_id} in worktree {path}")
+                run_git(path, "clean", "-fdq")
+            else:
+                os.makedirs(self.pool_dir, exist_ok=True)
+                if run_git(self.repo_path, "worktree", "add", "-f", "--detach", path, commit_id).returncode != 0:
+                    raise RuntimeError(f"Failed to add worktree for {commit_id} at {path}")
+        except Exception:
+            self.give_back(path, broken=True)
+            raise
+        print(f"Leased worktree {path} at commit {commit_id}")
+        return path
+
+    @staticmethod
+    def _reset_changes(path):
+        """Restores the tracked files a build changed and removes the untracked ones it created."""
+        status = run_git(path, "status", "--porcelain", "-z", "--untracked-files=normal")
+        if status.returncode != 0:
+            raise RuntimeError(f"Failed to read the status of worktree {path}")
+        entries = status.stdout.split("\0")
+        tracked_changes = False
+        position = 0
+        while position < len(entries):
+            entry = entries[position]
+            position += 1
+            if not entry:
+                continue
+            if entry.startswith("??"):
+                untracked_path = os.path.join(path, entry[3:])
+                if os.path.isdir(untracked_path):
+                    shutil.rmtree(untracked_path, ignore_errors=True)
+                elif os.path.lexists(untracked_path):
+                    os.remove(untracked_path)
+                continue
+            tracked_changes = True
+            if entry[0] in "RC":
+                # a rename is followed by its source path
+                position += 1
+        # reset --hard only rewrites the files whose content differs from the commit
+        if tracked_changes and run_git(path, "reset", "-q", "--hard").returncode != 0:
+            raise RuntimeError(f"Failed to reset worktree {path}")
+
+    def give_back(self, path, broken=False):
+        """
+        Returns a leased worktree to the pool.
+
+        Parameters:
+            path (str): The worktree path returned by lease.
+            broken (bool): The worktree is in an unknown state and must be checked out again before reuse.
+        """
+        with self.condition:
+            commit_id = self.leased.pop(path)
+            if os.path.isdir(path):
+                self.idle[path] = None if broken else commit_id
+                self.idle.move_to_end(path)
+            else:
+                self.created -= 1
+            self.condition.notify()
+
+    @contextmanager
+    def borrow(self, commit_id):
+        """Context manager around lease and give_back."""
+        path = self.lease(commit_id)
+        try:
+            yield path
+        finally:
+            self.give_back(path)
+
+    def close(self):
+        """Removes every idle worktree of this pool, and the pool directory once no worktree is leased."""
+        with self.condition:
+            for path in list(self.idle):
+                run_git(self.repo_path, "worktree", "remove", "--force", path)
+                del self.idle[path]
+                self.created -= 1
+            if not self.leased:
+                shutil.rmtree(self.pool_dir, ignore_errors=True)
+                run_git(self.repo_path, "worktree", "prune")
+
+
+def default_pools_dir(repo_path):
+    """The directory the pools of a repository keep their worktrees in, .worktrees/<project> next to it."""
+    repo_path = os.path.abspath(repo_path)
+    return os.path.join(os.path.dirname(repo_path), ".worktrees", os.path.basename(repo_path))
+
+
+def _process_exists(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _remove_orphaned_pool_dirs(pools_dir):
+    """Removes the worktree directories of processes that are no longer running."""
+    if not os.path.isdir(pools_dir):
+        return
+    for name in os.listdir(pools_dir):
+        if name.isdigit() and int(name) != os.getpid() and not _process_exists(int(name)):
+            shutil.rmtree(os.path.join(pools_dir, name), ignore_errors=True)
+
+
+def remove_orphaned_worktrees(repo_path):
+    """
+    Removes the pooled worktrees of processes that are no longer running, e.g. of worker processes
+    that exited without running their exit handlers, and prunes them from the repository.
+    """
+    _remove_orphaned_pool_dirs(default_pools_dir(repo_path))
+    run_git(repo_path, "worktree", "prune")
+
+
+def close_worktree_pools():
+    """Closes every pool created by get_worktree_pool in this process; registered to run at exit."""
+    with _pools_lock:
+        pools = list(_pools.values())
+    for pool in pools:
+        pool.close()
+
+
+def get_worktree_pool(repo_path, max_worktrees=MAX_WORKTREES):
+    """Returns the process-wide worktree pool of a repository, creating it on first use."""
+    key = os.path.abspath(repo_path)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            if not _pools:
+                atexit.register(close_worktree_pools)
+            pool = WorktreePool(key, max_worktrees=max_worktrees)
+            _pools[key] = pool
+    return pool